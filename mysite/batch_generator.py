@@ -0,0 +1,480 @@
+"""
+This module creates Dungeon Crawl Classics RPG 0 level characters in bulk. Instead
+of rolling each character one die at a time like dccZeroLevelChar, every roll is
+made for the whole batch at once with NumPy arrays, and the results are kept in
+columns. Any row can still be turned into the usual per-character fields, or
+into a dccZeroLevelChar object.
+
+Classes:
+    BatchTables
+    CharacterBatch
+
+Functions:
+    getBatchTables(dataDict)
+    generate_batch(dataDict, n, testSuitability=True, noHuman=False, noDwarf=False, noElf=False, noHalfling=False, rng=None)
+
+Dependencies:
+    Modules:
+        numpy
+        character_generator2
+        compiled_tables
+        dcc_rng
+        import_data
+    Files:
+        Table1_1_Ability_Score_Modifiers.csv
+        Table1_2_Luck_Score.txt
+        Human_Occupations.csv
+        Dwarf_Occupations.csv
+        Elf_Occupations.csv
+        Halfling_Occupations.csv
+        Table1_3a_Farmer_Type.txt
+        Table1_3b_Animal_Type.txt
+        Table1_3c_Whats_In_The_Cart.txt
+        Table3_4_Equipment.txt
+        AppendixL.csv
+"""
+import numpy as np
+from character_generator2 import dccZeroLevelChar, RACIAL_TRAITS, WEAPON_DAMAGE, UNTRAINED_DAMAGE, EXTRA_FUNDS
+from compiled_tables import getCompiledTables, getRaceSampler, RACES
+from dcc_rng import DiceRoller
+
+#Race codes used in the race column of a CharacterBatch index RACES.
+HUMAN, DWARF, ELF, HALFLING = range(4)
+
+#Luck signs that change a value on the character sheet.
+SAVE_SIGNS = {
+    "reflex": ["Lucky sign: Saving throws", "Struck by lightning"],
+    "fortitude": ["Lucky sign: Saving throws", "Lived through famine"],
+    "willpower": ["Lucky sign: Saving throws", "Resisted temptation"]
+}
+BIRDSONG_SIGN = "Birdsong"
+WILD_CHILD_SIGN = "Wild child"
+COBRA_SIGN = "Speed of the cobra"
+HARVEST_SIGN = "Bountiful harvest"
+CHARMED_HOUSE_SIGN = "Charmed house"
+
+#Armor class bonus for trade goods that are armor.
+ARMOR_BONUS = {"Leather armor": 2, "Hide armor": 3, "Shield": 1}
+
+#Languages that are not in AppendixL.
+COMMON = "Common"
+ILLITERATE = "Illiterate"
+
+#(dataDict, BatchTables) for the last dataDict compiled.
+_tableCache = None
+
+
+
+class BatchTables:
+    """
+    BatchTables holds the rulebook tables from import_data as NumPy lookup arrays,
+    so a roll for a whole batch can be turned into results with one index operation.
+    They are built once per dataDict; use getBatchTables to get the shared copy.
+
+    Properties:
+        modifiers -> ndarray            Ability modifier for each score 0-18.
+        suitableScores, suitableModifiers, suitableCumulative, suitableOffset
+                                        The SuitabilitySampler tables as arrays.
+        luckySigns -> list              Lucky sign names.
+        reflexSign, fortitudeSign, willpowerSign -> ndarray
+                                        True for lucky signs that add luck to that save.
+        birdsongSign, wildChildSign, cobraSign, harvestSign, charmedHouseSign -> ndarray
+                                        True for the matching lucky sign.
+        occupations -> list             (Occupation, Trained Weapon, Trade Goods) of every
+                                        row of every race's occupation table.
+        occupationRolls -> list         For each race code, an array mapping a roll to a
+                                        row of occupations.
+        hasAmmo, hasAnimal, isFarmer, isWainwright -> ndarray
+                                        Flags for each occupation row.
+        extraGP, extraSP, extraCP, armorBonus -> ndarray
+                                        Money and armor class bonus for each occupation row.
+        weaponDamage -> list            (damage, range) for each occupation row.
+        languages -> list               Language names; codes index this list.
+        languageWeights -> ndarray      For each race code, the number of d100 rolls that
+                                        give each language code.
+        raceLanguage -> ndarray         The language code of each race's own language, or -1.
+        equipment, animals, farmers, whatsInCart -> list
+    """
+
+
+    def __init__(self, dataDict):
+        """
+        Compile the lookup arrays.
+
+        Args:
+            dataDict: a dictinary containing all the table data from the character
+                creation section of the Dungeon Crawl Classics RPG rulebook.
+        """
+        scoreTable = dataDict["Ability Score Modifiers"]
+        self.modifiers = np.zeros(max(scoreTable) + 1, dtype=np.int8)
+        for score in scoreTable:
+            self.modifiers[score] = scoreTable[score]["Modifier"]
+
+        compiled = getCompiledTables(dataDict)
+
+        #The suitable score sampler's running totals, as one array per ability.
+        suitability = compiled.suitability
+        self.suitableScores = np.array(suitability.scores, dtype=np.int8)
+        self.suitableModifiers = np.array(suitability.modifiers, dtype=np.int16)
+        self.suitableCumulative = np.array(suitability.cumulative, dtype=np.int64)
+        self.suitableOffset = suitability.offset
+
+        self.luckySigns = dataDict["Luck Scores"]
+        def signFlags(names):
+            return np.array([any(name in sign for name in names) for sign in self.luckySigns])
+        self.reflexSign = signFlags(SAVE_SIGNS["reflex"])
+        self.fortitudeSign = signFlags(SAVE_SIGNS["fortitude"])
+        self.willpowerSign = signFlags(SAVE_SIGNS["willpower"])
+        self.birdsongSign = signFlags([BIRDSONG_SIGN])
+        self.wildChildSign = signFlags([WILD_CHILD_SIGN])
+        self.cobraSign = signFlags([COBRA_SIGN])
+        self.harvestSign = signFlags([HARVEST_SIGN])
+        self.charmedHouseSign = signFlags([CHARMED_HOUSE_SIGN])
+
+        #All the races' occupations go in one list, and each race gets an
+        #array that turns its occupation roll into a row of that list.
+        self.occupations = []
+        self.occupationRolls = []
+        for race in RACES:
+            rollToRow = np.zeros(len(compiled.occupations[race]), dtype=np.int16)
+            rowCodes = {}
+            for roll, row in enumerate(compiled.occupations[race]):
+                if row is None:
+                    continue
+                if id(row) not in rowCodes:
+                    rowCodes[id(row)] = len(self.occupations)
+                    self.occupations.append((row["Occupation"], row["Trained Weapon"], row["Trade Goods"]))
+                rollToRow[roll] = rowCodes[id(row)]
+            self.occupationRolls.append(rollToRow)
+
+        jobs = [job for job, weapon, goods in self.occupations]
+        weapons = [weapon for job, weapon, goods in self.occupations]
+        goods = [good for job, weapon, good in self.occupations]
+        self.hasAmmo = np.array([weapon in ("Shortbow", "Sling") for weapon in weapons])
+        self.hasAnimal = np.array([job in ("Dwarven herder", "Herder", "Farmer") for job in jobs])
+        self.isFarmer = np.array([job == "Farmer" for job in jobs])
+        self.isWainwright = np.array([job == "Wainwright" for job in jobs])
+        self.extraGP = np.array([EXTRA_FUNDS.get(job, (0, 0, 0))[0] for job in jobs], dtype=np.int16)
+        self.extraSP = np.array([EXTRA_FUNDS.get(job, (0, 0, 0))[1] for job in jobs], dtype=np.int16)
+        self.extraCP = np.array([EXTRA_FUNDS.get(job, (0, 0, 0))[2] for job in jobs], dtype=np.int16)
+        self.armorBonus = np.array([ARMOR_BONUS.get(good, 0) for good in goods], dtype=np.int8)
+        self.weaponDamage = [weaponDamage(weapon) for weapon in weapons]
+
+        #Language codes index one list: AppendixL, then Common and Illiterate.
+        #Each race gets a row of weights from its LanguageSampler.
+        self.languages = list(dataDict["Languages"]) + [COMMON, ILLITERATE]
+        self.languageWeights = np.zeros((len(RACES), len(self.languages)), dtype=np.int16)
+        for code, race in enumerate(RACES):
+            sampler = compiled.languages[race]
+            for lang, weight in zip(sampler.languages, sampler.weights):
+                self.languageWeights[code, self.languages.index(lang)] = weight
+        self.raceLanguage = np.array([self.languages.index(race) if race != "Human" else -1 for race in RACES], dtype=np.int16)
+
+        self.equipment = dataDict["Equipment"]
+        self.animals = dataDict["Animal Type"]
+        self.farmers = dataDict["Farmer Type"]
+        self.whatsInCart = dataDict["What's In The Cart"]
+
+
+
+class CharacterBatch:
+    """
+    CharacterBatch holds the rolls for a batch of characters as NumPy columns,
+    one row per character. Columns hold numbers and table codes; names are only
+    looked up when a row is turned back into a character.
+
+    Properties:
+        tables -> BatchTables
+        testSuitability, noHuman, noDwarf, noElf, noHalfling -> boolean
+        scores -> ndarray               (n, 6) str, agi, sta, int, per, luck scores.
+        modifiers -> ndarray            (n, 6) modifiers for the scores.
+        luckySign -> ndarray            Index into tables.luckySigns.
+        reflex, fortitude, willpower -> ndarray
+        race -> ndarray                 Race code, index into RACES.
+        occupation -> ndarray           Row of tables.occupations.
+        ammo -> ndarray                 Ammo for a ranged trained weapon, 0 if none.
+        animal -> ndarray               Index into tables.animals, -1 if none.
+        farmer -> ndarray               Index into tables.farmers, -1 if not a farmer.
+        cart -> ndarray                 Index into tables.whatsInCart, -1 if no cart.
+        languages -> ndarray            (n, k) language codes, padded with -1.
+        gp, sp, cp -> ndarray
+        equipment -> ndarray            Index into tables.equipment.
+        speed, initiative, hitPoints, armorClass -> ndarray
+
+    Methods:
+        __len__(self) -> int
+        getFields(self, i) -> dictionary
+        getChar(self, i) -> dccZeroLevelChar
+        __iter__(self) -> iterator of dccZeroLevelChar
+    """
+
+
+    def __init__(self, tables, testSuitability, noHuman, noDwarf, noElf, noHalfling):
+        """Start an empty batch; generate_batch fills in the columns."""
+        self.tables = tables
+        self.testSuitability = testSuitability
+        self.noHuman = noHuman
+        self.noDwarf = noDwarf
+        self.noElf = noElf
+        self.noHalfling = noHalfling
+
+
+    def __len__(self):
+        """Return the number of characters in the batch."""
+        return len(self.race)
+
+
+    def getFields(self, i):
+        """
+        Return a dictionary of row i, with the same names and values as the
+        attributes of a dccZeroLevelChar.
+        """
+        tables = self.tables
+        race = RACES[self.race[i]]
+        job, weapon, goods = tables.occupations[self.occupation[i]]
+        damage, range = tables.weaponDamage[self.occupation[i]]
+
+        if self.ammo[i]:
+            weapon = weapon + " + " + str(self.ammo[i]) + " ammo"
+        if self.animal[i] >= 0:
+            goods = tables.animals[self.animal[i]]
+        if self.farmer[i] >= 0:
+            job = tables.farmers[self.farmer[i]] + " farmer"
+        if self.cart[i] >= 0:
+            goods = "Pushcart full of " + tables.whatsInCart[self.cart[i]]
+
+        equipment = [weapon + " " + damage + " " + range]
+        if goods != '':
+            equipment.append(goods)
+        equipment.append(tables.equipment[self.equipment[i]])
+
+        scores = self.scores[i].tolist()
+        modifiers = self.modifiers[i].tolist()
+        fields = {
+            "strengthScore": scores[0],
+            "agilityScore": scores[1],
+            "staminaScore": scores[2],
+            "intelligenceScore": scores[3],
+            "personalityScore": scores[4],
+            "luckScore": scores[5],
+            "strengthModifier": modifiers[0],
+            "agilityModifier": modifiers[1],
+            "staminaModifier": modifiers[2],
+            "intelligenceModifier": modifiers[3],
+            "personalityModifier": modifiers[4],
+            "luckModifier": modifiers[5],
+            "luckySign": tables.luckySigns[self.luckySign[i]],
+            "reflexSavingThrow": int(self.reflex[i]),
+            "fortitudeSavingThrow": int(self.fortitude[i]),
+            "willpowerSavingThrow": int(self.willpower[i]),
+            "race": race,
+            "racialTraits": list(RACIAL_TRAITS[race]),
+            "occupation": job,
+            "trainedWeapon": weapon,
+            "tradeGoods": goods,
+            "languages": [tables.languages[code] for code in self.languages[i] if code >= 0],
+            "money": {"GP": int(self.gp[i]), "SP": int(self.sp[i]), "CP": int(self.cp[i])},
+            "trainedWeaponDamage": damage,
+            "trainedWeaponRange": range,
+            "equipment": equipment,
+            "speed": str(self.speed[i]) + "'",
+            "initiative": int(self.initiative[i]),
+            "hitPoints": int(self.hitPoints[i]),
+            "armorClass": int(self.armorClass[i])
+        }
+        if self.testSuitability:
+            fields["suitable"] = True
+        return fields
+
+
+    def getChar(self, i, dataDict=None):
+        """
+        Return row i as a dccZeroLevelChar, without rolling anything again.
+
+        Args:
+            i: The row of the batch.
+            dataDict: The table dictionary to attach to the character, as
+                dccZeroLevelChar does.
+        """
+        char = dccZeroLevelChar.__new__(dccZeroLevelChar)
+        char.dataDict = dataDict
+        char.testSuitability = self.testSuitability
+        char.noHuman = self.noHuman
+        char.noDwarf = self.noDwarf
+        char.noElf = self.noElf
+        char.noHalfling = self.noHalfling
+        char.__dict__.update(self.getFields(i))
+        return char
+
+
+    def __iter__(self):
+        """Return each row of the batch as a dccZeroLevelChar."""
+        for i in range(len(self)):
+            yield self.getChar(i)
+
+
+
+def weaponDamage(weapon):
+    """Return the (damage, range) of a trained weapon, as dccZeroLevelChar.getWeaponDamage does."""
+    weapon = weapon.lower()
+    for weaponClass, damage, range in WEAPON_DAMAGE:
+        if weaponClass in weapon:
+            return (damage, range)
+    return UNTRAINED_DAMAGE
+
+
+def getBatchTables(dataDict):
+    """
+    Return the BatchTables for dataDict, compiling them the first time it is seen.
+    Only the last dataDict's tables are kept, so a reloaded dataDict doesn't keep
+    the old one and its tables alive.
+    """
+    global _tableCache
+    cached = _tableCache
+    if cached is None or cached[0] is not dataDict:
+        cached = (dataDict, BatchTables(dataDict))
+        _tableCache = cached
+    return cached[1]
+
+
+def rollDice(rng, numOfSides, numOfDice, n):
+    """Return an array of n rolls of numOfDice dice with numOfSides sides, added up."""
+    return rng.integers(1, numOfSides + 1, size=(n, numOfDice), dtype=np.int16).sum(axis=1, dtype=np.int16)
+
+
+def generate_batch(dataDict, n, testSuitability=True, noHuman=False, noDwarf=False, noElf=False, noHalfling=False, rng=None):
+    """
+    Roll n characters at once and return them as a CharacterBatch.
+
+    Every result follows the same rules, and has the same odds, as the
+    dccZeroLevelChar class.
+
+    Args:
+        dataDict: a dictinary containing all the table data from the character
+            creation section of the Dungeon Crawl Classics RPG rulebook.
+        n: The number of characters to roll.
+        testSuitability: If True, only keep characters whose attribute modifiers
+            sum to 0 or greater.
+        noHuman, noDwarf, noElf, noHalfling: Make sure no characters of that race are
+            created. If all four are set, they are all ignored.
+        rng: A numpy.random.Generator, a dcc_rng.DiceRoller to seed one from,
+            or a seed for one.
+    """
+    if noHuman and noDwarf and noElf and noHalfling:
+        noHuman = noDwarf = noElf = noHalfling = False
+    if isinstance(rng, DiceRoller):
+        rng = np.random.default_rng(rng.streamSeed)
+    elif not isinstance(rng, np.random.Generator):
+        rng = np.random.default_rng(rng)
+
+    tables = getBatchTables(dataDict)
+    batch = CharacterBatch(tables, testSuitability, noHuman, noDwarf, noElf, noHalfling)
+
+    #Ability scores.
+    if testSuitability:
+        scores = rollSuitableScores(rng, tables, n)
+    else:
+        scores = rng.integers(1, 7, size=(n, 6, 3), dtype=np.int8).sum(axis=2, dtype=np.int8)
+    modifiers = tables.modifiers[scores]
+    batch.scores = scores
+    batch.modifiers = modifiers
+    strMod, agiMod, staMod, intMod, perMod, lucMod = modifiers.T.astype(np.int16)
+
+    #Lucky sign and saving throws.
+    sign = rng.integers(0, len(tables.luckySigns), size=n)
+    batch.luckySign = sign
+    batch.reflex = agiMod + tables.reflexSign[sign] * lucMod
+    batch.fortitude = staMod + tables.fortitudeSign[sign] * lucMod
+    batch.willpower = perMod + tables.willpowerSign[sign] * lucMod
+
+    #Race, from the alias table for the allowed races.
+    sampler = getRaceSampler(noHuman, noDwarf, noElf, noHalfling)
+    column, point = np.divmod(rng.integers(0, sampler.columns, size=n), sampler.total)
+    keep = point < np.array(sampler.thresholds)[column]
+    race = np.where(keep, column, np.array(sampler.aliases)[column])
+    batch.race = race
+
+    #Occupation, and the extra rolls some occupations need.
+    occupation = np.empty(n, dtype=np.int16)
+    for code in range(len(RACES)):
+        rows = np.flatnonzero(race == code)
+        rollToRow = tables.occupationRolls[code]
+        occupation[rows] = rollToRow[rng.integers(1, len(rollToRow), size=len(rows))]
+    batch.occupation = occupation
+
+    batch.ammo = np.where(tables.hasAmmo[occupation], rollDice(rng, 6, 1, n), 0)
+    animalRoll = rollDice(rng, 20, 1, n)
+    batch.animal = np.where(tables.hasAnimal[occupation] & (animalRoll > 14), animalRoll - 14, -1)
+    batch.farmer = np.where(tables.isFarmer[occupation], rollDice(rng, 8, 1, n) - 1, -1)
+    batch.cart = np.where(tables.isWainwright[occupation], rollDice(rng, 6, 1, n) - 1, -1)
+
+    batch.languages = rollLanguages(rng, tables, scores[:, 3], intMod, lucMod, sign, race)
+
+    #Money.
+    batch.gp = tables.extraGP[occupation]
+    batch.sp = tables.extraSP[occupation]
+    batch.cp = rollDice(rng, 12, 5, n) + tables.extraCP[occupation]
+
+    batch.equipment = rng.integers(0, len(tables.equipment), size=n)
+
+    #Speed, initiative, hit points and armor class.
+    batch.speed = np.where((race == DWARF) | (race == HALFLING), 20, 30) + tables.wildChildSign[sign] * lucMod * 5
+    batch.initiative = agiMod + tables.cobraSign[sign] * lucMod
+    hitPoints = rollDice(rng, 4, 1, n) + staMod + tables.harvestSign[sign] * lucMod
+    batch.hitPoints = np.maximum(hitPoints, 1)
+    armorClass = 10 + agiMod + tables.charmedHouseSign[sign] * lucMod
+    batch.armorClass = armorClass + np.where(batch.animal < 0, tables.armorBonus[occupation], 0)
+
+    return batch
+
+
+def rollSuitableScores(rng, tables, n):
+    """
+    Return an (n, 6) array of suitable ability scores, rolled one ability at a time
+    for the whole batch the same way as SuitabilitySampler.sample.
+    """
+    scores = np.empty((n, 6), dtype=np.int8)
+    modSum = np.full(n, tables.suitableOffset, dtype=np.int16)
+    for k in range(6):
+        cumulative = tables.suitableCumulative[k][modSum]
+        roll = rng.integers(0, cumulative[:, -1])
+        i = (cumulative <= roll[:, None]).sum(axis=1)
+        scores[:, k] = tables.suitableScores[i]
+        modSum += tables.suitableModifiers[i]
+    return scores
+
+
+def rollLanguages(rng, tables, intelligence, intMod, lucMod, sign, race):
+    """
+    Return an (n, k) array of language codes for a batch, padded with -1, following
+    the rules of dccZeroLevelChar.getLanguages. Bonus languages are rolled one round
+    at a time for every character that still needs one, from the languages that
+    character doesn't know yet, as LanguageSampler.sampleDistinct does.
+    """
+    n = len(race)
+    common = tables.languages.index(COMMON)
+    illiterate = tables.languages.index(ILLITERATE)
+
+    literate = intelligence >= 8
+    bonus = np.where(literate, intMod + tables.birdsongSign[sign] * lucMod, 0)
+    bonus = np.maximum(bonus, 0)
+    width = 2 + (int(bonus.max()) if n else 0)
+
+    languages = np.full((n, width), -1, dtype=np.int16)
+    languages[:, 0] = common
+    languages[:, 1] = np.where(intelligence <= 5, illiterate, np.where(literate, tables.raceLanguage[race], -1))
+
+    rows = np.flatnonzero(bonus > 0)
+    weights = tables.languageWeights[race[rows]].astype(np.int32)
+    known = languages[rows, 1]
+    weights[np.flatnonzero(known >= 0), known[known >= 0]] = 0
+    for column in range(2, width):
+        needed = bonus[rows] > column - 2
+        rows, weights = rows[needed], weights[needed]
+        cumulative = weights.cumsum(axis=1)
+        roll = rng.integers(0, cumulative[:, -1])
+        newLang = (cumulative <= roll[:, None]).sum(axis=1)
+        languages[rows, column] = newLang
+        weights[np.arange(len(rows)), newLang] = 0
+
+    return languages
@@ -0,0 +1,78 @@
+"""
+This script compares the memory used by a roster of dccZeroLevelChar objects with
+the same roster kept as CompactChar records, at 1,000,000 characters.
+
+Rolling a million dccZeroLevelChar objects takes a while and a lot of memory, so
+by default their size is measured on a sample and scaled up. Pass --full to
+build all of them.
+
+Functions:
+    measure(build)
+    main()
+
+Dependencies:
+    Modules:
+        argparse
+        tracemalloc
+        character_generator2
+        char_record
+        table_store
+    Files:
+        dcc_tables.bin
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dcc_root_path
+from character_generator2 import dccZeroLevelChar
+from char_record import CompactChar, getRecordTables
+from table_store import loadTables
+
+ROOT_PATH = dcc_root_path.get_root_path()
+
+ROSTER_SIZE = 1000000
+SAMPLE_SIZE = 20000
+
+
+
+def measure(build):
+    """Return (result of build(), bytes it allocated, seconds it took)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, allocated, seconds
+
+
+def main():
+    """Print the memory used by each kind of roster."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--full", action="store_true", help="build all {} dccZeroLevelChar objects instead of a sample".format(ROSTER_SIZE))
+    args = parser.parse_args()
+
+    dataDict = loadTables("{}data_files/".format(ROOT_PATH))
+    tables = getRecordTables(dataDict)
+
+    charCount = ROSTER_SIZE if args.full else SAMPLE_SIZE
+    chars, charBytes, charSeconds = measure(lambda: [dccZeroLevelChar(dataDict) for i in range(charCount)])
+    charBytes = charBytes * ROSTER_SIZE // charCount
+
+    #Every record gets its own copy of the packed data, so none are shared.
+    packed = [CompactChar.fromChar(myChar, tables).data for myChar in chars]
+    del chars
+    records, recordBytes, recordSeconds = measure(lambda: [CompactChar(tables, bytes(bytearray(packed[i % len(packed)]))) for i in range(ROSTER_SIZE)])
+
+    print("{:,} characters".format(ROSTER_SIZE))
+    print("dccZeroLevelChar: {:>10.1f} MB {:>6.0f} bytes each{}".format(charBytes / 1e6, charBytes / ROSTER_SIZE, "" if args.full else " (scaled from {:,})".format(charCount)))
+    print("CompactChar:      {:>10.1f} MB {:>6.0f} bytes each".format(recordBytes / 1e6, recordBytes / ROSTER_SIZE))
+    print("Reduction:        {:>10.1f}x".format(charBytes / recordBytes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+This script times loading the rulebook tables from SQLite with db_tables, against
+the compiled table file, unpickling them the way the old data_files/dcc_dict was
+loaded, and parsing the .csv and .txt files with import_data.getDataFiles.
+
+The script builds a temporary database from the source files with
+populate_database, times that rebuild, and checks db_tables reads back the same
+dataDict before timing anything else. The cases take turns, and the best round
+of each is printed.
+
+Functions:
+    timeIt(func, repeats)
+    loadPickle(picklePath)
+    readFresh(dbPath)
+    main()
+
+Dependencies:
+    Modules:
+        pickle
+        tempfile
+        time
+        db_tables
+        import_data
+        populate_database
+        table_store
+    Files:
+        dcc_tables.bin
+"""
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dcc_root_path
+import db_tables
+from import_data import getDataFiles
+from populate_database import populateDatabase
+from table_store import loadTables, readTableStore, STORE_NAME, DB_NAME
+
+ROOT_PATH = dcc_root_path.get_root_path()
+DATA_PATH = "{}data_files/".format(ROOT_PATH)
+
+REPEATS = 200
+REBUILD_REPEATS = 20
+ROUNDS = 7
+
+
+
+def timeIt(func, repeats):
+    """Return the seconds func takes to run repeats times."""
+    started = time.perf_counter()
+    for i in range(repeats):
+        func()
+    return time.perf_counter() - started
+
+
+def loadPickle(picklePath):
+    """Load the dataDict the way web_dcc2 used to load data_files/dcc_dict."""
+    readable = open(picklePath, "rb")
+    dataDict = pickle.load(readable)
+    readable.close()
+    return dataDict
+
+
+def readFresh(dbPath):
+    """Read the tables from dbPath with db_tables, without its cache."""
+    db_tables._cache.clear()
+    return db_tables.loadDBTables(dbPath)
+
+
+def main():
+    """Time rebuilding the database, check db_tables reads it back, then print the best time per load of each way of loading the tables."""
+    dataDict = getDataFiles(DATA_PATH)
+    #Make sure the compiled file is there and up to date before timing it.
+    loadTables(DATA_PATH)
+    workFolder = tempfile.mkdtemp()
+    dbPath = os.path.join(workFolder, DB_NAME)
+    picklePath = os.path.join(workFolder, "dcc_dict")
+    try:
+        rebuild = min(timeIt(lambda: populateDatabase(DATA_PATH, dbPath), REBUILD_REPEATS) for i in range(ROUNDS))
+        if db_tables.loadDBTables(dbPath) != dataDict:
+            raise SystemExit("db_tables didn't read back the same tables")
+        writable = open(picklePath, "wb")
+        pickle.dump(dataDict, writable)
+        writable.close()
+
+        cases = [
+            ("sqlite, cached", lambda: db_tables.loadDBTables(dbPath)),
+            ("sqlite, queried", lambda: readFresh(dbPath)),
+            ("compiled file, read only", lambda: readTableStore(DATA_PATH + STORE_NAME)),
+            ("compiled file, checked", lambda: loadTables(DATA_PATH)),
+            ("pickle", lambda: loadPickle(picklePath)),
+            ("parse .csv/.txt", lambda: getDataFiles(DATA_PATH)),
+        ]
+        best = {name: float("inf") for name, func in cases}
+        for i in range(ROUNDS):
+            for name, func in cases:
+                best[name] = min(best[name], timeIt(func, REPEATS))
+    finally:
+        for name in os.listdir(workFolder):
+            os.remove(os.path.join(workFolder, name))
+        os.rmdir(workFolder)
+    print("{:<26}{:>8.1f} ms per rebuild".format("populate_database", rebuild / REBUILD_REPEATS * 1e3))
+    for name, func in cases:
+        print("{:<26}{:>8.1f} us per load".format(name, best[name] / REPEATS * 1e6))
+
+
+if __name__ == "__main__":
+    main()
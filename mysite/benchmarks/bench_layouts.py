@@ -0,0 +1,76 @@
+"""
+This script times assembling a print run of characters with each sheet_layout
+layout, and converting the pages with cairosvg when it will load, and prints
+the pages and the time per character for each. Dense layouts like "a3:3x3" make
+fewer pages, so less of each page's fixed cost is paid per character.
+
+Functions:
+    timeLayout(dataDict, layout, count, svg2pdf=None)
+    main()
+
+Dependencies:
+    Modules:
+        time
+        cairosvg
+        char_sheet_assembler2
+        sheet_layout
+        table_store
+    Files:
+        dcc_tables.bin
+        2x2_template_blank.svg
+        char_sheet_blank.svg
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dcc_root_path
+from char_sheet_assembler2 import assemblePages
+from table_store import loadTables
+
+ROOT_PATH = dcc_root_path.get_root_path()
+
+LAYOUTS = ["letter", "a4", "a3", "index_card"]
+#A multiple of every layout's cells, so no layout has a part-empty page.
+COUNT = 36
+
+
+
+def timeLayout(dataDict, layout, count, svg2pdf=None):
+    """
+    Return (pages, assemble seconds, render seconds) for count characters in layout.
+    The render seconds are None without svg2pdf.
+    """
+    started = time.perf_counter()
+    pages = list(assemblePages(dataDict, count, True, False, False, False, False, 0, layout))
+    assembleSeconds = time.perf_counter() - started
+    if svg2pdf is None:
+        return len(pages), assembleSeconds, None
+    started = time.perf_counter()
+    for page in pages:
+        svg2pdf(bytestring=page)
+    return len(pages), assembleSeconds, time.perf_counter() - started
+
+
+def main():
+    """Print the pages and time per character for each layout."""
+    dataDict = loadTables("{}data_files/".format(ROOT_PATH))
+    try:
+        from cairosvg import svg2pdf
+    except (ImportError, OSError) as error:
+        print("cairosvg won't load, so only assembling is timed: {}".format(str(error).splitlines()[0]))
+        svg2pdf = None
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else COUNT
+    #Warm up the templates and tables.
+    timeLayout(dataDict, "letter", 4)
+
+    print("{:<16}{:>7}{:>18}{:>18}".format("layout", "pages", "assemble us/char", "render us/char"))
+    for layout in LAYOUTS:
+        pages, assembleSeconds, renderSeconds = timeLayout(dataDict, layout, count, svg2pdf)
+        render = "-" if renderSeconds is None else "{:.1f}".format(renderSeconds / count * 1e6)
+        print("{:<16}{:>7}{:>18.1f}{:>18}".format(layout, pages, assembleSeconds / count * 1e6, render))
+
+
+if __name__ == "__main__":
+    main()
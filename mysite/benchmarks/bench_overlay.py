@@ -0,0 +1,94 @@
+"""
+This script times making a 2x2 sheet .pdf both ways char_sheet_assembler2 can:
+converting the whole page with cairosvg.svg2pdf, and the overlay render mode,
+which replays a recording of the blank page and converts only the characters'
+values over it. It times one page at a time, as /character_funnel makes them,
+and a multi-page .pdf, and prints the .pdf sizes.
+
+The overlay's blank page is recorded before the timing starts, as each render
+pool worker does when it starts. Without cairo, only the .svg each mode hands to
+cairosvg for a page is measured.
+
+Functions:
+    timeIt(func, repeats)
+    main()
+
+Dependencies:
+    Modules:
+        io
+        time
+        cairosvg
+        char_sheet_assembler2
+        dcc_rng
+        multi_page_pdf
+        table_store
+    Files:
+        dcc_tables.bin
+        2x2_template_blank.svg
+        char_sheet_blank.svg
+"""
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dcc_root_path
+from char_sheet_assembler2 import assembleSVGBytes, assemblePages, getBackground
+from dcc_rng import DiceRoller
+from table_store import loadTables
+
+ROOT_PATH = dcc_root_path.get_root_path()
+
+REPEATS = 50
+#Characters in the multi-page .pdf.
+PAGES_COUNT = 40
+
+
+
+def timeIt(func, repeats):
+    """Return the seconds it takes to call func(i) for i in range(repeats)."""
+    start = time.perf_counter()
+    for i in range(repeats):
+        func(i)
+    return time.perf_counter() - start
+
+
+def main():
+    """Print the time per page and .pdf size for each render mode."""
+    dataDict = loadTables("{}data_files/".format(ROOT_PATH))
+    options = (True, False, False, False, False)
+    fullPage = assembleSVGBytes(dataDict, *options, DiceRoller(0))
+    overlayPage = assembleSVGBytes(dataDict, *options, DiceRoller(0), overlay=True)
+    print("svg for cairosvg per page: whole page {:.1f} KB, overlay {:.1f} KB (blank page {:.1f} KB, recorded once)".format(
+        len(fullPage) / 1024, len(overlayPage) / 1024, len(getBackground()) / 1024))
+
+    try:
+        from cairosvg import svg2pdf
+        from multi_page_pdf import getRecording, renderPage, writePDFPages
+    except (ImportError, OSError) as error:
+        print("cairosvg won't load, so nothing was rendered: {}".format(str(error).splitlines()[0]))
+        return
+    started = time.perf_counter()
+    getRecording(getBackground())
+    print("recording the blank page: {:.1f} ms, once per process".format((time.perf_counter() - started) * 1000))
+
+    #One page at a time, assembling included, as a request makes it.
+    wholeTime = timeIt(lambda i: svg2pdf(bytestring=assembleSVGBytes(dataDict, *options, DiceRoller(i))), REPEATS)
+    overlayTime = timeIt(lambda i: renderPage((getBackground(), assembleSVGBytes(dataDict, *options, DiceRoller(i), overlay=True))), REPEATS)
+    wholeSize = len(svg2pdf(bytestring=fullPage))
+    overlaySize = len(renderPage((getBackground(), overlayPage)))
+    print("svg2pdf:   {:>8.1f} ms per page  {:>8.1f} KB".format(wholeTime / REPEATS * 1000, wholeSize / 1024))
+    print("overlay:   {:>8.1f} ms per page  {:>8.1f} KB  {:>5.1f}x".format(overlayTime / REPEATS * 1000, overlaySize / 1024, wholeTime / overlayTime))
+
+    pageCount = (PAGES_COUNT + 3) // 4
+    for overlay in (False, True):
+        output = io.BytesIO()
+        started = time.perf_counter()
+        writePDFPages(assemblePages(dataDict, PAGES_COUNT, *options, 0, overlay=overlay), output)
+        seconds = time.perf_counter() - started
+        print("{} pages, {:<8} {:>8.1f} ms per page  {:>8.1f} KB".format(pageCount, "overlay:" if overlay else "whole:", seconds / pageCount * 1000, len(output.getvalue()) / 1024))
+
+
+if __name__ == "__main__":
+    main()
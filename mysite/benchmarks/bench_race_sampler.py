@@ -0,0 +1,78 @@
+"""
+This script times the race roll for all 16 combinations of the noHuman, noDwarf,
+noElf and noHalfling filters, comparing the old d10 reroll loop with the alias
+table samplers from compiled_tables. With every race filtered out, none of them
+are, as in dccZeroLevelChar, so the old loop is timed with no filters for it.
+
+Functions:
+    rerollRace(noHuman, noDwarf, noElf, noHalfling)
+    timeIt(func, repeats)
+    main()
+
+Dependencies:
+    Modules:
+        itertools
+        os
+        random
+        sys
+        time
+        compiled_tables
+"""
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compiled_tables import getRaceSampler, RACES
+
+REPEATS = 200000
+
+
+
+def rerollRace(noHuman, noDwarf, noElf, noHalfling):
+    """Return a race the way dccZeroLevelChar.getRace used to, rerolling a d10 until it is allowed."""
+    race_okay = False
+    while not race_okay:
+        race_roll = random.randint(1, 10)
+        if race_roll == 1 and not noDwarf:
+            race = "Dwarf"
+            race_okay = True
+        elif race_roll == 2 and not noElf:
+            race = "Elf"
+            race_okay = True
+        elif race_roll == 3 and not noHalfling:
+            race = "Halfling"
+            race_okay = True
+        elif not noHuman:
+            race = "Human"
+            race_okay = True
+
+    return race
+
+
+def timeIt(func, repeats):
+    """Return the seconds it takes to call func repeats times."""
+    start = time.perf_counter()
+    for i in range(repeats):
+        func()
+    return time.perf_counter() - start
+
+
+def main():
+    """Print the time per race roll for each filter combination."""
+    print("{:<34}{:>12}{:>12}{:>9}".format("filters", "reroll ns", "alias ns", "speedup"))
+    for flags in itertools.product([False, True], repeat=4):
+        #The reroll loop would never end with every race filtered out.
+        oldFlags = (False, False, False, False) if all(flags) else flags
+        oldTime = timeIt(lambda: rerollRace(*oldFlags), REPEATS)
+        newTime = timeIt(lambda: RACES[getRaceSampler(*flags).sample()], REPEATS)
+        label = ",".join(name for name, flag in zip(["noHuman", "noDwarf", "noElf", "noHalfling"], flags) if flag) or "none"
+        if all(flags):
+            label = "all (none filtered)"
+        print("{:<34}{:>12.0f}{:>12.0f}{:>8.1f}x".format(label, oldTime / REPEATS * 1e9, newTime / REPEATS * 1e9, oldTime / newTime))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+This script measures how long web_dcc2 takes to start: importing the module,
+making the app with create_app(), and the first /character_funnel request, both
+when everything is loaded lazily by that request and when create_app(warm=True)
+has loaded it up front. Each case runs in a new Python process, so nothing is
+already imported or cached.
+
+Functions:
+    runCase(code)
+    main()
+
+Dependencies:
+    Modules:
+        json
+        subprocess
+        sys
+        web_dcc2
+"""
+import json
+import os
+import subprocess
+import sys
+
+MYSITE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#Run in a new process; prints a JSON dictionary of timings in milliseconds.
+CASE = """
+import json, sys, time
+sys.path.insert(0, {mysite!r})
+started = time.perf_counter()
+import web_dcc2
+times = {{"import": (time.perf_counter() - started) * 1000}}
+started = time.perf_counter()
+app = web_dcc2.create_app(warm={warm})
+times["create_app"] = (time.perf_counter() - started) * 1000
+client = app.test_client()
+for request in ("first_request", "second_request"):
+    started = time.perf_counter()
+    response = client.post("/character_funnel", data={{"suitability": "on", "seed": "1"}})
+    times[request] = (time.perf_counter() - started) * 1000
+    assert response.status_code == 200, response.status_code
+web_dcc2.getServices().warmPool.stop()
+web_dcc2.getServices().renderPool.shutdown()
+print(json.dumps(times))
+"""
+
+REPEATS = 3
+
+
+
+def runCase(code):
+    """Run code in a new Python process and return the timings it prints, as a dictionary."""
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    """Print the best of REPEATS runs of each startup time, lazy and warmed up."""
+    for warm in (False, True):
+        runs = [runCase(CASE.format(mysite=MYSITE, warm=warm)) for i in range(REPEATS)]
+        print("warm={}".format(warm))
+        for name in runs[0]:
+            print("    {:<16}{:>9.1f} ms".format(name, min(run[name] for run in runs)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+This script runs the benchmark suite: one case for each step of making a sheet,
+from rolling a character to a whole /character_funnel request. For each case it
+reports operations per second, the median and 99th percentile time per operation
+and the peak memory, and saves the results as JSON. Pass --compare with an
+earlier results file to see what got slower.
+
+Each operation is timed on its own, with a new seed, after a few untimed warm-up
+calls. Peak memory is measured in a separate, shorter pass with tracemalloc, so
+it doesn't slow the timed calls; it counts Python allocations only, not lxml's
+or cairo's own. The process's peak resident size is saved as well.
+
+Cases:
+    char_suitable    dccZeroLevelChar(dataDict), with the suitability test
+    char_any         dccZeroLevelChar(dataDict, False), without it
+    write_svg        char_sheet_creator2.writeSVG for one character
+    assemble_sheets  char_sheet_assembler2.assemble_sheets, four characters to an .svg file
+    svg2pdf          cairosvg.svg2pdf on an assembled page
+    overlay_pdf      multi_page_pdf.renderPage on the same page's overlay, over the recorded blank page
+    funnel_request   a seeded POST to /character_funnel through flask's test client
+    json_request     a seeded GET of /characters?count=4, the same four characters as JSON
+
+The request case runs the render pool inline (DCC_RENDER_WORKERS=0) and the warm
+pool off (DCC_WARM_SIZE=0), unless they are set already, so it times the request
+itself. The sheets it saves in static/output are deleted afterwards, and
+assemble_sheets writes to a temporary file instead of static/new_sheet.svg.
+
+Functions:
+    percentile(sortedTimes, fraction)
+    measureCase(op, repeats, warmUps, memoryRepeats)
+    setUpCases(dataDict)
+    setUpAssembleSheets(dataDict)
+    setUpFunnelRequest()
+    setUpJSONRequest()
+    getGitCommit()
+    compareResults(results, previous, threshold)
+    main()
+
+Dependencies:
+    Modules:
+        argparse
+        json
+        platform
+        resource
+        subprocess
+        tempfile
+        tracemalloc
+        cairosvg
+        multi_page_pdf
+        character_generator2
+        char_sheet_creator2
+        char_sheet_assembler2
+        dcc_rng
+        table_store
+        web_dcc2
+    Files:
+        dcc_tables.bin
+        char_sheet_blank.svg
+        2x2_template_blank.svg
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+MYSITE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MYSITE)
+import dcc_root_path
+from character_generator2 import dccZeroLevelChar
+from char_sheet_creator2 import writeSVG
+import char_sheet_assembler2
+from dcc_rng import DiceRoller
+from table_store import loadTables
+
+ROOT_PATH = dcc_root_path.get_root_path()
+RESULTS_PATH = os.path.join(MYSITE, "benchmarks", "results")
+
+#Default operations timed for each case; the slow ones get fewer.
+REPEATS = {
+    "char_suitable": 2000,
+    "char_any": 2000,
+    "write_svg": 1000,
+    "assemble_sheets": 200,
+    "svg2pdf": 50,
+    "overlay_pdf": 50,
+    "funnel_request": 50,
+    "json_request": 1000,
+}
+WARM_UPS = 5
+MEMORY_REPEATS = 20
+#A case counts as a regression when it is this much slower than before.
+DEFAULT_THRESHOLD = 0.10
+
+
+
+def percentile(sortedTimes, fraction):
+    """Return the time fraction of the way through sortedTimes, by nearest rank."""
+    index = max(0, min(len(sortedTimes) - 1, int(round(fraction * len(sortedTimes))) - 1))
+    return sortedTimes[index]
+
+
+def measureCase(op, repeats, warmUps=WARM_UPS, memoryRepeats=MEMORY_REPEATS):
+    """
+    Time repeats calls of op(i), then measure the peak memory of memoryRepeats more,
+    and return the results as a dictionary.
+
+    Args:
+        op: Called with the operation's number, to use as its seed.
+        repeats: Number of calls to time.
+        warmUps: Untimed calls made first, to fill caches.
+        memoryRepeats: Number of calls made while tracing memory.
+    """
+    for i in range(warmUps):
+        op(i)
+    times = []
+    clock = time.perf_counter
+    for i in range(repeats):
+        started = clock()
+        op(i)
+        times.append(clock() - started)
+    times.sort()
+    total = sum(times)
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        for i in range(memoryRepeats):
+            op(repeats + i)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "repeats": repeats,
+        "ops_per_sec": repeats / total,
+        "mean_ms": total / repeats * 1000,
+        "p50_ms": percentile(times, 0.50) * 1000,
+        "p99_ms": percentile(times, 0.99) * 1000,
+        "min_ms": times[0] * 1000,
+        "max_ms": times[-1] * 1000,
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def setUpCases(dataDict):
+    """
+    Return a dictionary of case name to (op, cleanUp), where cleanUp is None or is
+    called once the case is done. A case that can't run here, because cairosvg
+    won't load say, has an error message in place of (op, cleanUp).
+    """
+    cases = {}
+    cases["char_suitable"] = (lambda i: dccZeroLevelChar(dataDict, True, rng=DiceRoller(i)), None)
+    cases["char_any"] = (lambda i: dccZeroLevelChar(dataDict, False, rng=DiceRoller(i)), None)
+    myChar = dccZeroLevelChar(dataDict, rng=DiceRoller(0))
+    cases["write_svg"] = (lambda i: writeSVG(myChar), None)
+    cases["assemble_sheets"] = setUpAssembleSheets(dataDict)
+
+    try:
+        from cairosvg import svg2pdf
+    except (ImportError, OSError) as error:
+        cases["svg2pdf"] = "cairosvg won't load: {}".format(error)
+    else:
+        page = char_sheet_assembler2.assembleSVGBytes(dataDict, True, False, False, False, False, DiceRoller(0))
+        cases["svg2pdf"] = (lambda i: svg2pdf(bytestring=page), None)
+    try:
+        from multi_page_pdf import renderPage
+    except (ImportError, OSError) as error:
+        cases["overlay_pdf"] = "cairosvg won't load: {}".format(error)
+    else:
+        overlayPage = (char_sheet_assembler2.getBackground(), char_sheet_assembler2.assembleSVGBytes(dataDict, True, False, False, False, False, DiceRoller(0), overlay=True))
+        cases["overlay_pdf"] = (lambda i: renderPage(overlayPage), None)
+
+    try:
+        cases["funnel_request"] = setUpFunnelRequest()
+    except (ImportError, OSError) as error:
+        cases["funnel_request"] = "the app won't start: {}".format(error)
+    cases["json_request"] = setUpJSONRequest()
+    return cases
+
+
+def setUpAssembleSheets(dataDict):
+    """
+    Return (op, cleanUp) for the assemble_sheets case, with char_sheet_assembler2
+    writing to a temporary file rather than the static/new_sheet.svg in the repo.
+    """
+    handle, path = tempfile.mkstemp(suffix=".svg")
+    os.close(handle)
+    original = char_sheet_assembler2.NEW_SHEET_SVG
+    char_sheet_assembler2.NEW_SHEET_SVG = path
+
+    def op(i):
+        char_sheet_assembler2.assemble_sheets(dataDict, True, False, False, False, False, DiceRoller(i))
+
+    def cleanUp():
+        char_sheet_assembler2.NEW_SHEET_SVG = original
+        os.remove(path)
+
+    return op, cleanUp
+
+
+def setUpFunnelRequest():
+    """Return (op, cleanUp) for the funnel_request case, starting the app's services."""
+    os.environ.setdefault("DCC_RENDER_WORKERS", "0")
+    os.environ.setdefault("DCC_WARM_SIZE", "0")
+    import web_dcc2
+    app = web_dcc2.create_app(warm=True)
+    client = app.test_client()
+    services = web_dcc2.getServices()
+    saved = []
+
+    def op(i):
+        response = client.post("/character_funnel", data={"suitability": "on", "seed": str(i)})
+        if response.status_code != 200:
+            raise RuntimeError("/character_funnel returned {}".format(response.status_code))
+        saved.append(response.headers["Content-Disposition"].split('filename="')[1].rstrip('"'))
+
+    def cleanUp():
+        for name in saved:
+            try:
+                os.remove(services.outputStore.getPath(name))
+            except FileNotFoundError:
+                pass
+        services.warmPool.stop()
+        services.outputStore.stop()
+        services.jobManager.shutdown()
+        services.renderPool.shutdown()
+
+    return op, cleanUp
+
+
+def setUpJSONRequest():
+    """Return (op, None) for the json_request case. It needs none of the app's services."""
+    import web_dcc2
+    client = web_dcc2.create_app().test_client()
+
+    def op(i):
+        response = client.get("/characters?count=4&suitability=on&seed={}".format(i))
+        if response.status_code != 200:
+            raise RuntimeError("/characters returned {}".format(response.status_code))
+
+    return op, None
+
+
+def getGitCommit():
+    """Return the checked out git commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=MYSITE, check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compareResults(results, previous, threshold):
+    """
+    Print each case's ops/sec and p99 against an earlier run, and return the names
+    of the cases that slowed down by more than threshold.
+    """
+    regressions = []
+    print()
+    print("{:<18}{:>14}{:>14}{:>9}{:>12}".format("vs. " + (previous.get("commit") or "?")[:10], "ops/sec", "was", "change", "p99 change"))
+    for name, result in results["cases"].items():
+        old = previous["cases"].get(name)
+        if "ops_per_sec" not in result or old is None or "ops_per_sec" not in old:
+            continue
+        change = result["ops_per_sec"] / old["ops_per_sec"] - 1
+        p99Change = result["p99_ms"] / old["p99_ms"] - 1
+        flag = ""
+        if change < -threshold:
+            regressions.append(name)
+            flag = "  SLOWER"
+        print("{:<18}{:>14.1f}{:>14.1f}{:>+8.0%}{:>+12.0%}{}".format(name, result["ops_per_sec"], old["ops_per_sec"], change, p99Change, flag))
+    return regressions
+
+
+def main():
+    """Run the cases asked for, print and save the results, and compare them with an earlier run."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("cases", nargs="*", help="cases to run (default: all of {})".format(", ".join(REPEATS)))
+    parser.add_argument("--repeats", type=int, help="operations to time in each case, instead of each case's default")
+    parser.add_argument("--output", help="JSON file to save the results in (default: benchmarks/results/suite_<time>.json)")
+    parser.add_argument("--compare", help="an earlier results file to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="slowdown in ops/sec that counts as a regression (default: %(default)s)")
+    args = parser.parse_args()
+    for name in args.cases:
+        if name not in REPEATS:
+            parser.error("no case named {!r}".format(name))
+    names = args.cases or list(REPEATS)
+
+    started = datetime.now()
+    dataDict = loadTables("{}data_files/".format(ROOT_PATH))
+    cases = setUpCases(dataDict)
+    results = {
+        "started": started.isoformat(timespec="seconds"),
+        "commit": getGitCommit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "environment": {key: value for key, value in os.environ.items() if key.startswith("DCC_")},
+        "cases": {},
+    }
+
+    print("{:<18}{:>12}{:>10}{:>10}{:>12}".format("case", "ops/sec", "p50 ms", "p99 ms", "peak KB"))
+    try:
+        for name in names:
+            case = cases[name]
+            if isinstance(case, str):
+                results["cases"][name] = {"skipped": case}
+                print("{:<18}skipped: {}".format(name, case))
+                continue
+            op, cleanUp = case
+            result = measureCase(op, args.repeats or REPEATS[name])
+            results["cases"][name] = result
+            print("{:<18}{:>12.1f}{:>10.3f}{:>10.3f}{:>12.1f}".format(name, result["ops_per_sec"], result["p50_ms"], result["p99_ms"], result["peak_memory_kb"]))
+    finally:
+        for case in cases.values():
+            if not isinstance(case, str) and case[1] is not None:
+                case[1]()
+    #ru_maxrss is in kilobytes on Linux.
+    results["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_PATH, exist_ok=True)
+        output = os.path.join(RESULTS_PATH, "suite_{}.json".format(started.strftime("%Y%m%d_%H%M%S")))
+    writable = open(output, "w")
+    json.dump(results, writable, indent=2)
+    writable.close()
+    print("saved {}".format(output))
+
+    if args.compare:
+        readable = open(args.compare)
+        previous = json.load(readable)
+        readable.close()
+        regressions = compareResults(results, previous, args.threshold)
+        if regressions:
+            print("regressions: {}".format(", ".join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
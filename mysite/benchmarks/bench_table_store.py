@@ -0,0 +1,84 @@
+"""
+This script times loading the rulebook tables from the compiled table file made
+by table_store, against unpickling them the way the old data_files/dcc_dict was
+loaded, and against parsing the .csv and .txt files with import_data.getDataFiles.
+The cases take turns, and the best round of each is printed, since a load takes
+well under a millisecond and the timings are easily thrown off.
+
+Functions:
+    timeIt(func, repeats)
+    loadPickle(picklePath)
+    main()
+
+Dependencies:
+    Modules:
+        pickle
+        tempfile
+        time
+        import_data
+        table_store
+    Files:
+        dcc_tables.bin
+"""
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dcc_root_path
+from import_data import getDataFiles
+from table_store import loadTables, readTableStore, STORE_NAME
+
+ROOT_PATH = dcc_root_path.get_root_path()
+DATA_PATH = "{}data_files/".format(ROOT_PATH)
+
+REPEATS = 2000
+ROUNDS = 7
+
+
+
+def timeIt(func, repeats):
+    """Return the seconds func takes to run repeats times."""
+    started = time.perf_counter()
+    for i in range(repeats):
+        func()
+    return time.perf_counter() - started
+
+
+def loadPickle(picklePath):
+    """Load the dataDict the way web_dcc2 used to load data_files/dcc_dict."""
+    readable = open(picklePath, "rb")
+    dataDict = pickle.load(readable)
+    readable.close()
+    return dataDict
+
+
+def main():
+    """Print the best time per load of each way of loading the tables."""
+    #Make sure the compiled file is there and up to date before timing it.
+    dataDict = loadTables(DATA_PATH)
+    pickled = tempfile.NamedTemporaryFile(suffix=".dcc_dict", delete=False)
+    pickled.write(pickle.dumps(dataDict))
+    pickled.close()
+
+    cases = [
+        ("compiled file, read only", lambda: readTableStore(DATA_PATH + STORE_NAME)),
+        ("compiled file, checked", lambda: loadTables(DATA_PATH)),
+        ("pickle", lambda: loadPickle(pickled.name)),
+        ("parse .csv/.txt", lambda: getDataFiles(DATA_PATH)),
+    ]
+    best = {name: float("inf") for name, func in cases}
+    try:
+        for i in range(ROUNDS):
+            for name, func in cases:
+                best[name] = min(best[name], timeIt(func, REPEATS))
+    finally:
+        os.remove(pickled.name)
+    for name, func in cases:
+        print("{:<26}{:>8.1f} us per load".format(name, best[name] / REPEATS * 1e6))
+
+
+if __name__ == "__main__":
+    main()
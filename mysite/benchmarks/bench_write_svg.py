@@ -0,0 +1,187 @@
+"""
+This script times char_sheet_creator2.writeSVG, which fills a copy of the cached
+blank sheet through its compiled bindings, and writeSVGBytes, which fills the
+serialized sheet without building a tree, against the old version that parsed
+char_sheet_blank.svg and checked every element's id for each sheet. It also
+checks that all three write the same sheet.
+
+It then times what char_sheet_assembler2 puts on a page for each sheet:
+writeContent, a filled copy of the content group's tree, and writeContentBytes,
+the serialized content group the assembler splices into the page, and checks
+that they match.
+
+Functions:
+    reparseWriteSVG(myChar)
+    timeIt(func, repeats)
+    main()
+
+Dependencies:
+    Modules:
+        lxml
+        time
+        character_generator2
+        char_sheet_creator2
+        dcc_rng
+        table_store
+    Files:
+        char_sheet_blank.svg
+        dcc_tables.bin
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lxml import etree as et
+import dcc_root_path
+from character_generator2 import dccZeroLevelChar
+from char_sheet_creator2 import writeSVG, writeSVGBytes, writeContent, writeContentBytes, convertInt, listSplit, BLANK_SHEET
+from dcc_rng import DiceRoller
+from table_store import loadTables
+
+ROOT_PATH = dcc_root_path.get_root_path()
+
+REPEATS = 500
+
+
+
+def reparseWriteSVG(myChar):
+    """
+    The writeSVG this project used before the template cache, kept to compare against.
+    Parse a .svg file, inserting text data into the tspans (based on their id
+        attributes) from a dccZeroLevelChar object.
+    """
+    tree = et.parse(BLANK_SHEET)
+
+    important_ids = ["strScore", "strMod", "agiScore", "agiMod", "hitPoints", "armorClass", "spdScore", "staScore", "staMod", "initMod", "intScore", "intMod", "fortMod", "reflexMod", "willMod", "perScore", "perMod", "lucScore", "lucMod", "occupation", "money", "weapon1", "weapon2", "luckySign1", "luckySign2", "languages1", "languages2", "equipment1", "equipment2", "traits1", "traits2"]
+
+    for element in tree.iter():
+        thisId = element.get("id")
+        if thisId in important_ids:
+            if thisId == "strScore":
+                element.text = convertInt(myChar.strengthScore)
+            elif thisId == "strMod":
+                element.text = convertInt(myChar.strengthModifier, True)
+            elif thisId == "agiScore":
+                element.text = convertInt(myChar.agilityScore)
+            elif thisId == "agiMod":
+                element.text = convertInt(myChar.agilityModifier, True)
+            elif thisId == "hitPoints":
+                element.text = str(myChar.hitPoints)
+            elif thisId == "armorClass":
+                element.text = str(myChar.armorClass)
+            elif thisId == "spdScore":
+                element.text = convertInt(myChar.speed)
+            elif thisId == "staScore":
+                element.text = convertInt(myChar.staminaScore)
+            elif thisId == "staMod":
+                element.text = convertInt(myChar.staminaModifier, True)
+            elif thisId == "initMod":
+                element.text = convertInt(myChar.initiative, True)
+            elif thisId == "intScore":
+                element.text = convertInt(myChar.intelligenceScore)
+            elif thisId == "intMod":
+                element.text = convertInt(myChar.intelligenceModifier, True)
+            elif thisId == "fortMod":
+                element.text = convertInt(myChar.fortitudeSavingThrow, True)
+            elif thisId == "reflexMod":
+                element.text = convertInt(myChar.reflexSavingThrow, True)
+            elif thisId == "willMod":
+                element.text = convertInt(myChar.willpowerSavingThrow, True)
+            elif thisId == "perScore":
+                element.text = convertInt(myChar.personalityScore)
+            elif thisId == "perMod":
+                element.text = convertInt(myChar.personalityModifier, True)
+            elif thisId == "lucScore":
+                element.text = convertInt(myChar.luckScore)
+            elif thisId == "lucMod":
+                element.text = convertInt(myChar.luckModifier, True)
+            elif thisId == "occupation":
+                element.text = myChar.occupation
+            elif thisId == "money":
+                myMoney = ""
+                myGP, mySP, myCP = myChar.money["GP"], myChar.money["SP"], myChar.money["CP"]
+                if myGP != 0:
+                    myMoney += "GP:" + str(myGP) + " "
+                if mySP != 0:
+                    myMoney += "SP:" + str(mySP) + " "
+                if myCP != 0:
+                    myMoney += "CP:" + str(myCP)
+                element.text = myMoney
+            elif thisId == "weapon1":
+                element.text = myChar.trainedWeapon + " " + myChar.trainedWeaponDamage
+            elif thisId == "weapon2":
+                element.text = myChar.trainedWeaponRange
+            elif thisId == "luckySign1":
+                sign = myChar.luckySign.split(": ")
+                element.text = sign[0] + ":"
+            elif thisId == "luckySign2":
+                sign = myChar.luckySign.split(": ")
+                element.text = sign[1]
+            elif thisId == "languages1":
+                firstLangs = str(listSplit(myChar.languages, "first"))
+                element.text = firstLangs
+            elif thisId == "languages2":
+                secondLangs = str(listSplit(myChar.languages, "second"))
+                element.text = secondLangs
+            elif thisId == "equipment1":
+                firstEquip = str(listSplit(myChar.equipment, "first"))
+                element.text = firstEquip
+            elif thisId == "equipment2":
+                secondEquip = str(listSplit(myChar.equipment, "second"))
+                element.text = secondEquip
+            elif thisId == "traits1":
+                firstTraits = str(listSplit(myChar.racialTraits, "first"))
+                element.text = firstTraits
+            elif thisId == "traits2":
+                secondTraits = str(listSplit(myChar.racialTraits, "second"))
+                element.text = secondTraits
+            else:
+                pass
+
+    return tree
+
+
+def timeIt(func, repeats):
+    """Return the seconds it takes to call func repeats times."""
+    start = time.perf_counter()
+    for i in range(repeats):
+        func()
+    return time.perf_counter() - start
+
+
+def main():
+    """Print the time per sheet for each version of writeSVG."""
+    dataDict = loadTables("{}data_files/".format(ROOT_PATH))
+    myChar = dccZeroLevelChar(dataDict, rng=DiceRoller(0))
+
+    expected = et.tostring(reparseWriteSVG(myChar))
+    if et.tostring(writeSVG(myChar)) != expected or writeSVGBytes(myChar) != expected:
+        print("The versions wrote different sheets!")
+        return
+
+    oldTime = timeIt(lambda: reparseWriteSVG(myChar), REPEATS)
+    treeTime = timeIt(lambda: writeSVG(myChar), REPEATS)
+    bytesTime = timeIt(lambda: writeSVGBytes(myChar), REPEATS)
+    print("re-parse writeSVG: {:>8.1f} us per sheet".format(oldTime / REPEATS * 1e6))
+    print("cached writeSVG:   {:>8.1f} us per sheet  {:>5.1f}x".format(treeTime / REPEATS * 1e6, oldTime / treeTime))
+    print("writeSVGBytes:     {:>8.1f} us per sheet  {:>5.1f}x".format(bytesTime / REPEATS * 1e6, oldTime / bytesTime))
+
+    #The content group's bytes have no namespace declarations of their own, like
+    #the group's serialized inside the sheet.
+    content = writeContent(myChar)
+    wrapper = et.Element(content.tag, nsmap=content.nsmap)
+    wrapper.append(content)
+    expected = et.tostring(wrapper)
+    expected = expected[expected.index(b">") + 1:expected.rindex(b"</")]
+    if writeContentBytes(myChar) != expected:
+        print("writeContent and writeContentBytes wrote different content groups!")
+        return
+    contentTime = timeIt(lambda: writeContent(myChar), REPEATS)
+    contentBytesTime = timeIt(lambda: writeContentBytes(myChar), REPEATS)
+    print("writeContent:      {:>8.1f} us per sheet  {:>5.1f}x".format(contentTime / REPEATS * 1e6, oldTime / contentTime))
+    print("writeContentBytes: {:>8.1f} us per sheet  {:>5.1f}x".format(contentBytesTime / REPEATS * 1e6, oldTime / contentBytesTime))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+This module provides a compact record of a Dungeon Crawl Classics RPG 0 level
+character, for keeping large rosters in memory. A CompactChar stores only the
+dice results, packed into one bytes object, with small integer codes standing in
+for the lucky sign, race, occupation, equipment and languages. Everything else,
+and every name, is worked out from shared RecordTables when it is asked for.
+
+A CompactChar has the same attributes as a dccZeroLevelChar, so it can be passed
+to anything that reads one, like char_sheet_creator2.writeSVG.
+
+Classes:
+    RecordTables
+    CompactChar
+
+Functions:
+    getRecordTables(dataDict)
+
+Dependencies:
+    Modules:
+        character_generator2
+        import_data
+    Files:
+        Table1_1_Ability_Score_Modifiers.csv
+        Table1_2_Luck_Score.txt
+        Human_Occupations.csv
+        Dwarf_Occupations.csv
+        Elf_Occupations.csv
+        Halfling_Occupations.csv
+        Table1_3a_Farmer_Type.txt
+        Table1_3b_Animal_Type.txt
+        Table1_3c_Whats_In_The_Cart.txt
+        Table3_4_Equipment.txt
+        AppendixL.csv
+"""
+from character_generator2 import dccZeroLevelChar, EXTRA_FUNDS
+from compiled_tables import RACES
+
+#Where each value sits in CompactChar.data. Languages fill the rest.
+STR, AGI, STA, INT, PER, LUCK = range(6)
+SIGN = 6
+RACE = 7
+OCCUPATION = 8
+AMMO = 9
+ANIMAL = 10
+FARMER = 11
+CART = 12
+EQUIPMENT = 13
+HIT_POINTS = 14
+COPPER = 15
+OPTIONS = 16
+LANGUAGES = 17
+
+#Bits of the OPTIONS byte.
+OPTION_NAMES = ["testSuitability", "noHuman", "noDwarf", "noElf", "noHalfling"]
+
+_recordCache = {}
+
+
+
+class RecordTables:
+    """
+    RecordTables holds the name lists that CompactChar codes index, and the
+    reverse lookups used to turn names back into codes. They are built once per
+    dataDict; use getRecordTables to get the shared copy.
+
+    Properties:
+        dataDict -> dictionary
+        modifiers -> dictionary     Ability modifier for each score.
+        luckySigns -> list
+        occupations -> list         (race, Occupation, Trained Weapon, Trade Goods) for
+                                    every row of every race's occupation table.
+        equipment, animals, farmers, whatsInCart -> list
+        languages -> list           AppendixL languages, then Common and Illiterate.
+        signCodes, occupationCodes, equipmentCodes, animalCodes, farmerCodes,
+        cartCodes, languageCodes -> dictionary
+                                    Name -> code; occupations are keyed by (race, name).
+    """
+
+
+    def __init__(self, dataDict):
+        """
+        Build the name lists.
+
+        Args:
+            dataDict: a dictinary containing all the table data from the character
+                creation section of the Dungeon Crawl Classics RPG rulebook.
+        """
+        self.dataDict = dataDict
+        self.modifiers = {score: row["Modifier"] for score, row in dataDict["Ability Score Modifiers"].items()}
+
+        self.luckySigns = dataDict["Luck Scores"]
+        self.occupations = []
+        for race in RACES:
+            for row in dataDict[race + " Occupation"].values():
+                self.occupations.append((race, row["Occupation"], row["Trained Weapon"], row["Trade Goods"]))
+        self.equipment = dataDict["Equipment"]
+        self.animals = dataDict["Animal Type"]
+        self.farmers = dataDict["Farmer Type"]
+        self.whatsInCart = dataDict["What's In The Cart"]
+        self.languages = list(dataDict["Languages"]) + ["Common", "Illiterate"]
+
+        self.signCodes = {sign: code for code, sign in enumerate(self.luckySigns)}
+        self.occupationCodes = {(race, job): code for code, (race, job, weapon, goods) in enumerate(self.occupations)}
+        self.equipmentCodes = {item: code for code, item in enumerate(self.equipment)}
+        self.animalCodes = {animal: code for code, animal in enumerate(self.animals)}
+        self.farmerCodes = {farmer + " farmer": code for code, farmer in enumerate(self.farmers)}
+        self.cartCodes = {"Pushcart full of " + contents: code for code, contents in enumerate(self.whatsInCart)}
+        self.languageCodes = {lang: code for code, lang in enumerate(self.languages)}
+
+
+
+class CompactChar:
+    """
+    CompactChar is a read-only, slotted record of one dccZeroLevelChar.
+
+    Properties:
+        tables -> RecordTables
+        data -> bytes               The packed dice results and codes.
+
+        ...and every property of dccZeroLevelChar, worked out from data.
+
+    Methods:
+        __init__(self, tables, data) -> CompactChar
+        fromChar(cls, myChar, tables=None) -> CompactChar
+        toChar(self) -> dccZeroLevelChar
+        __str__(self) -> string
+    """
+    __slots__ = ("tables", "data")
+
+
+    def __init__(self, tables, data):
+        """
+        Wrap packed character data.
+
+        Args:
+            tables: The RecordTables the codes in data refer to.
+            data: bytes, laid out as described by the offsets at the top of this module.
+        """
+        self.tables = tables
+        self.data = data
+
+
+    @classmethod
+    def fromChar(cls, myChar, tables=None):
+        """
+        Return a CompactChar holding the same character as a dccZeroLevelChar.
+
+        Args:
+            myChar: The dccZeroLevelChar to pack.
+            tables: RecordTables to use; by default, the ones for myChar.dataDict.
+        """
+        if tables is None:
+            tables = getRecordTables(myChar.dataDict)
+
+        job = myChar.occupation
+        farmer = 0
+        if (myChar.race, job) not in tables.occupationCodes:
+            farmer = tables.farmerCodes[job] + 1
+            job = "Farmer"
+        occupation = tables.occupationCodes[(myChar.race, job)]
+        race, job, weapon, goods = tables.occupations[occupation]
+
+        ammo = 0
+        if myChar.trainedWeapon != weapon:
+            ammo = int(myChar.trainedWeapon[len(weapon):].split()[1])
+
+        animal = cart = 0
+        if myChar.tradeGoods != goods:
+            if myChar.tradeGoods in tables.cartCodes:
+                cart = tables.cartCodes[myChar.tradeGoods] + 1
+            else:
+                animal = tables.animalCodes[myChar.tradeGoods] + 1
+
+        options = 0
+        for bit, name in enumerate(OPTION_NAMES):
+            if getattr(myChar, name):
+                options |= 1 << bit
+
+        data = bytes([myChar.strengthScore, myChar.agilityScore, myChar.staminaScore,
+                      myChar.intelligenceScore, myChar.personalityScore, myChar.luckScore,
+                      tables.signCodes[myChar.luckySign],
+                      RACES.index(myChar.race),
+                      occupation,
+                      ammo,
+                      animal,
+                      farmer,
+                      cart,
+                      tables.equipmentCodes[myChar.equipment[-1]],
+                      myChar.hitPoints,
+                      myChar.money["CP"] - EXTRA_FUNDS.get(myChar.occupation, (0, 0, 0))[2],
+                      options] +
+                     [tables.languageCodes[lang] for lang in myChar.languages])
+        return cls(tables, data)
+
+
+    def toChar(self):
+        """Return this character as a full dccZeroLevelChar, without rolling anything again."""
+        myChar = dccZeroLevelChar.__new__(dccZeroLevelChar)
+        myChar.dataDict = self.tables.dataDict
+        for name in OPTION_NAMES:
+            setattr(myChar, name, getattr(self, name))
+        for name in CHAR_FIELDS:
+            setattr(myChar, name, getattr(self, name))
+        if myChar.testSuitability:
+            myChar.suitable = myChar.charIsSuitable()
+        return myChar
+
+
+    #Options the character was rolled with.
+    testSuitability = property(lambda self: bool(self.data[OPTIONS] & 1))
+    noHuman = property(lambda self: bool(self.data[OPTIONS] & 2))
+    noDwarf = property(lambda self: bool(self.data[OPTIONS] & 4))
+    noElf = property(lambda self: bool(self.data[OPTIONS] & 8))
+    noHalfling = property(lambda self: bool(self.data[OPTIONS] & 16))
+
+    #Values stored as they were rolled.
+    strengthScore = property(lambda self: self.data[STR])
+    agilityScore = property(lambda self: self.data[AGI])
+    staminaScore = property(lambda self: self.data[STA])
+    intelligenceScore = property(lambda self: self.data[INT])
+    personalityScore = property(lambda self: self.data[PER])
+    luckScore = property(lambda self: self.data[LUCK])
+    hitPoints = property(lambda self: self.data[HIT_POINTS])
+
+    #Values looked up in the shared tables.
+    strengthModifier = property(lambda self: self.tables.modifiers[self.data[STR]])
+    agilityModifier = property(lambda self: self.tables.modifiers[self.data[AGI]])
+    staminaModifier = property(lambda self: self.tables.modifiers[self.data[STA]])
+    intelligenceModifier = property(lambda self: self.tables.modifiers[self.data[INT]])
+    personalityModifier = property(lambda self: self.tables.modifiers[self.data[PER]])
+    luckModifier = property(lambda self: self.tables.modifiers[self.data[LUCK]])
+    luckySign = property(lambda self: self.tables.luckySigns[self.data[SIGN]])
+    race = property(lambda self: RACES[self.data[RACE]])
+    languages = property(lambda self: [self.tables.languages[code] for code in self.data[LANGUAGES:]])
+
+    #Values worked out by the same methods dccZeroLevelChar uses.
+    reflexSavingThrow = property(lambda self: dccZeroLevelChar.getSavingThrows(self)[0])
+    fortitudeSavingThrow = property(lambda self: dccZeroLevelChar.getSavingThrows(self)[1])
+    willpowerSavingThrow = property(lambda self: dccZeroLevelChar.getSavingThrows(self)[2])
+    racialTraits = property(dccZeroLevelChar.getRacialTraits)
+    trainedWeaponDamage = property(lambda self: dccZeroLevelChar.getWeaponDamage(self)[0])
+    trainedWeaponRange = property(lambda self: dccZeroLevelChar.getWeaponDamage(self)[1])
+    speed = property(dccZeroLevelChar.getSpeed)
+    initiative = property(dccZeroLevelChar.getInitiative)
+    armorClass = property(dccZeroLevelChar.getArmorClass)
+    __str__ = dccZeroLevelChar.__str__
+
+
+    @property
+    def occupation(self):
+        """Return the occupation, with the kind of farmer filled in."""
+        job = self.tables.occupations[self.data[OCCUPATION]][1]
+        if self.data[FARMER]:
+            job = self.tables.farmers[self.data[FARMER] - 1] + " farmer"
+        return job
+
+
+    @property
+    def trainedWeapon(self):
+        """Return the trained weapon, with any ammo."""
+        weapon = self.tables.occupations[self.data[OCCUPATION]][2]
+        if self.data[AMMO]:
+            weapon = weapon + " + " + str(self.data[AMMO]) + " ammo"
+        return weapon
+
+
+    @property
+    def tradeGoods(self):
+        """Return the trade goods, with any animal or cart contents filled in."""
+        if self.data[ANIMAL]:
+            return self.tables.animals[self.data[ANIMAL] - 1]
+        if self.data[CART]:
+            return "Pushcart full of " + self.tables.whatsInCart[self.data[CART] - 1]
+        return self.tables.occupations[self.data[OCCUPATION]][3]
+
+
+    @property
+    def money(self):
+        """Return the starting money in a dictionary, as dccZeroLevelChar.getStartingFunds does."""
+        extraGP, extraSP, extraCP = EXTRA_FUNDS.get(self.occupation, (0, 0, 0))
+        return {"GP": extraGP, "SP": extraSP, "CP": self.data[COPPER] + extraCP}
+
+
+    @property
+    def equipment(self):
+        """Return the starting equipment list, as dccZeroLevelChar.getEquipment does."""
+        equipment = [self.trainedWeapon + " " + self.trainedWeaponDamage + " " + self.trainedWeaponRange]
+        if self.tradeGoods != '':
+            equipment.append(self.tradeGoods)
+        equipment.append(self.tables.equipment[self.data[EQUIPMENT]])
+        return equipment
+
+
+#Every property of dccZeroLevelChar that toChar copies over.
+CHAR_FIELDS = ["strengthScore", "agilityScore", "staminaScore", "intelligenceScore", "personalityScore", "luckScore",
+               "strengthModifier", "agilityModifier", "staminaModifier", "intelligenceModifier", "personalityModifier", "luckModifier",
+               "luckySign", "reflexSavingThrow", "fortitudeSavingThrow", "willpowerSavingThrow",
+               "race", "racialTraits", "occupation", "trainedWeapon", "tradeGoods", "languages", "money",
+               "trainedWeaponDamage", "trainedWeaponRange", "equipment", "speed", "initiative", "hitPoints", "armorClass"]
+
+
+
+def getRecordTables(dataDict):
+    """Return the RecordTables for dataDict, building them the first time it is seen."""
+    cached = _recordCache.get(id(dataDict))
+    if cached is None or cached[0] is not dataDict:
+        cached = (dataDict, RecordTables(dataDict))
+        _recordCache[id(dataDict)] = cached
+    return cached[1]
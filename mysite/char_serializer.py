@@ -0,0 +1,71 @@
+"""
+This module turns a dccZeroLevelChar, or a char_record.CompactChar, into plain
+data for JSON and CSV output, without the sheet templates or cairosvg.
+
+Every field is read straight off the character's attributes, in a fixed order,
+so a roster of any size can be written one character at a time.
+
+It reads the attributes the two kinds of character share, so it imports neither
+and has no dependencies.
+
+Functions:
+    characterToDict(myChar)
+    characterToRow(myChar)
+"""
+
+#The columns of characterToRow, in order.
+CSV_FIELDS = [
+    "race", "occupation",
+    "strength", "strength_mod", "agility", "agility_mod", "stamina", "stamina_mod",
+    "intelligence", "intelligence_mod", "personality", "personality_mod", "luck", "luck_mod",
+    "lucky_sign", "reflex", "fortitude", "willpower",
+    "hit_points", "armor_class", "initiative", "speed",
+    "trained_weapon", "weapon_damage", "weapon_range", "trade_goods",
+    "gp", "sp", "cp", "languages", "equipment", "racial_traits",
+]
+#What joins the items of a list in a CSV cell.
+LIST_SEPARATOR = "; "
+
+
+
+def characterToDict(myChar):
+    """Return a dictionary of the character's properties, of only strs, ints, lists and dicts, for json.dumps."""
+    return {
+        "race": myChar.race,
+        "occupation": myChar.occupation,
+        "abilities": {
+            "strength": [myChar.strengthScore, myChar.strengthModifier],
+            "agility": [myChar.agilityScore, myChar.agilityModifier],
+            "stamina": [myChar.staminaScore, myChar.staminaModifier],
+            "intelligence": [myChar.intelligenceScore, myChar.intelligenceModifier],
+            "personality": [myChar.personalityScore, myChar.personalityModifier],
+            "luck": [myChar.luckScore, myChar.luckModifier],
+        },
+        "lucky_sign": myChar.luckySign,
+        "saves": {"reflex": myChar.reflexSavingThrow, "fortitude": myChar.fortitudeSavingThrow, "willpower": myChar.willpowerSavingThrow},
+        "hit_points": myChar.hitPoints,
+        "armor_class": myChar.armorClass,
+        "initiative": myChar.initiative,
+        "speed": myChar.speed,
+        "trained_weapon": {"name": myChar.trainedWeapon, "damage": myChar.trainedWeaponDamage, "range": myChar.trainedWeaponRange},
+        "trade_goods": myChar.tradeGoods,
+        "money": {"gp": myChar.money["GP"], "sp": myChar.money["SP"], "cp": myChar.money["CP"]},
+        "languages": list(myChar.languages),
+        "equipment": list(myChar.equipment),
+        "racial_traits": list(myChar.racialTraits),
+    }
+
+
+def characterToRow(myChar):
+    """Return the character's properties as a list of CSV_FIELDS values, with lists joined by LIST_SEPARATOR."""
+    return [
+        myChar.race, myChar.occupation,
+        myChar.strengthScore, myChar.strengthModifier, myChar.agilityScore, myChar.agilityModifier,
+        myChar.staminaScore, myChar.staminaModifier, myChar.intelligenceScore, myChar.intelligenceModifier,
+        myChar.personalityScore, myChar.personalityModifier, myChar.luckScore, myChar.luckModifier,
+        myChar.luckySign, myChar.reflexSavingThrow, myChar.fortitudeSavingThrow, myChar.willpowerSavingThrow,
+        myChar.hitPoints, myChar.armorClass, myChar.initiative, myChar.speed,
+        myChar.trainedWeapon, myChar.trainedWeaponDamage, myChar.trainedWeaponRange, myChar.tradeGoods,
+        myChar.money["GP"], myChar.money["SP"], myChar.money["CP"],
+        LIST_SEPARATOR.join(myChar.languages), LIST_SEPARATOR.join(myChar.equipment), LIST_SEPARATOR.join(myChar.racialTraits),
+    ]
@@ -2,14 +2,56 @@
 This module will fetch 4 dccZeroLevelChar characters sheets from char_sheet_creator2
 and assemble them in a 2x2 template on one 11'x8.5' .svg.
 
+Any sheet_layout grid and paper can be used instead of the 2x2 Letter page, such
+as "a3:3x3" for nine sheets to a page; each function takes an optional layout,
+a spec for sheet_layout.getLayout, and rolls as many characters as it has cells.
+Only the filled content group of each sheet goes on the page. The groups are
+filled and put on the page as serialized bytes, spliced between chunks of the
+blank sheet and page cut up once, so no tree is built unless one is asked for.
+
+The page can be kept in memory the whole way: assemblePage returns the lxml tree,
+assemblePageBytes and assembleSVGBytes the serialized .svg, and assemblePDF the .pdf bytes from cairosvg,
+so nothing is written to disk and overlapping requests can't clobber each other.
+assemble_sheets still writes static/new_sheet.svg for callers that want a file.
+assemblePages and assembleMultiPagePDF make any number of characters, four to a
+page, one page at a time, so the memory used doesn't grow with the page count.
+
+With DCC_RENDER_MODE=overlay, assemblePDF and assembleMultiPagePDF don't have
+cairosvg draw every box, line and label of every sheet again. getBackground makes
+the .svg of a page of blank sheets once, multi_page_pdf records it with cairo the
+first time it draws it, and each page replays that under an overlay .svg with only
+the characters' values in it. The default, DCC_RENDER_MODE=svg2pdf, converts the
+whole page.
+
+Each of them takes an optional timings dictionary, which gets the seconds spent
+in each stage added to it: roll, write_svg, assemble, render and write_file.
+Without one, nothing is timed.
+
 Functions:
-    assemble_sheets(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling)
+    getPageTemplate()
+    addTime(timings, stage, started)
+    getRenderMode()
+    getBackground(layout=DEFAULT_LAYOUT, cells=None)
+    assemblePageBytes(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng=None, timings=None, charRngs=None, layout=DEFAULT_LAYOUT, overlay=False)
+    assemblePage(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng=None, timings=None, charRngs=None, layout=DEFAULT_LAYOUT, overlay=False)
+    assembleSVGBytes(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng=None, timings=None, layout=DEFAULT_LAYOUT, overlay=False)
+    assemblePDF(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng=None, timings=None, layout=DEFAULT_LAYOUT)
+    assemble_sheets(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng=None, timings=None, layout=DEFAULT_LAYOUT)
+    assemblePages(dataDict, count, testSuitability, noHuman, noDwarf, noElf, noHalfling, seed=None, layout=DEFAULT_LAYOUT, overlay=False)
+    assembleMultiPagePDF(dataDict, count, testSuitability, noHuman, noDwarf, noElf, noHalfling, seed, output, layout=DEFAULT_LAYOUT)
 
 Dependencies:
     Modules:
+        copy
+        os
+        time
         lxml
+        cairosvg
+        multi_page_pdf
         character_generator2
         char_sheet_creator2
+        dcc_rng
+        sheet_layout
         import_data
     Files:
         2x2_template_blank.svg
@@ -26,40 +68,208 @@ Dependencies:
         Table3_4_Equipment.txt
         AppendixL.csv
 """
+import copy
+import os
+import time
 from lxml import etree as et
 import character_generator2
-from char_sheet_creator2 import writeSVG
+from char_sheet_creator2 import getTemplate, writeContentBytes, writeOverlayBytes
+from dcc_rng import DiceRoller
+from sheet_layout import getLayout, DEFAULT_LAYOUT
 import dcc_root_path
 
 ROOT_PATH = dcc_root_path.get_root_path()
 
-def assemble_sheets(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling):
-    """Put 4 character sheets from char_sheet_creator2 together on one 11'x8.5' .svg."""
-    NEW_SHEET_SVG = "{}static/new_sheet.svg".format(ROOT_PATH)
-    TWO_BY_TWO_TEMPLATE = "{}templates/2x2_template_blank.svg".format(ROOT_PATH)
-
-    #Get four characters on four sheets.
-    #Each sheet is an lxml etree object.
-    sheets = []
-    for i in range(4):
-        sheets.append(writeSVG(character_generator2.dccZeroLevelChar(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling)))
-
-    two_by_two_temp = et.parse(TWO_BY_TWO_TEMPLATE)
-    to_write = []
-
-    #For each sheet, find the <g> element with the "content" id attribute,
-    #and put it in a list.
-    for sheet in sheets:
-        for element in sheet.iter():
-            if element.get("id") == "content":
-                to_write.append(element)
-    #In, the 2x2 template, find the <g> elements with "charsheet" id attribute,
-    #put one of the sheet, "content" groups into each.
-    for element in two_by_two_temp.iter():
-        if element.get("class") == "charsheet":
-            element.append(to_write.pop(0))
+NEW_SHEET_SVG = "{}static/new_sheet.svg".format(ROOT_PATH)
+TWO_BY_TWO_TEMPLATE = "{}templates/2x2_template_blank.svg".format(ROOT_PATH)
+DEFAULT_RENDER_MODE = "svg2pdf"
+
+_pageTemplate = None
+#The .svg bytes of each blank page made by getBackground, by (layout name, cells).
+_backgrounds = {}
+
+
+
+def getPageTemplate():
+    """Return the parsed 2x2 template, parsing it the first time it is asked for. Don't change it; copy it."""
+    global _pageTemplate
+    if _pageTemplate is None:
+        _pageTemplate = et.parse(TWO_BY_TWO_TEMPLATE)
+    return _pageTemplate
+
+
+def addTime(timings, stage, started):
+    """Add the seconds since started to timings[stage], and return the time now."""
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + now - started
+    return now
+
+
+def getRenderMode():
+    """
+    Return the DCC_RENDER_MODE environment variable: "svg2pdf" to convert each whole
+    page, or "overlay" to draw only the characters' values over a recorded blank page.
+
+    Raise a ValueError for any other mode.
+    """
+    mode = os.environ.get("DCC_RENDER_MODE", DEFAULT_RENDER_MODE)
+    if mode not in ("svg2pdf", "overlay"):
+        raise ValueError("DCC_RENDER_MODE is {!r}, not svg2pdf or overlay".format(mode))
+    return mode
+
+
+def getBackground(layout=DEFAULT_LAYOUT, cells=None):
+    """
+    Return the utf-8 .svg bytes of a page of blank sheets, with the boxes, lines and
+    labels in the first cells cells of layout (all of them if None), making it the
+    first time it is asked for. The same bytes object is returned every time.
+    """
+    pageLayout = getLayout(layout)
+    if cells is None:
+        cells = pageLayout.perPage
+    key = (pageLayout.name, cells)
+    background = _backgrounds.get(key)
+    if background is None:
+        sheet = getTemplate().background
+        page = pageLayout.makePage(getPageTemplate(), [copy.deepcopy(sheet) for i in range(cells)])
+        background = et.tostring(page, encoding="utf-8")
+        _backgrounds[key] = background
+    return background
+
+
+def assemblePageBytes(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng=None, timings=None, charRngs=None, layout=DEFAULT_LAYOUT, overlay=False):
+    """
+    Put 4 character sheets from char_sheet_creator2 together on one 11'x8.5' page,
+    or as many as layout has cells on its paper, and return it as utf-8 .svg bytes.
+
+    Each character rolls from its own child stream of rng, a dcc_rng.DiceRoller,
+    so the same seed always gives the same characters. If rng is None, a new
+    randomly seeded DiceRoller is used. charRngs, a list of streams, one for each
+    cell at most, can be given instead; any cells past the last one are left blank.
+
+    If overlay is True, only the characters' values are put on the page, to be
+    drawn over getBackground's page.
+
+    Each sheet's values are spliced into the serialized blank sheet, and the sheets
+    into the serialized page, so no tree is built or copied.
+    """
+    pageLayout = getLayout(layout)
+    fill = writeOverlayBytes if overlay else writeContentBytes
+    #Get a filled content group for each character.
+    if charRngs is None:
+        if rng is None:
+            rng = DiceRoller()
+        charRngs = rng.split(pageLayout.perPage)
+    contents = []
+    if timings is None:
+        for charRng in charRngs:
+            contents.append(fill(character_generator2.dccZeroLevelChar(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, charRng)))
+    else:
+        started = time.perf_counter()
+        for charRng in charRngs:
+            myChar = character_generator2.dccZeroLevelChar(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, charRng)
+            started = addTime(timings, "roll", started)
+            contents.append(fill(myChar))
+            started = addTime(timings, "write_svg", started)
+
+    #Put them in the layout's cells, on the template.
+    page = pageLayout.makePageBytes(getPageTemplate(), contents)
+    if timings is not None:
+        addTime(timings, "assemble", started)
+    return page
+
+
+def assemblePage(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng=None, timings=None, charRngs=None, layout=DEFAULT_LAYOUT, overlay=False):
+    """Return the page from assemblePageBytes, parsed, as an lxml etree object."""
+    svgBytes = assemblePageBytes(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng, timings, charRngs, layout, overlay)
+    if timings is None:
+        return et.fromstring(svgBytes).getroottree()
+    #Parsing the page counts as assembling it.
+    started = time.perf_counter()
+    page = et.fromstring(svgBytes).getroottree()
+    addTime(timings, "assemble", started)
+    return page
+
+
+def assembleSVGBytes(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng=None, timings=None, layout=DEFAULT_LAYOUT, overlay=False):
+    """Return the page from assemblePageBytes."""
+    return assemblePageBytes(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng, timings, layout=layout, overlay=overlay)
+
+
+def assemblePDF(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng=None, timings=None, layout=DEFAULT_LAYOUT):
+    """
+    Return the page from assemblePageBytes as .pdf bytes.
+
+    cairosvg reads the .svg from the bytes with its own parser, so the page goes
+    straight from memory to the .pdf without a file in between. It is imported
+    here, the first time a .pdf is made, since it is slow to import. In the overlay
+    render mode, only the characters' values are converted, over the recorded
+    blank page.
+    """
+    overlay = getRenderMode() == "overlay"
+    svgBytes = assembleSVGBytes(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng, timings, layout, overlay)
+    started = time.perf_counter()
+    if overlay:
+        from multi_page_pdf import renderPage
+        pdf = renderPage((getBackground(layout), svgBytes))
+    else:
+        from cairosvg import svg2pdf
+        pdf = svg2pdf(bytestring=svgBytes)
+    if timings is not None:
+        addTime(timings, "render", started)
+    return pdf
+
+
+def assemble_sheets(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng=None, timings=None, layout=DEFAULT_LAYOUT):
+    """
+    Put 4 character sheets from char_sheet_creator2 together on one 11'x8.5' .svg,
+    write it to static/new_sheet.svg and return the path.
+
+    The file is shared, so two calls at once can overwrite each other's page; use
+    assemblePDF or assembleSVGBytes when that matters.
+    """
     #Write the filled out 2x2 template to an .svg file.
-    file = open(NEW_SHEET_SVG, "w")
-    file.write(et.tostring(two_by_two_temp, encoding="unicode"))
+    page = assemblePageBytes(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng, timings, layout=layout)
+    started = time.perf_counter()
+    file = open(NEW_SHEET_SVG, "wb")
+    file.write(page)
     file.close()
+    if timings is not None:
+        addTime(timings, "write_file", started)
     return NEW_SHEET_SVG
+
+
+def assemblePages(dataDict, count, testSuitability, noHuman, noDwarf, noElf, noHalfling, seed=None, layout=DEFAULT_LAYOUT, overlay=False):
+    """
+    Yield the utf-8 .svg bytes of each page of count characters, one page at a
+    time, with the last page's empty cells left blank. If overlay is True, yield
+    (background, overlay) pairs of .svg bytes instead, from getBackground and
+    assemblePageBytes.
+
+    Character i rolls from DiceRoller(seed, (i,)), the i-th child of the seed, so
+    the characters are the same for any layout, and the first page is the same as
+    assemblePage's with DiceRoller(seed).
+    """
+    rootSeed = DiceRoller(seed).rootSeed
+    perPage = getLayout(layout).perPage
+    for start in range(0, count, perPage):
+        charRngs = [DiceRoller(rootSeed, (i,)) for i in range(start, min(start + perPage, count))]
+        page = assemblePageBytes(dataDict, testSuitability, noHuman, noDwarf, noElf, noHalfling, charRngs=charRngs, layout=layout, overlay=overlay)
+        if overlay:
+            yield getBackground(layout, len(charRngs)), page
+        else:
+            yield page
+
+
+def assembleMultiPagePDF(dataDict, count, testSuitability, noHuman, noDwarf, noElf, noHalfling, seed, output, layout=DEFAULT_LAYOUT):
+    """
+    Write count characters as one .pdf, a page for every layout's worth, to output,
+    a path or a binary file, and return the number of pages.
+
+    Each page is assembled, drawn and finished before the next is started, so the
+    memory used stays the same for any count. DCC_RENDER_MODE picks how the pages
+    are drawn, as for assemblePDF.
+    """
+    from multi_page_pdf import writePDFPages
+    overlay = getRenderMode() == "overlay"
+    return writePDFPages(assemblePages(dataDict, count, testSuitability, noHuman, noDwarf, noElf, noHalfling, seed, layout, overlay), output)
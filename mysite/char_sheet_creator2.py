@@ -2,13 +2,27 @@
 This module will take a dccZeroLevelChar object and insert the data members into
 a blank character sheet of the .svg format.
 
+Classes:
+    SheetTemplate
+
 Functions:
     convertInt(intValue, signed=False)
     listSplit(list, section)
+    formatMoney(money)
+    findByPath(root, path)
+    cutChunks(element, bindings)
+    getTemplate()
     writeSVG(dccZeroLevelChar)
+    writeSVGBytes(dccZeroLevelChar)
+    writeContent(dccZeroLevelChar)
+    writeContentBytes(dccZeroLevelChar)
+    writeOverlay(dccZeroLevelChar)
+    writeOverlayBytes(dccZeroLevelChar)
 
 Dependencies:
     Modules:
+        copy
+        html
         lxml
         cairosvg
         character_generator2
@@ -27,6 +41,8 @@ Dependencies:
         Table3_4_Equipment.txt
         AppendixL.csv
 """
+import copy
+from html import escape
 from lxml import etree as et
 import dcc_root_path
 
@@ -34,6 +50,9 @@ ROOT_PATH = dcc_root_path.get_root_path()
 
 BLANK_SHEET = "{}templates/char_sheet_blank.svg".format(ROOT_PATH)
 
+#Stands in for the text of a bound element while the template is cut into chunks.
+FIELD_MARKER = "@@field{}@@"
+
 
 
 def convertInt(intValue, signed=False):
@@ -62,97 +81,278 @@ def listSplit(list, section):
     return theString[:len(theString)-2]
 
 
-def writeSVG(myChar):
+def formatMoney(money):
+    """Return a money dictionary as a string like "GP:4 SP:14 CP:50", leaving out zero amounts."""
+    myMoney = ""
+    myGP, mySP, myCP = money["GP"], money["SP"], money["CP"]
+    if myGP != 0:
+        myMoney += "GP:" + str(myGP) + " "
+    if mySP != 0:
+        myMoney += "SP:" + str(mySP) + " "
+    if myCP != 0:
+        myMoney += "CP:" + str(myCP)
+    return myMoney
+
+
+#The text to put in each tspan of the blank sheet, by id attribute.
+SHEET_FIELDS = {
+    "strScore": lambda myChar: convertInt(myChar.strengthScore),
+    "strMod": lambda myChar: convertInt(myChar.strengthModifier, True),
+    "agiScore": lambda myChar: convertInt(myChar.agilityScore),
+    "agiMod": lambda myChar: convertInt(myChar.agilityModifier, True),
+    "hitPoints": lambda myChar: str(myChar.hitPoints),
+    "armorClass": lambda myChar: str(myChar.armorClass),
+    "spdScore": lambda myChar: convertInt(myChar.speed),
+    "staScore": lambda myChar: convertInt(myChar.staminaScore),
+    "staMod": lambda myChar: convertInt(myChar.staminaModifier, True),
+    "initMod": lambda myChar: convertInt(myChar.initiative, True),
+    "intScore": lambda myChar: convertInt(myChar.intelligenceScore),
+    "intMod": lambda myChar: convertInt(myChar.intelligenceModifier, True),
+    "fortMod": lambda myChar: convertInt(myChar.fortitudeSavingThrow, True),
+    "reflexMod": lambda myChar: convertInt(myChar.reflexSavingThrow, True),
+    "willMod": lambda myChar: convertInt(myChar.willpowerSavingThrow, True),
+    "perScore": lambda myChar: convertInt(myChar.personalityScore),
+    "perMod": lambda myChar: convertInt(myChar.personalityModifier, True),
+    "lucScore": lambda myChar: convertInt(myChar.luckScore),
+    "lucMod": lambda myChar: convertInt(myChar.luckModifier, True),
+    "occupation": lambda myChar: myChar.occupation,
+    "money": lambda myChar: formatMoney(myChar.money),
+    "weapon1": lambda myChar: myChar.trainedWeapon + " " + myChar.trainedWeaponDamage,
+    "weapon2": lambda myChar: myChar.trainedWeaponRange,
+    "luckySign1": lambda myChar: myChar.luckySign.split(": ")[0] + ":",
+    "luckySign2": lambda myChar: myChar.luckySign.split(": ")[1],
+    "languages1": lambda myChar: listSplit(myChar.languages, "first"),
+    "languages2": lambda myChar: listSplit(myChar.languages, "second"),
+    "equipment1": lambda myChar: listSplit(myChar.equipment, "first"),
+    "equipment2": lambda myChar: listSplit(myChar.equipment, "second"),
+    "traits1": lambda myChar: listSplit(myChar.racialTraits, "first"),
+    "traits2": lambda myChar: listSplit(myChar.racialTraits, "second")
+}
+
+_template = None
+
+
+
+class SheetTemplate:
     """
-    Parse a .svg file, inserting text data into the tspans (based on their id
-        attributes) from a dccZeroLevelChar object.
+    SheetTemplate is a blank character sheet parsed once, with its SHEET_FIELDS
+    bindings compiled, ready to be filled for any number of characters.
+
+    Properties:
+        tree -> lxml ElementTree    The parsed blank sheet; never changed.
+        bindings -> list            (path, formatter) for each bound element, where
+                                    path is the list of child indexes that leads
+                                    from the root to the element.
+        chunks -> list              The serialized blank sheet, split where the
+                                    text of each bound element goes.
+        formatters -> list          The formatter for the text after each chunk.
+        content -> lxml Element     The sheet's <g id="content"> group, in tree.
+        contentBindings -> list     bindings, with paths from content instead of the root.
+        background -> lxml Element  A copy of content with only the groups that have
+                                    no bound elements: the boxes, lines and labels.
+        overlay -> lxml Element     A copy of content with only the groups that do.
+        overlayBindings -> list     bindings, with paths from overlay.
+        contentChunks -> list       The serialized content group, split like chunks.
+        overlayChunks -> list       The serialized overlay, split like chunks.
+
+    Methods:
+        __init__(self, sheetPath=BLANK_SHEET) -> SheetTemplate
+        fill(self, myChar) -> lxml ElementTree
+        fillBytes(self, myChar) -> bytes
+        splice(self, chunks, myChar) -> bytes
+        fillContent(self, myChar) -> lxml Element
+        fillContentBytes(self, myChar) -> bytes
+        fillOverlay(self, myChar) -> lxml Element
+        fillOverlayBytes(self, myChar) -> bytes
     """
-    tree = et.parse(BLANK_SHEET)
-
-    important_ids = ["strScore", "strMod", "agiScore", "agiMod", "hitPoints", "armorClass", "spdScore", "staScore", "staMod", "initMod", "intScore", "intMod", "fortMod", "reflexMod", "willMod", "perScore", "perMod", "lucScore", "lucMod", "occupation", "money", "weapon1", "weapon2", "luckySign1", "luckySign2", "languages1", "languages2", "equipment1", "equipment2", "traits1", "traits2"]
-
-    for element in tree.iter():
-        thisId = element.get("id")
-        if thisId in important_ids:
-            if thisId == "strScore":
-                element.text = convertInt(myChar.strengthScore)
-            elif thisId == "strMod":
-                element.text = convertInt(myChar.strengthModifier, True)
-            elif thisId == "agiScore":
-                element.text = convertInt(myChar.agilityScore)
-            elif thisId == "agiMod":
-                element.text = convertInt(myChar.agilityModifier, True)
-            elif thisId == "hitPoints":
-                element.text = str(myChar.hitPoints)
-            elif thisId == "armorClass":
-                element.text = str(myChar.armorClass)
-            elif thisId == "spdScore":
-                element.text = convertInt(myChar.speed)
-            elif thisId == "staScore":
-                element.text = convertInt(myChar.staminaScore)
-            elif thisId == "staMod":
-                element.text = convertInt(myChar.staminaModifier, True)
-            elif thisId == "initMod":
-                element.text = convertInt(myChar.initiative, True)
-            elif thisId == "intScore":
-                element.text = convertInt(myChar.intelligenceScore)
-            elif thisId == "intMod":
-                element.text = convertInt(myChar.intelligenceModifier, True)
-            elif thisId == "fortMod":
-                element.text = convertInt(myChar.fortitudeSavingThrow, True)
-            elif thisId == "reflexMod":
-                element.text = convertInt(myChar.reflexSavingThrow, True)
-            elif thisId == "willMod":
-                element.text = convertInt(myChar.willpowerSavingThrow, True)
-            elif thisId == "perScore":
-                element.text = convertInt(myChar.personalityScore)
-            elif thisId == "perMod":
-                element.text = convertInt(myChar.personalityModifier, True)
-            elif thisId == "lucScore":
-                element.text = convertInt(myChar.luckScore)
-            elif thisId == "lucMod":
-                element.text = convertInt(myChar.luckModifier, True)
-            elif thisId == "occupation":
-                element.text = myChar.occupation
-            elif thisId == "money":
-                myMoney = ""
-                myGP, mySP, myCP = myChar.money["GP"], myChar.money["SP"], myChar.money["CP"]
-                if myGP != 0:
-                    myMoney += "GP:" + str(myGP) + " "
-                if mySP != 0:
-                    myMoney += "SP:" + str(mySP) + " "
-                if myCP != 0:
-                    myMoney += "CP:" + str(myCP)
-                element.text = myMoney
-            elif thisId == "weapon1":
-                element.text = myChar.trainedWeapon + " " + myChar.trainedWeaponDamage
-            elif thisId == "weapon2":
-                element.text = myChar.trainedWeaponRange
-            elif thisId == "luckySign1":
-                sign = myChar.luckySign.split(": ")
-                element.text = sign[0] + ":"
-            elif thisId == "luckySign2":
-                sign = myChar.luckySign.split(": ")
-                element.text = sign[1]
-            elif thisId == "languages1":
-                firstLangs = str(listSplit(myChar.languages, "first"))
-                element.text = firstLangs
-            elif thisId == "languages2":
-                secondLangs = str(listSplit(myChar.languages, "second"))
-                element.text = secondLangs
-            elif thisId == "equipment1":
-                firstEquip = str(listSplit(myChar.equipment, "first"))
-                element.text = firstEquip
-            elif thisId == "equipment2":
-                secondEquip = str(listSplit(myChar.equipment, "second"))
-                element.text = secondEquip
-            elif thisId == "traits1":
-                firstTraits = str(listSplit(myChar.racialTraits, "first"))
-                element.text = firstTraits
-            elif thisId == "traits2":
-                secondTraits = str(listSplit(myChar.racialTraits, "second"))
-                element.text = secondTraits
+
+
+    def __init__(self, sheetPath=BLANK_SHEET):
+        """
+        Parse the blank sheet and compile the bindings.
+
+        Args:
+            sheetPath: The blank .svg character sheet.
+        """
+        self.tree = et.parse(sheetPath)
+        root = self.tree.getroot()
+        self.bindings = []
+        for element in root.iter():
+            formatter = SHEET_FIELDS.get(element.get("id"))
+            if formatter is None:
+                continue
+            path = []
+            child = element
+            while child is not root:
+                parent = child.getparent()
+                path.insert(0, parent.index(child))
+                child = parent
+            self.bindings.append((path, formatter))
+
+        #Every bound element is in the content group, which is all a page needs.
+        self.content = root.find(".//*[@id='content']")
+        contentDepth = len(list(self.content.iterancestors()))
+        self.contentBindings = [(path[contentDepth:], formatter) for path, formatter in self.bindings]
+
+        #Split the content group's children into the ones every sheet has the same,
+        #and the ones with the character's values in them.
+        boundGroups = sorted(set(path[0] for path, formatter in self.contentBindings))
+        self.background = copy.deepcopy(self.content)
+        self.overlay = copy.deepcopy(self.content)
+        for i in reversed(range(len(self.content))):
+            if i in boundGroups:
+                self.background.remove(self.background[i])
             else:
-                pass
+                self.overlay.remove(self.overlay[i])
+        self.overlayBindings = [([boundGroups.index(path[0])] + path[1:], formatter) for path, formatter in self.contentBindings]
+
+        #Serialize a copy with a marker as the text of each bound element,
+        #then cut it up at the markers.
+        marked = copy.deepcopy(self.tree)
+        markedRoot = marked.getroot()
+        for i, (path, formatter) in enumerate(self.bindings):
+            findByPath(markedRoot, path).text = FIELD_MARKER.format(i)
+        serialized = et.tostring(marked)
+        self.chunks = []
+        self.formatters = []
+        for i, (path, formatter) in enumerate(self.bindings):
+            before, serialized = serialized.split(FIELD_MARKER.format(i).encode("ascii"), 1)
+            self.chunks.append(before)
+            self.formatters.append(formatter)
+        self.chunks.append(serialized)
+        #The bindings are in the same order in all three, so the formatters are shared.
+        self.contentChunks = cutChunks(self.content, self.contentBindings)
+        self.overlayChunks = cutChunks(self.overlay, self.overlayBindings)
+
+
+    def fill(self, myChar):
+        """Return a filled copy of the sheet tree for a dccZeroLevelChar."""
+        tree = copy.deepcopy(self.tree)
+        root = tree.getroot()
+        for path, formatter in self.bindings:
+            findByPath(root, path).text = formatter(myChar)
+        return tree
+
+
+    def fillBytes(self, myChar):
+        """
+        Return the filled sheet for a dccZeroLevelChar as serialized .svg bytes,
+        the same as et.tostring(self.fill(myChar)), without building a tree.
+        """
+        return self.splice(self.chunks, myChar)
+
+
+    def splice(self, chunks, myChar):
+        """Return chunks joined with the escaped text of each field for a dccZeroLevelChar between them."""
+        parts = [chunks[0]]
+        for formatter, chunk in zip(self.formatters, chunks[1:]):
+            parts.append(escape(formatter(myChar), quote=False).encode("utf-8"))
+            parts.append(chunk)
+        return b"".join(parts)
+
+
+    def fillContent(self, myChar):
+        """
+        Return a filled copy of only the sheet's content group for a dccZeroLevelChar,
+        for putting on a page, without copying the rest of the sheet.
+        """
+        content = copy.deepcopy(self.content)
+        for path, formatter in self.contentBindings:
+            findByPath(content, path).text = formatter(myChar)
+        return content
+
+
+    def fillContentBytes(self, myChar):
+        """
+        Return the filled content group for a dccZeroLevelChar as serialized bytes,
+        to go inside a page's <svg>, without building a tree.
+        """
+        return self.splice(self.contentChunks, myChar)
+
+
+    def fillOverlay(self, myChar):
+        """
+        Return a filled copy of the sheet's overlay for a dccZeroLevelChar: only the
+        character's values, to be drawn over the background.
+        """
+        overlay = copy.deepcopy(self.overlay)
+        for path, formatter in self.overlayBindings:
+            findByPath(overlay, path).text = formatter(myChar)
+        return overlay
+
+
+    def fillOverlayBytes(self, myChar):
+        """Return the filled overlay for a dccZeroLevelChar as serialized bytes, as for fillContentBytes."""
+        return self.splice(self.overlayChunks, myChar)
+
+
+
+def findByPath(root, path):
+    """Return the element at a path of child indexes from root."""
+    element = root
+    for i in path:
+        element = element[i]
+    return element
+
+
+def cutChunks(element, bindings):
+    """
+    Return a copy of element serialized and split where the text of each bound
+    element goes, as for SheetTemplate.chunks.
+
+    The copy is serialized inside an element with the sheet's namespaces, which is
+    then cut off, so it doesn't declare them again when it is put on a page.
+    """
+    wrapper = et.Element(element.tag, nsmap=element.nsmap)
+    wrapper.append(copy.deepcopy(element))
+    for i, (path, formatter) in enumerate(bindings):
+        findByPath(wrapper[0], path).text = FIELD_MARKER.format(i)
+    serialized = et.tostring(wrapper)
+    serialized = serialized[serialized.index(b">") + 1:serialized.rindex(b"</")]
+    chunks = []
+    for i in range(len(bindings)):
+        before, serialized = serialized.split(FIELD_MARKER.format(i).encode("ascii"), 1)
+        chunks.append(before)
+    chunks.append(serialized)
+    return chunks
+
+
+def getTemplate():
+    """Return the SheetTemplate of the blank sheet, parsing it the first time only."""
+    global _template
+    if _template is None:
+        _template = SheetTemplate()
+    return _template
+
+
+def writeSVG(myChar):
+    """
+    Fill a copy of the blank .svg sheet, inserting text data into the tspans (based
+        on their id attributes) from a dccZeroLevelChar object.
+    """
+    return getTemplate().fill(myChar)
+
+
+def writeSVGBytes(myChar):
+    """Return the blank .svg sheet filled in for a dccZeroLevelChar, serialized as bytes."""
+    return getTemplate().fillBytes(myChar)
+
+
+def writeContent(myChar):
+    """Return a filled copy of the blank sheet's <g id="content"> group for a dccZeroLevelChar."""
+    return getTemplate().fillContent(myChar)
+
+
+def writeContentBytes(myChar):
+    """Return the blank sheet's <g id="content"> group filled in for a dccZeroLevelChar, serialized as bytes."""
+    return getTemplate().fillContentBytes(myChar)
+
+
+def writeOverlay(myChar):
+    """Return the filled values of the blank sheet for a dccZeroLevelChar, without the sheet's boxes and labels."""
+    return getTemplate().fillOverlay(myChar)
+
 
-    return tree
+def writeOverlayBytes(myChar):
+    """Return the filled values of the blank sheet for a dccZeroLevelChar, serialized as bytes."""
+    return getTemplate().fillOverlayBytes(myChar)
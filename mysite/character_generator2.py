@@ -4,11 +4,18 @@ This module provide code for creating a Dungeon Crawl Classics RPG 0 level chara
 Classes:
     dccZeroLevelChar:
 
+Constants:
+    RACIAL_TRAITS
+    WEAPON_DAMAGE
+    UNTRAINED_DAMAGE
+    EXTRA_FUNDS
+
 Dependencies:
     Modules:
         pprint
         random
         import_data
+        compiled_tables
     Files:
         Table1_1_Ability_Score_Modifiers.csv
         Table1_2_Luck_Score.txt
@@ -23,8 +30,45 @@ Dependencies:
         AppendixL.csv
 """
 #from pprint import pprint
-from random import randint
-
+import random
+from compiled_tables import getCompiledTables, getRaceSampler, RACES
+
+
+#Racial traits for each character race.
+RACIAL_TRAITS = {
+    "Human": [],
+    "Dwarf": ["Infravision", "Underground skills"],
+    "Elf": ["Infravision",
+            "Immune to magic sleep/paralysis",
+            "Heightened senses",
+            "Iron vulnerability"],
+    "Halfling": ["Infravision", "Small size"]
+}
+
+#Damage and range for each class of weapon, checked in order against the
+#name of the trained weapon. Anything that doesn't match is untrained.
+WEAPON_DAMAGE = [
+    ("dagger", "1d4", "0/0/0"),
+    ("spear", "1d8", "0/0/0"),
+    ("staff", "1d4", "0/0/0"),
+    ("club", "1d4", "0/0/0"),
+    ("axe", "1d6", "10/20/30*"),
+    ("short sword", "1d6", "0/0/0"),
+    ("dart", "1d4", "20/40/60*"),
+    ("shortbow", "1d6", "50/100/150"),
+    ("sling", "1d4", "40/80/160*"),
+    ("longsword", "1d8", "0/0/0"),
+    ("mace", "1d6", "0/0/0")
+]
+UNTRAINED_DAMAGE = ("1d3 subdual", "0/0/0")
+
+#Extra starting money for some occupations, as (GP, SP, CP).
+EXTRA_FUNDS = {
+    "Halfling trader": (0, 20, 0),
+    "Halfling moneylender": (5, 10, 200),
+    "Merchant": (4, 14, 27),
+    "Tax collector": (0, 0, 100)
+}
 
 
 class dccZeroLevelChar:
@@ -39,6 +83,7 @@ class dccZeroLevelChar:
         noDwarf -> boolean          If True, no dwarf characters will be created.
         noElf -> boolean            If True, no elf characters will be created.
         noHalfling -> boolean       If True, no halfling characters will be created.
+        rng -> random.Random        Where the dice rolls come from; None for the random module's functions.
         suitable -> boolean         True, if attribute modifiers total 0 or greater.
 
         strengthScore -> int
@@ -73,9 +118,11 @@ class dccZeroLevelChar:
         armorClass -> int
 
     Methods:
-        __init__(self, dataDict, testSuitability=True, noHuman=False, noDwarf=False, noElf=False, noHalfling=False) -> dccZeroLevelChar
+        __init__(self, dataDict, testSuitability=True, noHuman=False, noDwarf=False, noElf=False, noHalfling=False, rng=None) -> dccZeroLevelChar
+        getRng(self) -> random.Random or module
         diceRoll(self, numOfSides=6, numOfDice=1) -> int
         rollAbilityScores(self) -> None
+        rollSuitableAbilityScores(self, sampler) -> None
         getAbilityScoreModifiers(self, data) -> None
         charIsSuitable(self) -> boolean
         getLuckySign(self, data) -> string
@@ -83,7 +130,7 @@ class dccZeroLevelChar:
         getRace(self) -> string
         getRacialTraits(self) -> list
         getOccupation(self, occupations, animals, farmers, whatsInCart) -> tuple
-        getLanguages(self, languageList) -> list
+        getLanguages(self, sampler) -> list
         getStartingFunds(self) -> dictionary
         getWeaponDamage(self) -> tuple
         getEquipment(self, data) -> list
@@ -95,7 +142,7 @@ class dccZeroLevelChar:
     """
 
 
-    def __init__(self, dataDict, testSuitability=True, noHuman=False, noDwarf=False, noElf=False, noHalfling=False):
+    def __init__(self, dataDict, testSuitability=True, noHuman=False, noDwarf=False, noElf=False, noHalfling=False, rng=None):
         """
         Initialize a new dccZeroLevelChar.
 
@@ -108,6 +155,8 @@ class dccZeroLevelChar:
             noDwarf: Make sure the dccZeroLevelChar is not a dwarf.
             noElf: Make sure the dccZeroLevelChar is not an elf.
             noHalfling: Make sure the dccZeroLevelChar is not a halfling.
+            rng: A random.Random, such as a dcc_rng.DiceRoller, to roll the dice
+                with. If None, the random module's functions are used.
         """
 
         #At least one character race must be allowed.
@@ -121,25 +170,27 @@ class dccZeroLevelChar:
         self.noDwarf = noDwarf
         self.noElf = noElf
         self.noHalfling = noHalfling
+        #Keep None rather than the random module, which can't be pickled.
+        self.rng = rng
 
-        self.rollAbilityScores()
-        self.getAbilityScoreModifiers(dataDict["Ability Score Modifiers"])
+        compiled = getCompiledTables(dataDict)
 
-        #If we are testing for suitability, we may have to reroll a few times.
+        #If we are testing for suitability, roll straight from the suitable scores.
         if self.testSuitability:
+            self.rollSuitableAbilityScores(compiled.suitability)
+            self.getAbilityScoreModifiers(dataDict["Ability Score Modifiers"])
             self.suitable = self.charIsSuitable()
-            while not self.suitable:
-                self.rollAbilityScores()
-                self.getAbilityScoreModifiers(dataDict["Ability Score Modifiers"])
-                self.suitable = self.charIsSuitable()
+        else:
+            self.rollAbilityScores()
+            self.getAbilityScoreModifiers(dataDict["Ability Score Modifiers"])
 
 
         self.luckySign = self.getLuckySign(dataDict["Luck Scores"])
         self.reflexSavingThrow, self.fortitudeSavingThrow, self.willpowerSavingThrow = self.getSavingThrows()
         self.race = self.getRace()
         self.racialTraits = self.getRacialTraits()
-        self.occupation, self.trainedWeapon, self.tradeGoods = self.getOccupation(dataDict[self.race + " Occupation"], dataDict["Animal Type"], dataDict["Farmer Type"], dataDict["What's In The Cart"])
-        self.languages = self.getLanguages(dataDict["Languages"])
+        self.occupation, self.trainedWeapon, self.tradeGoods = self.getOccupation(compiled.occupations[self.race], dataDict["Animal Type"], dataDict["Farmer Type"], dataDict["What's In The Cart"])
+        self.languages = self.getLanguages(compiled.languages[self.race])
         self.money = self.getStartingFunds()
         self.trainedWeaponDamage, self.trainedWeaponRange = self.getWeaponDamage()
         self.equipment = self.getEquipment(dataDict["Equipment"])
@@ -149,6 +200,11 @@ class dccZeroLevelChar:
         self.armorClass = self.getArmorClass()
 
 
+    def getRng(self):
+        """Return rng, or the random module if the character has none."""
+        return self.rng if self.rng is not None else random
+
+
     def diceRoll(self, numOfSides=6, numOfDice=1):
         """
         Return the result of a simulated a dice roll.
@@ -157,9 +213,10 @@ class dccZeroLevelChar:
             numOfSides: The number of sides on the dice to be used.
             numOfDice: The number of dice to roll and add up the results of.
         """
+        rng = self.getRng()
         sum = 0
         for i in range(numOfDice):
-            sum += randint(1, numOfSides)
+            sum += rng.randint(1, numOfSides)
         return sum
 
 
@@ -173,6 +230,18 @@ class dccZeroLevelChar:
         self.luckScore = self.diceRoll(6, 3)
 
 
+    def rollSuitableAbilityScores(self, sampler):
+        """
+        Set the attribute scores of the dccZeroLevelChar to scores whose modifiers
+        sum to 0 or greater, with the same odds as rerolling until they do.
+
+        Args:
+            sampler: SuitabilitySampler from compiled_tables.
+        """
+        (self.strengthScore, self.agilityScore, self.staminaScore,
+         self.intelligenceScore, self.personalityScore, self.luckScore) = sampler.sample(self.getRng())
+
+
     def getAbilityScoreModifiers(self, data):
         """
         Set the attribute modifiers of the dccZeroLevelChar.
@@ -237,38 +306,13 @@ class dccZeroLevelChar:
 
     def getRace(self):
         """Return the dccZeroLevelChar race, based on args passed to the __init__ method."""
-        race_okay = False
-        while not race_okay:
-            race_roll = self.diceRoll(10, 1)
-            if race_roll == 1 and not self.noDwarf:
-                race = "Dwarf"
-                race_okay = True
-            elif race_roll == 2 and not self.noElf:
-                race = "Elf"
-                race_okay = True
-            elif race_roll == 3 and not self.noHalfling:
-                race = "Halfling"
-                race_okay = True
-            elif not self.noHuman:
-                race = "Human"
-                race_okay = True
-
-        return race
+        sampler = getRaceSampler(self.noHuman, self.noDwarf, self.noElf, self.noHalfling)
+        return RACES[sampler.sample(self.getRng())]
 
 
     def getRacialTraits(self):
         """Return a list of the dccZeroLevelChar racial traits."""
-        if self.race == "Human":
-            return []
-        elif self.race == "Dwarf":
-            return ["Infravision", "Underground skills"]
-        elif self.race == "Elf":
-            return ["Infravision",
-                    "Immune to magic sleep/paralysis",
-                    "Heightened senses",
-                    "Iron vulnerability"]
-        else:
-            return ["Infravision", "Small size"]
+        return list(RACIAL_TRAITS[self.race])
 
 
     def getOccupation(self, occupations, animals, farmers, whatsInCart):
@@ -276,25 +320,18 @@ class dccZeroLevelChar:
         Return the occupation, starting weapon, and trade good of the dccZeroLevelChar.
 
         Args:
-            occupations: Dictionary containing Table1_3_Occupation2 data from
-                the  Dungeon Crawl Classics RPG rulebook.
+            occupations: List mapping each roll to a row of the race's occupation
+                table from the Dungeon Crawl Classics RPG rulebook, made by
+                compiled_tables.compileOccupationTable.
             animals: List containing possible animals owned as trade goods.
             farmers: List containing types of farmers.
             whatsInCart: List containing things that might fill a cart owned as
                 a trade good.
         """
-        if self.race == "Human":
-            occupation_range = 70
-        else:
-            occupation_range = 10
-
-        occ_roll = self.diceRoll(occupation_range, 1)
-        for occupation in occupations:
-            if occ_roll <= int(occupation):
-                job = occupations[occupation]["Occupation"]
-                weapon = occupations[occupation]["Trained Weapon"]
-                goods = occupations[occupation]["Trade Goods"]
-                break
+        occupation = occupations[self.diceRoll(len(occupations) - 1, 1)]
+        job = occupation["Occupation"]
+        weapon = occupation["Trained Weapon"]
+        goods = occupation["Trade Goods"]
 
         #Occupations that get ranged weapons start with a little ammo.
         if weapon == "Shortbow" or weapon == "Sling":
@@ -317,25 +354,13 @@ class dccZeroLevelChar:
         return (job, weapon, goods)
 
 
-    def getLanguages(self, languageList):
+    def getLanguages(self, sampler):
         """
         Return a list of languages known by the dccZeroLevelChar.
 
         Args:
-            languageList: Dictionary containing language data from AppendixL in
-                the Dungeon Crawl Classics RPG rulebook."""
-
-
-        #This little sub-method returns one random language from the list of languages
-        #for the character's race.
-        def getOneLanguage(languageList):
-            roll = self.diceRoll(100, 1)
-            for lang in languageList:
-                if languageList[lang][self.race] == '-':
-                    continue
-                elif roll <= int(languageList[lang][self.race]):
-                    return lang
-
+            sampler: LanguageSampler from compiled_tables for the character's race,
+                made from AppendixL in the Dungeon Crawl Classics RPG rulebook."""
 
         #Everybody knows common.
         languages = ["Common"]
@@ -356,15 +381,9 @@ class dccZeroLevelChar:
         if "Birdsong" in self.luckySign:
             bonusLangs += int(self.luckModifier)
 
-        #Roll for each bonus language known, rerolling in the case of doubles.
-        #Use the getOneLanguage method from above.
+        #Roll each bonus language known from the ones not known yet.
         if bonusLangs > 0:
-            while bonusLangs > 0:
-                newLang = getOneLanguage(languageList)
-                while newLang in languages:
-                    newLang = getOneLanguage(languageList)
-                languages.append(newLang)
-                bonusLangs -= 1
+            languages.extend(sampler.sampleDistinct(bonusLangs, languages, self.getRng()))
 
         return languages
 
@@ -382,18 +401,11 @@ class dccZeroLevelChar:
         money["CP"] += self.diceRoll(12, 5)
 
         #Some occupations start richer.
-        if self.occupation == "Halfling trader":
-            money["SP"] += 20
-        elif self.occupation == "Halfling moneylender":
-            money["GP"] += 5
-            money["SP"] += 10
-            money["CP"] += 200
-        elif self.occupation == "Merchant":
-            money["GP"] += 4
-            money["SP"] += 14
-            money["CP"] += 27
-        elif self.occupation == "Tax collector":
-            money["CP"] += 100
+        if self.occupation in EXTRA_FUNDS:
+            extraGP, extraSP, extraCP = EXTRA_FUNDS[self.occupation]
+            money["GP"] += extraGP
+            money["SP"] += extraSP
+            money["CP"] += extraCP
 
         return money
 
@@ -402,44 +414,11 @@ class dccZeroLevelChar:
         """Return the damage and range of the dccZeroLevelChar starting weapon,"""
         weapon = self.trainedWeapon.lower()
 
-        if "dagger" in weapon:
-            damage = "1d4"
-            range = "0/0/0"
-        elif "spear" in weapon:
-            damage = "1d8"
-            range = "0/0/0"
-        elif "staff" in weapon:
-            damage = "1d4"
-            range = "0/0/0"
-        elif "club" in weapon:
-            damage = "1d4"
-            range = "0/0/0"
-        elif "axe" in weapon:
-            damage = "1d6"
-            range = "10/20/30*"
-        elif "short sword" in weapon:
-            damage = "1d6"
-            range = "0/0/0"
-        elif "dart" in weapon:
-            damage = "1d4"
-            range = "20/40/60*"
-        elif "shortbow" in weapon:
-            damage = "1d6"
-            range = "50/100/150"
-        elif "sling" in weapon:
-            damage = "1d4"
-            range = "40/80/160*"
-        elif "longsword" in weapon:
-            damage = "1d8"
-            range = "0/0/0"
-        elif "mace" in weapon:
-            damage = "1d6"
-            range = "0/0/0"
-        else:
-            damage = "1d3 subdual"
-            range = "0/0/0"
+        for weaponClass, damage, range in WEAPON_DAMAGE:
+            if weaponClass in weapon:
+                return (damage, range)
 
-        return (damage, range)
+        return UNTRAINED_DAMAGE
 
 
     def getEquipment(self, data):
@@ -0,0 +1,388 @@
+"""
+This module compiles the character creation tables loaded by import_data into
+samplers, so that character_generator2 can make each roll once instead of
+rerolling until it gets a result it can use.
+
+Classes:
+    AliasSampler
+    SuitabilitySampler
+    LanguageSampler
+    CompiledTables
+
+Functions:
+    getRaceSampler(noHuman, noDwarf, noElf, noHalfling)
+    getExpectedRaceRerolls(noHuman, noDwarf, noElf, noHalfling)
+    compileOccupationTable(occupations, occupationRange, name="occupation table")
+    getCompiledTables(dataDict)
+
+Dependencies:
+    Modules:
+        random
+        bisect
+        import_data
+    Files:
+        Table1_1_Ability_Score_Modifiers.csv
+        Human_Occupations.csv
+        Dwarf_Occupations.csv
+        Elf_Occupations.csv
+        Halfling_Occupations.csv
+        AppendixL.csv
+"""
+import random
+from bisect import bisect_right
+
+#Number of ways to roll each total on 3d6.
+THREE_D6 = {}
+for first in range(1, 7):
+    for second in range(1, 7):
+        for third in range(1, 7):
+            THREE_D6[first + second + third] = THREE_D6.get(first + second + third, 0) + 1
+
+NUM_OF_ABILITIES = 6
+
+#Character races, and their chance on the d10 race roll:
+#1 is a dwarf, 2 an elf, 3 a halfling, and anything else a human.
+RACES = ["Human", "Dwarf", "Elf", "Halfling"]
+RACE_WEIGHTS = [7, 1, 1, 1]
+
+#Die rolled on each race's occupation table.
+OCCUPATION_RANGES = {"Human": 70, "Dwarf": 10, "Elf": 10, "Halfling": 10}
+
+_raceSamplers = {}
+#(dataDict, CompiledTables) for the last dataDict compiled.
+_compiledCache = None
+
+
+
+class AliasSampler:
+    """
+    AliasSampler picks an index with chance in proportion to its weight, in constant
+    time, using Vose's alias method. The weights are integers and so are the
+    thresholds, so the odds are exact.
+
+    Properties:
+        weights -> list
+        total -> int                Sum of the weights.
+        columns -> int              Number of weights times total.
+        thresholds -> list          Keep index i if a roll below total is under thresholds[i].
+        aliases -> list             Otherwise, take aliases[i].
+
+    Methods:
+        __init__(self, weights) -> AliasSampler
+        sample(self, rng=random) -> int
+    """
+
+
+    def __init__(self, weights):
+        """
+        Build the alias table.
+
+        Args:
+            weights: List of non-negative integer weights, at least one above 0.
+        """
+        self.weights = list(weights)
+        self.total = sum(self.weights)
+        n = len(self.weights)
+        self.columns = n * self.total
+
+        #Scale each weight so the average column holds exactly total.
+        scaled = [weight * n for weight in self.weights]
+        self.thresholds = [self.total] * n
+        self.aliases = list(range(n))
+        small = [i for i in range(n) if scaled[i] < self.total]
+        large = [i for i in range(n) if scaled[i] >= self.total]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.thresholds[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] -= self.total - scaled[less]
+            if scaled[more] < self.total:
+                small.append(more)
+            else:
+                large.append(more)
+
+
+    def sample(self, rng=random):
+        """
+        Return a random index.
+
+        Args:
+            rng: Something with a random method, like the random module.
+        """
+        #One roll picks both the column and the point within it.
+        i, point = divmod(int(rng.random() * self.columns), self.total)
+        if point < self.thresholds[i]:
+            return i
+        return self.aliases[i]
+
+
+
+class SuitabilitySampler:
+    """
+    SuitabilitySampler rolls the six ability scores of a character whose modifiers
+    sum to 0 or greater, in one pass with no rerolls.
+
+    Rolling 3d6 six times and rerolling until the modifiers are suitable gives every
+    suitable set of scores a chance in proportion to how often 3d6 rolls it. This
+    class rolls the scores one at a time, weighting each possible score by how many
+    ways the remaining scores can still make the character suitable. The counts
+    are exact integers, so the results have the same odds as rerolling.
+
+    Properties:
+        scores -> list              Every score 3d6 can roll.
+        modifiers -> list           The modifier for each of scores.
+        acceptanceRate -> float     The chance a plain 3d6x6 roll is suitable.
+        expectedRolls -> float      The average number of 3d6x6 rolls the reroll
+                                    loop needs per character.
+
+    Methods:
+        __init__(self, data) -> SuitabilitySampler
+        sample(self, rng=random) -> list
+    """
+
+
+    def __init__(self, data):
+        """
+        Count the suitable score combinations.
+
+        Args:
+            data: Dictionary containing Table1_1_Ability_Score_Modifiers data
+                from the Dungeon Crawl Classics RPG rulebook.
+        """
+        self.scores = sorted(THREE_D6)
+        self.modifiers = [data[score]["Modifier"] for score in self.scores]
+        weights = [THREE_D6[score] for score in self.scores]
+
+        #Modifier sums run from -maxSum to maxSum; offset them to index lists.
+        maxSum = NUM_OF_ABILITIES * max(abs(mod) for mod in self.modifiers)
+        self.offset = maxSum
+        sums = range(-maxSum, maxSum + 1)
+
+        #ways[k][s] is the number of 3d6 rolls for abilities k to 5 that leave
+        #the character suitable when the modifiers so far add up to s.
+        ways = [None] * (NUM_OF_ABILITIES + 1)
+        ways[NUM_OF_ABILITIES] = [1 if s >= 0 else 0 for s in sums]
+        #cumulative[k][s] is the running total of those ways for each score
+        #that ability k could roll, ready for a bisect.
+        self.cumulative = [None] * NUM_OF_ABILITIES
+        for k in reversed(range(NUM_OF_ABILITIES)):
+            ways[k] = []
+            self.cumulative[k] = []
+            for s in sums:
+                running = 0
+                cumulative = []
+                for weight, mod in zip(weights, self.modifiers):
+                    nextSum = s + mod
+                    if -maxSum <= nextSum <= maxSum:
+                        running += weight * ways[k + 1][nextSum + maxSum]
+                    cumulative.append(running)
+                ways[k].append(running)
+                self.cumulative[k].append(cumulative)
+        self.ways = ways
+
+        self.acceptanceRate = ways[0][maxSum] / 216 ** NUM_OF_ABILITIES
+        self.expectedRolls = 1 / self.acceptanceRate
+
+
+    def sample(self, rng=random):
+        """
+        Return a suitable list of six ability scores.
+
+        Args:
+            rng: Something with a randrange method, like the random module.
+        """
+        scores = []
+        modSum = 0
+        for k in range(NUM_OF_ABILITIES):
+            cumulative = self.cumulative[k][modSum + self.offset]
+            i = bisect_right(cumulative, rng.randrange(cumulative[-1]))
+            scores.append(self.scores[i])
+            modSum += self.modifiers[i]
+        return scores
+
+
+
+class LanguageSampler:
+    """
+    LanguageSampler rolls bonus languages for one race from the AppendixL table.
+
+    The d100 roll picks the first language, in table order, whose number for the
+    race is at least the roll; '-' means the race can't learn it. So each language
+    gets the rolls between the highest number above it and its own number, and
+    none if that is empty. Rerolling a language the character already knows is
+    the same as rolling from the rest of the languages with those weights, which
+    is what sampleDistinct does.
+
+    Properties:
+        race -> string
+        languages -> list           Languages the race can roll.
+        weights -> list             The number of d100 rolls that give each language.
+
+    Methods:
+        __init__(self, languageList, race) -> LanguageSampler
+        sampleDistinct(self, count, known=(), rng=random) -> list
+    """
+
+
+    def __init__(self, languageList, race):
+        """
+        Work out the weight of each language.
+
+        Args:
+            languageList: Dictionary containing language data from AppendixL in
+                the Dungeon Crawl Classics RPG rulebook.
+            race: The race column to use.
+
+        Raises a ValueError if some d100 rolls give no language.
+        """
+        self.race = race
+        self.languages = []
+        self.weights = []
+        highest = 0
+        for lang in languageList:
+            chance = languageList[lang][race]
+            if chance == '-' or int(chance) <= highest:
+                continue
+            self.languages.append(lang)
+            self.weights.append(int(chance) - highest)
+            highest = int(chance)
+        if highest < 100:
+            raise ValueError("AppendixL: no {} language for d100 rolls over {}".format(race, highest))
+
+
+    def sampleDistinct(self, count, known=(), rng=random):
+        """
+        Return a list of up to count different languages, none of them in known.
+
+        Args:
+            count: The number of languages to roll.
+            known: Languages the character already knows.
+            rng: Something with a randrange method, like the random module.
+        """
+        weights = [0 if lang in known else weight for lang, weight in zip(self.languages, self.weights)]
+        total = sum(weights)
+        chosen = []
+        while len(chosen) < count and total > 0:
+            roll = rng.randrange(total)
+            i = 0
+            while roll >= weights[i]:
+                roll -= weights[i]
+                i += 1
+            chosen.append(self.languages[i])
+            total -= weights[i]
+            weights[i] = 0
+        return chosen
+
+
+
+class CompiledTables:
+    """
+    CompiledTables holds the samplers compiled from one dataDict. They are built
+    once; use getCompiledTables to get the shared copy.
+
+    Properties:
+        suitability -> SuitabilitySampler
+        occupations -> dictionary   For each race, the list from compileOccupationTable.
+        languages -> dictionary     For each race, a LanguageSampler.
+    """
+
+
+    def __init__(self, dataDict):
+        """
+        Compile the samplers.
+
+        Args:
+            dataDict: a dictinary containing all the table data from the character
+                creation section of the Dungeon Crawl Classics RPG rulebook.
+        """
+        self.suitability = SuitabilitySampler(dataDict["Ability Score Modifiers"])
+        self.occupations = {}
+        for race in RACES:
+            self.occupations[race] = compileOccupationTable(dataDict[race + " Occupation"], OCCUPATION_RANGES[race], race + " Occupation")
+        self.languages = {}
+        for race in RACES:
+            self.languages[race] = LanguageSampler(dataDict["Languages"], race)
+
+
+
+def getRaceSampler(noHuman, noDwarf, noElf, noHalfling):
+    """
+    Return the AliasSampler of race codes (indexes of RACES) for one combination of
+    race filters, building it the first time the combination is asked for.
+
+    The odds match rerolling the d10: a roll for a filtered demi-human counts as a
+    human if humans are allowed, and is rerolled otherwise. If every race is
+    filtered out, none of them are.
+    """
+    #Filed only under the flags as bools, so form values like 'on' or 'yes' can't
+    #add entries of their own.
+    key = (bool(noHuman), bool(noDwarf), bool(noElf), bool(noHalfling))
+    sampler = _raceSamplers.get(key)
+    if sampler is None:
+        excluded = key if not all(key) else (False, False, False, False)
+        weights = list(RACE_WEIGHTS)
+        for race in range(1, len(RACES)):
+            if excluded[race]:
+                if not excluded[0]:
+                    weights[0] += weights[race]
+                weights[race] = 0
+        if excluded[0]:
+            weights[0] = 0
+        sampler = AliasSampler(weights)
+        _raceSamplers[key] = sampler
+    return sampler
+
+
+def getExpectedRaceRerolls(noHuman, noDwarf, noElf, noHalfling):
+    """
+    Return the average number of times the d10 race roll would have been rerolled
+    for one character with these race filters, before getRaceSampler replaced it.
+    Only rolls for a filtered race with humans filtered out too were rerolled.
+    """
+    excluded = (bool(noHuman), bool(noDwarf), bool(noElf), bool(noHalfling))
+    if not excluded[0] or all(excluded):
+        return 0.0
+    allowed = sum(weight for weight, out in zip(RACE_WEIGHTS, excluded) if not out)
+    return sum(RACE_WEIGHTS) / allowed - 1
+
+
+def compileOccupationTable(occupations, occupationRange, name="occupation table"):
+    """
+    Return a list that maps every roll from 1 to occupationRange straight to its row of
+    an occupation table. Index 0 is None, so the roll itself is the index.
+
+    Each row of the table covers the rolls above the previous row's roll, up to
+    and including its own. Raise a ValueError if the rows are out of order, leave
+    a roll uncovered, or go past the end of the die.
+
+    Args:
+        occupations: Dictionary containing occupation data loaded by
+            import_data.getOccupation.
+        occupationRange: The number of sides on the occupation die.
+        name: What to call the table in error messages.
+    """
+    rollToRow = [None]
+    for roll in occupations:
+        if roll <= len(rollToRow) - 1:
+            raise ValueError("{}: roll {} overlaps the rows before it".format(name, roll))
+        if roll > occupationRange:
+            raise ValueError("{}: roll {} is past the end of the d{}".format(name, roll, occupationRange))
+        rollToRow.extend([occupations[roll]] * (roll - len(rollToRow) + 1))
+    if len(rollToRow) - 1 < occupationRange:
+        raise ValueError("{}: no row covers rolls {} to {}".format(name, len(rollToRow), occupationRange))
+    return rollToRow
+
+
+def getCompiledTables(dataDict):
+    """
+    Return the CompiledTables for dataDict, compiling them the first time it is seen.
+    Only the last dataDict's tables are kept, so a reloaded dataDict doesn't keep
+    the old one and its tables alive.
+    """
+    global _compiledCache
+    cached = _compiledCache
+    if cached is None or cached[0] is not dataDict:
+        cached = (dataDict, CompiledTables(dataDict))
+        _compiledCache = cached
+    return cached[1]
@@ -0,0 +1,153 @@
+"""
+This module loads the character creation tables from the SQLite database,
+data_files/dcc.db, into a dictionary of the same shape as the one
+import_data.getDataFiles makes, so either can be handed to character_generator2.
+
+Each process opens one read-only connection to the database and shares it
+between its threads; a forked process opens its own. The queries are constant,
+parameterized statements, so sqlite prepares each one once per connection. The
+tables are read once and kept, until the database file changes.
+
+Functions:
+    getConnection(dbPath)
+    loadDBTables(dbPath)
+    readAbilityScoreModifiers(connection)
+    readList(connection, table)
+    readLuckScores(connection)
+    readOccupations(connection, race)
+    readLanguages(connection)
+
+Dependencies:
+    Modules:
+        os
+        sqlite3
+        threading
+        urllib
+        compiled_tables
+    Files:
+        dcc.db
+"""
+import os
+import sqlite3
+import threading
+from urllib.request import pathname2url
+from compiled_tables import compileOccupationTable, OCCUPATION_RANGES, RACES
+
+#Columns of appendix_l, and the dataDict column each one fills.
+LANGUAGE_COLUMNS = [
+    ("zero_level", "Human"),
+    ("warrior", "Warrior"),
+    ("cleric", "Cleric"),
+    ("thief", "Thief"),
+    ("wizard", "Wizard"),
+    ("halfing", "Halfling"),
+    ("elf", "Elf"),
+    ("dwarf", "Dwarf"),
+]
+
+QUERIES = {
+    "Ability Score Modifiers": "SELECT ability_score, modifier, wizard_spells_known, max_spell_level FROM ability_score_modifiers WHERE ability_score BETWEEN ? AND ? ORDER BY ability_score",
+    "Luck Scores": "SELECT luck_sign, description FROM luck_scores ORDER BY id",
+    "Farmer Type": "SELECT crop FROM farmer_type ORDER BY id",
+    "Animal Type": "SELECT animal FROM animal_type ORDER BY id",
+    "What's In The Cart": "SELECT contents FROM whats_in_the_cart ORDER BY id",
+    "Equipment": "SELECT item FROM equipment ORDER BY id",
+    "Languages": "SELECT language, {} FROM appendix_l ORDER BY id".format(", ".join(column for column, name in LANGUAGE_COLUMNS)),
+}
+for race in RACES:
+    QUERIES[race + " Occupation"] = "SELECT id, occupation, weapon, trade_good FROM {}_occupations WHERE id BETWEEN ? AND ? ORDER BY id".format(race.lower())
+
+#Lowest and highest score 3d6 can roll.
+SCORE_RANGE = (3, 18)
+
+_connections = {}
+_cache = {}
+_lock = threading.Lock()
+
+
+
+def getConnection(dbPath):
+    """
+    Return this process's read-only connection to the database at dbPath, opening
+    it the first time. Hold the module's lock while using it from more than one thread.
+    """
+    key = (os.getpid(), os.path.abspath(dbPath))
+    connection = _connections.get(key)
+    if connection is None:
+        #mode=ro also stops sqlite making an empty database if the file is missing.
+        uri = "file:{}?mode=ro".format(pathname2url(os.path.abspath(dbPath)))
+        connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        _connections[key] = connection
+    return connection
+
+
+def loadDBTables(dbPath):
+    """
+    Return the dataDict read from the database at dbPath, reading it the first
+    time it is asked for and again whenever the file changes. Don't change it.
+
+    Raise a ValueError if a table is empty or an occupation table leaves rolls
+    uncovered, and a sqlite3.Error if the database can't be read.
+    """
+    stamp = os.stat(dbPath).st_mtime_ns
+    with _lock:
+        cached = _cache.get(dbPath)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        connection = getConnection(dbPath)
+        dataDict = {}
+        dataDict["Ability Score Modifiers"] = readAbilityScoreModifiers(connection)
+        dataDict["Luck Scores"] = readLuckScores(connection)
+        for race in RACES:
+            dataDict[race + " Occupation"] = readOccupations(connection, race)
+        dataDict["Farmer Type"] = readList(connection, "Farmer Type")
+        dataDict["Animal Type"] = readList(connection, "Animal Type")
+        dataDict["What's In The Cart"] = readList(connection, "What's In The Cart")
+        dataDict["Equipment"] = readList(connection, "Equipment")
+        dataDict["Languages"] = readLanguages(connection)
+        for table in dataDict:
+            if not dataDict[table]:
+                raise ValueError("{}: the {} table is empty; load it with populate_database.py".format(dbPath, table))
+        #Check now that every occupation roll lands on exactly one row.
+        for race in RACES:
+            compileOccupationTable(dataDict[race + " Occupation"], OCCUPATION_RANGES[race], "{} {}_occupations".format(dbPath, race.lower()))
+        _cache[dbPath] = (stamp, dataDict)
+        return dataDict
+
+
+def readAbilityScoreModifiers(connection):
+    """Return the ability_score_modifiers table as import_data.getAbilityScoreModifiers does."""
+    data = {}
+    for score, modifier, spellsKnown, maxSpellLevel in connection.execute(QUERIES["Ability Score Modifiers"], SCORE_RANGE):
+        data[score] = {
+            "Modifier": modifier,
+            "Wizard Spells Known": "None" if spellsKnown is None else str(spellsKnown),
+            "Max Spell Level": "None" if maxSpellLevel is None else str(maxSpellLevel),
+        }
+    return data
+
+
+def readList(connection, table):
+    """Return a one column table, such as Equipment, as a list in id order."""
+    return [row[0] for row in connection.execute(QUERIES[table])]
+
+
+def readLuckScores(connection):
+    """Return the luck_scores table as 'sign: description' lines, as in Table1_2_Luck_Score.txt."""
+    return ["{}: {}".format(sign, description) for sign, description in connection.execute(QUERIES["Luck Scores"])]
+
+
+def readOccupations(connection, race):
+    """Return one race's occupation table, keyed by the highest roll for each row, as import_data.getOccupation does."""
+    data = {}
+    for roll, occupation, weapon, tradeGood in connection.execute(QUERIES[race + " Occupation"], (1, OCCUPATION_RANGES[race])):
+        data[roll] = {"Occupation": occupation, "Trained Weapon": weapon, "Trade Goods": tradeGood}
+    return data
+
+
+def readLanguages(connection):
+    """Return the appendix_l table as import_data.getLanguages does, with '-' where a race can't roll a language."""
+    data = {}
+    for row in connection.execute(QUERIES["Languages"]):
+        data[row[0]] = {name: "-" if chance is None else str(chance) for (column, name), chance in zip(LANGUAGE_COLUMNS, row[1:])}
+    return data
@@ -0,0 +1,112 @@
+"""
+This module provides the random number streams used to roll characters. A
+DiceRoller can be seeded, so the same seed always rolls the same characters, and
+split into independent child streams, so each character, or each worker in a
+batch job, can roll from its own stream without depending on the others.
+
+Classes:
+    DiceRoller
+
+Functions:
+    newSeed()
+    parseSeed(text)
+
+Dependencies:
+    Modules:
+        hashlib
+        random
+        secrets
+"""
+import hashlib
+import random
+import secrets
+
+
+
+class DiceRoller(random.Random):
+    """
+    DiceRoller is a random.Random whose state comes from a seed and a path of
+    child numbers, so any stream in a tree of splits can be rebuilt from the root
+    seed alone.
+
+    Properties:
+        rootSeed -> int or string   The seed of the root of the tree.
+        path -> tuple               Child numbers from the root to this stream.
+        streamSeed -> int           The 256 bit seed of this stream, for seeding
+                                    other generators such as NumPy's.
+
+    Methods:
+        __init__(self, seed=None, path=()) -> DiceRoller
+        spawn(self) -> DiceRoller
+        split(self, count) -> list
+        skip(self, count) -> None
+        __reduce__(self) -> tuple
+        __setstate__(self, state)
+    """
+
+
+    def __init__(self, seed=None, path=()):
+        """
+        Start a stream.
+
+        Args:
+            seed: An int or string. If None, a new random seed is picked.
+            path: Child numbers from the root stream; leave empty for a root.
+        """
+        if seed is None:
+            seed = newSeed()
+        self.rootSeed = seed
+        self.path = tuple(path)
+        self.children = 0
+        digest = hashlib.sha256(repr((self.rootSeed, self.path)).encode("utf-8")).digest()
+        self.streamSeed = int.from_bytes(digest, "big")
+        super().__init__(self.streamSeed)
+
+
+    def spawn(self):
+        """Return the next child stream. Children don't use up any of this stream's rolls."""
+        child = DiceRoller(self.rootSeed, self.path + (self.children,))
+        self.children += 1
+        return child
+
+
+    def split(self, count):
+        """Return a list of the next count child streams."""
+        return [self.spawn() for i in range(count)]
+
+
+    def skip(self, count):
+        """Move past the next count child streams, as if they had been spawned."""
+        self.children += count
+
+
+    def __reduce__(self):
+        """Pickle the stream as its seed and path, with how far it has rolled and how many children it has spawned."""
+        return (DiceRoller, (self.rootSeed, self.path), (self.getstate(), self.children))
+
+
+    def __setstate__(self, state):
+        """Pick the stream up where it was pickled."""
+        randomState, self.children = state
+        self.setstate(randomState)
+
+
+
+def newSeed():
+    """Return a new random 64 bit seed."""
+    return secrets.randbits(64)
+
+
+def parseSeed(text):
+    """
+    Return the seed typed into a form field or on the command line: None if it is
+    missing or blank, an int if it is a whole number in 0-9 digits, and otherwise
+    the text itself, stripped.
+    """
+    if text is None or text.strip() == "":
+        return None
+    text = text.strip()
+    #isdigit alone lets through digits like "²" that int can't read.
+    if text.isascii() and text.isdigit():
+        return int(text)
+    return text
@@ -0,0 +1,173 @@
+"""
+This script writes a roster of Dungeon Crawl Classics RPG zero level characters,
+as JSON lines or CSV, to a file or stdout, without the web app:
+
+    python export_characters.py 500000 --seed 7 --suitability --no-human -o roster.jsonl
+
+Character number i rolls from the stream DiceRoller(seed, (i,)), so the same seed
+gives the same roster however many workers make it, and any one character can be
+rolled again on its own. The characters are made in chunks across a pool of
+worker processes, and each chunk is written as soon as its turn comes; only a few
+chunks per worker are ever in flight, so memory stays the same for any count.
+
+Functions:
+    initWorker(dataPath)
+    makeChunk(seed, start, stop, outputFormat, options)
+    writeRoster(output, count, seed, outputFormat, options, workers, chunkSize)
+    main()
+
+Dependencies:
+    Modules:
+        argparse
+        concurrent.futures
+        csv
+        io
+        json
+        character_generator2
+        char_serializer
+        dcc_rng
+        table_store
+    Files:
+        dcc_tables.bin
+"""
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from character_generator2 import dccZeroLevelChar
+from char_serializer import characterToDict, characterToRow, CSV_FIELDS
+from dcc_rng import DiceRoller, parseSeed
+import dcc_root_path
+
+ROOT_PATH = dcc_root_path.get_root_path()
+DATA_PATH = "{}data_files/".format(ROOT_PATH)
+
+FORMATS = ["jsonl", "csv"]
+DEFAULT_CHUNK_SIZE = 1000
+#Chunks each worker can have made but not yet written.
+CHUNKS_PER_WORKER = 2
+
+#The rulebook data in this process, loaded by initWorker.
+_workerData = None
+
+
+
+def initWorker(dataPath):
+    """Load the rulebook data and compile its tables, once per worker process."""
+    global _workerData
+    from compiled_tables import getCompiledTables
+    from table_store import loadConfiguredTables
+    _workerData = loadConfiguredTables(dataPath)
+    getCompiledTables(_workerData)
+
+
+def makeChunk(seed, start, stop, outputFormat, options):
+    """
+    Return characters start to stop - 1 of the roster as one string of JSON lines
+    or CSV rows, ready to write.
+
+    Args:
+        seed: The roster's root seed.
+        start, stop: The characters' numbers.
+        outputFormat: "jsonl" or "csv".
+        options: (testSuitability, noHuman, noDwarf, noElf, noHalfling).
+    """
+    lines = io.StringIO()
+    if outputFormat == "csv":
+        writer = csv.writer(lines, lineterminator="\n")
+        for i in range(start, stop):
+            writer.writerow([i] + characterToRow(dccZeroLevelChar(_workerData, *options, rng=DiceRoller(seed, (i,)))))
+    else:
+        for i in range(start, stop):
+            record = {"index": i}
+            record.update(characterToDict(dccZeroLevelChar(_workerData, *options, rng=DiceRoller(seed, (i,)))))
+            lines.write(json.dumps(record, separators=(",", ":")))
+            lines.write("\n")
+    return lines.getvalue()
+
+
+def writeRoster(output, count, seed, outputFormat, options, workers, chunkSize=DEFAULT_CHUNK_SIZE):
+    """
+    Write count characters to output, a text file, in order.
+
+    Args:
+        output: Where to write; opened with newline="" for CSV.
+        count: Number of characters.
+        seed: The roster's root seed.
+        outputFormat: "jsonl" or "csv".
+        options: (testSuitability, noHuman, noDwarf, noElf, noHalfling).
+        workers: Number of worker processes; 0 makes every chunk in this process.
+        chunkSize: Characters in each chunk handed to a worker.
+    """
+    if outputFormat == "csv":
+        csv.writer(output, lineterminator="\n").writerow(["index"] + CSV_FIELDS)
+    chunks = ((start, min(start + chunkSize, count)) for start in range(0, count, chunkSize))
+
+    if workers == 0:
+        initWorker(DATA_PATH)
+        for start, stop in chunks:
+            output.write(makeChunk(seed, start, stop, outputFormat, options))
+        return
+
+    #Keep only a few chunks in flight, and write them in order as they finish.
+    with ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(DATA_PATH,)) as executor:
+        pending = deque()
+        for start, stop in chunks:
+            pending.append(executor.submit(makeChunk, seed, start, stop, outputFormat, options))
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                output.write(pending.popleft().result())
+        while pending:
+            output.write(pending.popleft().result())
+
+
+def main():
+    """Parse the command line and write the roster."""
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("count", type=int, help="number of characters to make")
+    parser.add_argument("--seed", help="root seed; a whole number or any text (default: a new random seed, printed to stderr)")
+    parser.add_argument("--suitability", action="store_true", help="only make characters whose ability modifiers sum to 0 or more")
+    parser.add_argument("--no-human", action="store_true", help="make no humans")
+    parser.add_argument("--no-dwarf", action="store_true", help="make no dwarves")
+    parser.add_argument("--no-elf", action="store_true", help="make no elves")
+    parser.add_argument("--no-halfling", action="store_true", help="make no halflings")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes; 0 for none (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="characters per chunk (default: %(default)s)")
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from the output file's extension, or jsonl)")
+    parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+    args = parser.parse_args()
+    if args.count < 0 or args.workers < 0 or args.chunk_size < 1:
+        parser.error("count and workers can't be negative, and chunk-size must be at least 1")
+
+    outputFormat = args.format
+    if outputFormat is None:
+        outputFormat = "csv" if args.output and args.output.endswith(".csv") else "jsonl"
+    seed = DiceRoller(parseSeed(args.seed)).rootSeed
+    options = (args.suitability, args.no_human, args.no_dwarf, args.no_elf, args.no_halfling)
+
+    started = time.perf_counter()
+    if args.output:
+        output = open(args.output, "w", newline="")
+    else:
+        output = sys.stdout
+    try:
+        writeRoster(output, args.count, seed, outputFormat, options, args.workers, args.chunk_size)
+        output.flush()
+    except BrokenPipeError:
+        #The reader stopped early, like head; point stdout at devnull so Python
+        #doesn't complain again when it flushes stdout on the way out.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    finally:
+        if args.output:
+            output.close()
+    seconds = time.perf_counter() - started
+    print("wrote {} characters with seed {} in {:.1f} s ({:.0f} per second)".format(args.count, seed, seconds, args.count / seconds if seconds else 0), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+This module runs bulk funnel jobs: a request for many 2x2 sheets at once, made in
+the background while the caller polls for progress. When a job is done its
+sheets are in one .zip file, one .pdf per sheet.
+
+A seeded job makes the same characters as /character_funnel does for the seed:
+its first sheet is the /character_funnel sheet, and sheet n is page n of the
+multi-page .pdf for 4 * count characters.
+
+Jobs are run by a few background threads. Each thread hands its job's sheets,
+one at a time, to the render_pool.RenderPool, so the work itself is done in the
+pool's worker processes. A job renders in the background, waiting for a free
+slot, and the pool keeps one slot that only web requests to /character_funnel
+can use, so they still come first.
+
+The job threads are set up with these environment variables:
+    DCC_JOB_WORKERS         Number of jobs run at once. Defaults to 2.
+    DCC_JOB_MAX_SHEETS      Most sheets one job can ask for. Defaults to 250.
+
+Classes:
+    FunnelJob
+    JobManager
+
+Dependencies:
+    Modules:
+        concurrent.futures
+        os
+        secrets
+        threading
+        time
+        zipfile
+        dcc_rng
+        output_store
+        render_pool
+"""
+import os
+import secrets
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dcc_rng import DiceRoller
+from render_pool import PoolBusy
+
+DEFAULT_JOB_WORKERS = 2
+DEFAULT_MAX_SHEETS = 250
+#Finished jobs remembered for status requests, oldest dropped first.
+MAX_FINISHED_JOBS = 200
+
+
+
+class FunnelJob:
+    """
+    FunnelJob is one request for a number of 2x2 sheets.
+
+    Properties:
+        jobId -> string
+        count -> int                Number of sheets asked for.
+        flags -> tuple              testSuitability, noHuman, noDwarf, noElf, noHalfling.
+        seed -> int or string       Root seed; sheet i's characters roll from its child
+                                    streams 4 * i to 4 * i + 3, counting from 0.
+        status -> string            'queued', 'running', 'done' or 'failed'.
+        done -> int                 Number of sheets made so far.
+        error -> string             What went wrong, if the job failed.
+        artifact -> string          Name of the finished .zip file in the output store.
+        created -> float            Time the job was submitted.
+        finished -> float           Time the job finished or failed.
+
+    Methods:
+        __init__(self, count, flags, seed=None) -> FunnelJob
+        getStatus(self) -> dictionary
+    """
+
+
+    def __init__(self, count, flags, seed=None):
+        """
+        Set up a job.
+
+        Args:
+            count: Number of sheets to make.
+            flags: testSuitability, noHuman, noDwarf, noElf and noHalfling, as
+                for char_sheet_assembler2.assemble_sheets.
+            seed: Root seed for the job. If None, a new random seed is picked.
+        """
+        self.jobId = secrets.token_hex(8)
+        self.count = count
+        self.flags = tuple(flags)
+        self.seed = DiceRoller(seed).rootSeed
+        self.status = "queued"
+        self.done = 0
+        self.error = None
+        self.artifact = None
+        self.created = time.time()
+        self.finished = None
+
+
+    def getStatus(self):
+        """Return the job's progress as a dictionary, ready to be sent as JSON."""
+        return {
+            "id": self.jobId,
+            "status": self.status,
+            "count": self.count,
+            "done": self.done,
+            "seed": str(self.seed),
+            "error": self.error,
+        }
+
+
+
+class JobManager:
+    """
+    JobManager queues FunnelJobs and runs them on background threads.
+
+    Properties:
+        renderPool -> RenderPool    Makes each sheet.
+        store -> OutputStore        Keeps the finished .zip files.
+        maxSheets -> int            Most sheets one job can ask for.
+        jobs -> dictionary          FunnelJobs by jobId.
+
+    Methods:
+        __init__(self, renderPool, store, workers=None, maxSheets=None) -> JobManager
+        submit(self, count, flags, seed=None) -> FunnelJob
+        getJob(self, jobId) -> FunnelJob
+        runJob(self, job) -> None
+        renderSheet(self, seed, flags, first=0) -> bytes
+        forgetOldJobs(self) -> None
+        shutdown(self) -> None
+    """
+
+
+    def __init__(self, renderPool, store, workers=None, maxSheets=None):
+        """
+        Set up the job threads. Arguments left as None are read from the environment.
+
+        Args:
+            renderPool: The render_pool.RenderPool that makes the sheets.
+            store: The output_store.OutputStore to keep the finished .zip files in.
+            workers: Number of jobs run at once.
+            maxSheets: Most sheets one job can ask for.
+        """
+        if workers is None:
+            workers = int(os.environ.get("DCC_JOB_WORKERS", DEFAULT_JOB_WORKERS))
+        if maxSheets is None:
+            maxSheets = int(os.environ.get("DCC_JOB_MAX_SHEETS", DEFAULT_MAX_SHEETS))
+        self.renderPool = renderPool
+        self.store = store
+        self.maxSheets = maxSheets
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="funnel-job")
+
+
+    def submit(self, count, flags, seed=None):
+        """
+        Queue a job for count sheets and return it right away.
+
+        Raise a ValueError if count isn't between 1 and maxSheets.
+        """
+        if count < 1 or count > self.maxSheets:
+            raise ValueError("count must be from 1 to {}".format(self.maxSheets))
+        job = FunnelJob(count, flags, seed)
+        with self.lock:
+            self.jobs[job.jobId] = job
+        self.executor.submit(self.runJob, job)
+        return job
+
+
+    def getJob(self, jobId):
+        """Return the FunnelJob with jobId, or None if there isn't one."""
+        with self.lock:
+            return self.jobs.get(jobId)
+
+
+    def runJob(self, job):
+        """Make every sheet of job and write them to its .zip file."""
+        job.status = "running"
+        artifact = "funnel_{}.zip".format(job.jobId)
+        partial = self.store.getPath(artifact + ".part")
+        try:
+            archive = zipfile.ZipFile(partial, "w", zipfile.ZIP_DEFLATED)
+            try:
+                for i in range(job.count):
+                    pdf = self.renderSheet(job.seed, job.flags, 4 * i)
+                    archive.writestr("sheet_{:03d}.pdf".format(i + 1), pdf)
+                    job.done += 1
+            finally:
+                archive.close()
+            os.replace(partial, self.store.getPath(artifact))
+            self.store.add(artifact)
+            job.artifact = artifact
+            job.status = "done"
+        except Exception as error:
+            job.error = str(error) or type(error).__name__
+            job.status = "failed"
+            if os.path.exists(partial):
+                os.remove(partial)
+        job.finished = time.time()
+        self.forgetOldJobs()
+
+
+    def renderSheet(self, seed, flags, first=0):
+        """
+        Return the .pdf bytes of one sheet, with characters from seed's child streams
+        from first on, waiting as long as it takes for a background render slot.
+        """
+        while True:
+            try:
+                return self.renderPool.render(seed, *flags, background=True, first=first)
+            except PoolBusy:
+                #render already waited the pool's timeout for a slot.
+                continue
+
+
+    def forgetOldJobs(self):
+        """Drop the oldest finished jobs past MAX_FINISHED_JOBS. Their files are left to the output store."""
+        with self.lock:
+            finished = [job for job in self.jobs.values() if job.finished is not None]
+            finished.sort(key=lambda job: job.finished)
+            for job in finished[:len(finished) - MAX_FINISHED_JOBS]:
+                del self.jobs[job.jobId]
+
+
+    def shutdown(self):
+        """Stop the job threads after the jobs already running finish; queued jobs are dropped."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
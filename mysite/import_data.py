@@ -22,7 +22,7 @@ Dependencies:
     Table3_4_Equipment.txt
     AppendixL.csv
 """
-
+from compiled_tables import compileOccupationTable, OCCUPATION_RANGES
 
 
 def getTxt(filePath):
@@ -87,6 +87,9 @@ def getOccupation(filePath):
         becomes "Trained Weapon" value in subdictionary.
     Forth field is the trade good for the occupation;
         becomes "Trade Goods" value in sub dictionary.
+
+    Raises a ValueError for a line without exactly four fields, or a roll that
+    appears twice.
     """
     dataDictionary = {}
     fileObj = open(filePath, 'r')
@@ -97,7 +100,12 @@ def getOccupation(filePath):
         if lineList[0] == 'Roll':
             continue
 
+        if len(lineList) != 4:
+            raise ValueError("{}: expected 4 fields separated by '/', got {!r}".format(filePath, lineStrip))
+
         roll = int(lineList[0])
+        if roll in dataDictionary:
+            raise ValueError("{}: roll {} appears more than once".format(filePath, roll))
         occupation = lineList[1]
         trainedWeapon = lineList[2]
         tradeGood = lineList[3]
@@ -182,19 +190,19 @@ def getDataFiles(path):
     dataDictionary["Equipment"] = getTxt(path + "Table3_4_Equipment.txt")
     dataDictionary["Languages"] = getLanguages(path + "AppendixL.csv")
 
+    #Check now that every occupation roll lands on exactly one row.
+    for race in OCCUPATION_RANGES:
+        compileOccupationTable(dataDictionary[race + " Occupation"], OCCUPATION_RANGES[race], race + "_Occupations.csv")
+
     return dataDictionary
 
 
 if __name__ == "__main__":
-    """This is here to create a pickled file of the data dictionary needed by other modules in this project.
-    Once it has been run successfully, it can be ignored."""
-    import pickle
+    """This is here to rebuild the compiled table file, data_files/dcc_tables.bin, needed by other modules in this project.
+    table_store.loadTables rebuilds it whenever a source file changes, so this is rarely needed."""
     import dcc_root_path
+    from table_store import buildTableStore, STORE_NAME
 
     ROOT_PATH = dcc_root_path.get_root_path()
-    writable = open("dcc_dict", "wb")
-    data_dictionary = getDataFiles('{}data_files/'.format(ROOT_PATH))
-    pickleDict = pickle.dumps(data_dictionary)
-    writable.write(pickleDict)
-    print("saved pickle")
-    writable.close()
+    buildTableStore('{}data_files/'.format(ROOT_PATH))
+    print("saved {}".format(STORE_NAME))
@@ -0,0 +1,227 @@
+"""
+This module writes any number of pages of character sheets into one .pdf, one
+page at a time.
+
+cairosvg's svg2pdf makes a new cairo PDF surface for every .svg and finishes it,
+so it can only make one-page documents. StreamedPDFSurface draws each page's
+.svg onto a single shared cairo PDF surface instead, and ends the page with
+show_page, which lets cairo write the page out and drop it. Only the page being
+drawn is ever held in memory, however many pages there are.
+
+A page can also be a (background, overlay) pair of .svgs, from
+char_sheet_assembler2's overlay render mode. The background, a page of blank
+sheets, is drawn once onto a cairo recording surface by RecordedSurface and kept;
+each page replays the recording and then draws only the overlay's text over it.
+cairo writes a replayed recording into the .pdf as a form it can reuse, so the
+blank sheets aren't parsed or drawn again for each page.
+
+It needs cairosvg 2.9.x, since it overrides a private cairosvg method; importing
+it with any other version raises an ImportError.
+
+Run this module to write a funnel of any size without the web app:
+    python multi_page_pdf.py 200 --seed 7 --suitability --layout a3:3x3 -o funnel.pdf
+
+Classes:
+    StreamedPDFSurface
+    RecordedSurface
+
+Functions:
+    getRecording(background, dpi=96)
+    writePDFPages(pages, output, dpi=96)
+    renderPage(page, dpi=96)
+    main()
+
+Dependencies:
+    Modules:
+        argparse
+        collections
+        inspect
+        io
+        threading
+        cairocffi
+        cairosvg
+        char_sheet_assembler2
+        dcc_rng
+        sheet_layout
+        table_store
+    Files:
+        dcc_tables.bin
+        2x2_template_blank.svg
+        char_sheet_blank.svg
+"""
+import inspect
+import io
+import sys
+import threading
+import time
+from collections import OrderedDict
+import cairocffi
+import cairosvg
+from cairosvg.parser import Tree
+from cairosvg.surface import PDFSurface
+import dcc_root_path
+
+ROOT_PATH = dcc_root_path.get_root_path()
+DATA_PATH = "{}data_files/".format(ROOT_PATH)
+#Most background recordings kept; there is one for each layout and number of filled cells.
+MAX_RECORDINGS = 32
+#The cairosvg release series StreamedPDFSurface and RecordedSurface were written
+#against. Both override PDFSurface._create_surface, which is private to cairosvg
+#and can change in any release, so any other version is refused when this module
+#is imported.
+CAIROSVG_SERIES = "2.9"
+
+#The recording of each background .svg drawn so far, by its bytes and dpi, least recently used first.
+_recordings = OrderedDict()
+_recordingsLock = threading.Lock()
+
+if not cairosvg.VERSION.startswith(CAIROSVG_SERIES + "."):
+    raise ImportError("multi_page_pdf needs cairosvg {0}.x, not {1}, since it overrides a private cairosvg method; install cairosvg {0}.x".format(CAIROSVG_SERIES, cairosvg.VERSION))
+if list(inspect.signature(getattr(PDFSurface, "_create_surface", lambda: None)).parameters) != ["self", "width", "height"]:
+    raise ImportError("cairosvg {} has no PDFSurface._create_surface(self, width, height) for multi_page_pdf to override".format(cairosvg.VERSION))
+
+
+
+class StreamedPDFSurface(PDFSurface):
+    """
+    StreamedPDFSurface draws one .svg page onto a cairo PDF surface that is shared
+    by every page of the document, rather than making a surface of its own.
+
+    Properties:
+        document -> cairocffi.PDFSurface    The document's surface.
+        background -> cairocffi.RecordingSurface or None
+                                            Painted on the page before tree is drawn.
+
+    Methods:
+        __init__(self, document, tree, dpi, background=None) -> StreamedPDFSurface
+        _create_surface(self, width, height) -> tuple
+    """
+
+
+    def __init__(self, document, tree, dpi, background=None):
+        """Size the document's current page to the .svg and draw tree on it, over background if given."""
+        self.document = document
+        self.background = background
+        super().__init__(tree, None, dpi)
+
+
+    def _create_surface(self, width, height):
+        """Return the document's surface, with its current page set to width by height points and the background painted."""
+        #The size has to be set before anything is drawn on the page.
+        self.document.set_size(width, height)
+        if self.background is not None:
+            context = cairocffi.Context(self.document)
+            context.set_source_surface(self.background)
+            context.paint()
+        return self.document, width, height
+
+
+
+class RecordedSurface(PDFSurface):
+    """
+    RecordedSurface draws an .svg onto a cairo recording surface, in the same
+    units as a PDF page, to be replayed onto any number of pages.
+
+    Methods:
+        _create_surface(self, width, height) -> tuple
+    """
+
+
+    def _create_surface(self, width, height):
+        """Return a new recording surface of width by height points."""
+        return cairocffi.RecordingSurface(cairocffi.CONTENT_COLOR_ALPHA, (0, 0, width, height)), width, height
+
+
+
+def getRecording(background, dpi=96):
+    """
+    Return the cairo recording of a background page's .svg bytes, drawing it the
+    first time it is asked for. Once MAX_RECORDINGS are kept, the least recently
+    used one is dropped to make room.
+    """
+    key = (background, dpi)
+    with _recordingsLock:
+        recording = _recordings.get(key)
+        if recording is not None:
+            _recordings.move_to_end(key)
+            return recording
+    recording = RecordedSurface(Tree(bytestring=background), None, dpi).cairo
+    recording.flush()
+    with _recordingsLock:
+        _recordings[key] = recording
+        while len(_recordings) > MAX_RECORDINGS:
+            _recordings.popitem(last=False)
+    return recording
+
+
+
+def writePDFPages(pages, output, dpi=96):
+    """
+    Write each page of pages, an iterable of .svg bytes, as a page of one .pdf,
+    and return the number of pages written.
+
+    Args:
+        pages: The pages' .svg bytes, such as char_sheet_assembler2.assemblePages,
+            or (background, overlay) pairs of .svg bytes. They are read one at a
+            time, as each is drawn.
+        output: The .pdf's path, or a binary file open for writing.
+        dpi: Resolution cairosvg reads the .svg units at, as in svg2pdf.
+    """
+    #The size is set again for each page, before anything is drawn on it.
+    document = cairocffi.PDFSurface(output, 1, 1)
+    count = 0
+    try:
+        for page in pages:
+            if isinstance(page, tuple):
+                background, page = page
+                StreamedPDFSurface(document, Tree(bytestring=page), dpi, getRecording(background, dpi))
+            else:
+                StreamedPDFSurface(document, Tree(bytestring=page), dpi)
+            document.show_page()
+            count += 1
+    finally:
+        document.finish()
+    return count
+
+
+def renderPage(page, dpi=96):
+    """Return the .pdf bytes of one page, .svg bytes or a (background, overlay) pair, as for writePDFPages."""
+    output = io.BytesIO()
+    writePDFPages([page], output, dpi)
+    return output.getvalue()
+
+
+def main():
+    """Parse the command line and write the .pdf."""
+    import argparse
+    from char_sheet_assembler2 import assembleMultiPagePDF
+    from dcc_rng import DiceRoller, parseSeed
+    from sheet_layout import getLayout, DEFAULT_LAYOUT
+    from table_store import loadConfiguredTables
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("count", type=int, help="number of characters to make, as many to a page as the layout has cells")
+    parser.add_argument("--seed", help="root seed; a whole number or any text (default: a new random seed, printed to stderr)")
+    parser.add_argument("--suitability", action="store_true", help="only make characters whose ability modifiers sum to 0 or more")
+    parser.add_argument("--no-human", action="store_true", help="make no humans")
+    parser.add_argument("--no-dwarf", action="store_true", help="make no dwarves")
+    parser.add_argument("--no-elf", action="store_true", help="make no elves")
+    parser.add_argument("--no-halfling", action="store_true", help="make no halflings")
+    parser.add_argument("--layout", default=DEFAULT_LAYOUT, help="paper and grid, like a4 or a3:3x3 (default: %(default)s)")
+    parser.add_argument("-o", "--output", required=True, help=".pdf file to write")
+    args = parser.parse_args()
+    if args.count < 1:
+        parser.error("count must be at least 1")
+    try:
+        getLayout(args.layout)
+    except ValueError as error:
+        parser.error(str(error))
+
+    seed = DiceRoller(parseSeed(args.seed)).rootSeed
+    started = time.perf_counter()
+    pageCount = assembleMultiPagePDF(loadConfiguredTables(DATA_PATH), args.count, args.suitability, args.no_human, args.no_dwarf, args.no_elf, args.no_halfling, seed, args.output, args.layout)
+    seconds = time.perf_counter() - started
+    print("wrote {} characters on {} pages with seed {} in {:.1f} s".format(args.count, pageCount, seed, seconds), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
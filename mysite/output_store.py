@@ -0,0 +1,253 @@
+"""
+This module looks after the files the app keeps in static/output: the .pdf
+copy of every funnel sheet and the .zip file of every bulk job. The folder is
+the app's own and isn't in git; the .pdfs web_dcc.py saved in static/new_sheets
+are left alone.
+
+Every file gets a name no other file can have, and the store keeps the folder
+under a size cap and an age cap by deleting the least recently used files first.
+The folder is read once, when the store starts; after that the store keeps its
+own index, so nothing walks the folder on a request. Deleting happens on a
+background thread, which also deletes any .part file, half of a file whose
+writer crashed, left longer than DCC_STORE_PART_MINUTES.
+
+The store is set up with these environment variables:
+    DCC_STORE_MAX_MB        Most megabytes kept in the folder. Defaults to 200.
+    DCC_STORE_MAX_DAYS      Days a file is kept after it was last used. Defaults to 30.
+    DCC_STORE_SWEEP         Seconds between background sweeps. Defaults to 60.
+    DCC_STORE_PART_MINUTES  Minutes a .part file is left before it is deleted. Defaults to 60.
+
+Classes:
+    OutputStore
+
+Dependencies:
+    Modules:
+        collections
+        os
+        secrets
+        threading
+        time
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_MB = 200
+DEFAULT_MAX_DAYS = 30
+DEFAULT_SWEEP = 60
+DEFAULT_PART_MINUTES = 60
+#Ending of a file that is still being written.
+PART_SUFFIX = ".part"
+
+
+
+class OutputStore:
+    """
+    OutputStore is a folder of output files with a size cap, an age cap and an
+    index of the files by when they were last used.
+
+    Properties:
+        directory -> string
+        maxBytes -> int             Most bytes kept; 0 for no cap.
+        maxAge -> float             Most seconds a file is kept after it was last used; 0 for no cap.
+        sweep -> float              Seconds between background sweeps.
+        maxPartAge -> float         Most seconds a .part file is left; 0 for no cap.
+        files -> OrderedDict        (size, last used) for each file name, least recently used first.
+        totalBytes -> int
+
+    Methods:
+        __init__(self, directory, maxBytes=None, maxAge=None, sweep=None, maxPartAge=None) -> OutputStore
+        start(self) -> None
+        scan(self) -> None
+        newName(self, stem, suffix) -> string
+        getPath(self, name) -> string
+        save(self, data, stem, suffix) -> string
+        add(self, name) -> None
+        touch(self, name) -> bool
+        evict(self, now=None) -> list
+        removeParts(self, now=None) -> list
+        run(self) -> None
+        stop(self) -> None
+    """
+
+
+    def __init__(self, directory, maxBytes=None, maxAge=None, sweep=None, maxPartAge=None):
+        """
+        Set up the store. Arguments left as None are read from the environment.
+
+        Args:
+            directory: The folder to keep the files in.
+            maxBytes: Most bytes kept in the folder.
+            maxAge: Most seconds a file is kept after it was last used.
+            sweep: Seconds between background sweeps.
+            maxPartAge: Most seconds a .part file is left before it is deleted.
+        """
+        if maxBytes is None:
+            maxBytes = int(float(os.environ.get("DCC_STORE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        if maxAge is None:
+            maxAge = float(os.environ.get("DCC_STORE_MAX_DAYS", DEFAULT_MAX_DAYS)) * 24 * 60 * 60
+        if sweep is None:
+            sweep = float(os.environ.get("DCC_STORE_SWEEP", DEFAULT_SWEEP))
+        if maxPartAge is None:
+            maxPartAge = float(os.environ.get("DCC_STORE_PART_MINUTES", DEFAULT_PART_MINUTES)) * 60
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.maxAge = maxAge
+        self.sweep = sweep
+        self.maxPartAge = maxPartAge
+        self.files = OrderedDict()
+        self.totalBytes = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+
+    def start(self):
+        """Index the folder and start the background eviction thread."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.scan()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="output-store", daemon=True)
+            self.thread.start()
+
+
+    def scan(self):
+        """Rebuild the index from one pass over the folder, using each file's modified time as its last use."""
+        found = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                #A .part file is still being written, and isn't the store's yet.
+                if entry.is_file(follow_symlinks=False) and not entry.name.endswith(PART_SUFFIX):
+                    stat = entry.stat(follow_symlinks=False)
+                    found.append((stat.st_mtime, entry.name, stat.st_size))
+        found.sort()
+        with self.lock:
+            self.files = OrderedDict((name, (size, used)) for used, name, size in found)
+            self.totalBytes = sum(size for used, name, size in found)
+        self.wake.set()
+
+
+    def newName(self, stem, suffix):
+        """Return stem plus a random tag and suffix; the tag keeps names made in the same second apart."""
+        return "{}_{}{}".format(stem, secrets.token_hex(4), suffix)
+
+
+    def getPath(self, name):
+        """Return the full path of the file called name."""
+        return os.path.join(self.directory, name)
+
+
+    def save(self, data, stem, suffix):
+        """
+        Write data to a new file, add it to the index and return its name. The file
+        is created exclusively, so an existing file is never overwritten.
+        """
+        while True:
+            name = self.newName(stem, suffix)
+            try:
+                file = open(self.getPath(name), "xb")
+            except FileExistsError:
+                continue
+            break
+        try:
+            file.write(data)
+        finally:
+            file.close()
+        self.add(name)
+        return name
+
+
+    def add(self, name):
+        """Add a file already written to the folder to the index, as just used."""
+        size = os.path.getsize(self.getPath(name))
+        with self.lock:
+            old = self.files.pop(name, None)
+            if old is not None:
+                self.totalBytes -= old[0]
+            self.files[name] = (size, time.time())
+            self.totalBytes += size
+            overCap = self.maxBytes and self.totalBytes > self.maxBytes
+        if overCap:
+            self.wake.set()
+
+
+    def touch(self, name):
+        """Mark a file as just used. Return False if the store doesn't have it."""
+        with self.lock:
+            entry = self.files.get(name)
+            if entry is None:
+                return False
+            self.files[name] = (entry[0], time.time())
+            self.files.move_to_end(name)
+            return True
+
+
+    def evict(self, now=None):
+        """Delete the least recently used files until the folder is under both caps. Return their names."""
+        if now is None:
+            now = time.time()
+        evicted = []
+        while True:
+            with self.lock:
+                if not self.files:
+                    break
+                name, (size, used) = next(iter(self.files.items()))
+                tooBig = self.maxBytes and self.totalBytes > self.maxBytes
+                tooOld = self.maxAge and now - used > self.maxAge
+                if not (tooBig or tooOld):
+                    break
+                del self.files[name]
+                self.totalBytes -= size
+            try:
+                os.remove(self.getPath(name))
+            except FileNotFoundError:
+                pass
+            evicted.append(name)
+        return evicted
+
+
+    def removeParts(self, now=None):
+        """
+        Delete the .part files older than maxPartAge, left by a job or request that
+        crashed before it could finish or delete them. Return their names.
+        """
+        if not self.maxPartAge:
+            return []
+        if now is None:
+            now = time.time()
+        removed = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(PART_SUFFIX) or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    if now - entry.stat(follow_symlinks=False).st_mtime > self.maxPartAge:
+                        os.remove(entry.path)
+                        removed.append(entry.name)
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+    def run(self):
+        """
+        Evict files every sweep seconds, or sooner when the size cap is passed, and
+        delete old .part files. Run by the background thread.
+        """
+        while not self.stopping.is_set():
+            self.evict()
+            self.removeParts()
+            self.wake.wait(self.sweep)
+            self.wake.clear()
+
+
+    def stop(self):
+        """Stop the background eviction thread."""
+        self.stopping.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -1,81 +1,52 @@
+"""
+This module builds data_files/dcc.db, the SQLite copy of the character creation
+tables that db_tables reads, from the same .csv and .txt files import_data reads.
+
+The load is one transaction: the tables are made if they are missing, emptied,
+filled with parameterized executemany inserts fed a row at a time from the source
+files, and indexed. If a source file is bad nothing is changed, and running it
+again gives the same database.
+
+Functions:
+    create_tables(curs)
+    readLines(filePath)
+    readFields(filePath, delimiter)
+    abilityScoreRows(filePath)
+    luckScoreRows(filePath)
+    occupationRows(filePath, raceId)
+    listRows(filePath)
+    languageRows(filePath)
+    populateDatabase(dataPath, dbPath=None)
+
+Dependencies:
+    Modules:
+        csv
+        sqlite3
+        time
+        compiled_tables
+    Files:
+        dcc.db
+        Table1_1_Ability_Score_Modifiers.csv
+        Table1_2_Luck_Score.txt
+        Human_Occupations.csv
+        Dwarf_Occupations.csv
+        Elf_Occupations.csv
+        Halfling_Occupations.csv
+        Table1_3a_Farmer_Type.txt
+        Table1_3b_Animal_Type.txt
+        Table1_3c_Whats_In_The_Cart.txt
+        Table3_4_Equipment.txt
+        AppendixL.csv
+"""
+import csv
+import os
 import sqlite3
-import dcc_root_path
+import time
+from compiled_tables import RACES
 
-ROOT_PATH = dcc_root_path.get_root_path()
+DB_NAME = "dcc.db"
 
-connection = sqlite3.connect('data_files/dcc.db')
-curs = connection.cursor()
-
-def create_tables(curs, conn):
-
-    curs.execute("DROP TABLE dwarf_occupations")
-    curs.execute("DROP TABLE elf_occupations")
-    curs.execute("DROP TABLE halfling_occupations")
-    curs.execute("DROP TABLE human_occupations")
-    curs.execute("DROP TABLE all_occupations")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS appendix_l(
-        id INTEGER PRIMARY KEY,
-        language TEXT,
-        zero_level INTEGER,
-        warrior INTEGER,
-        cleric INTEGER,
-        thief INTEGER,
-        wizard INTEGER,
-        halfing INTEGER,
-        elf INTEGER,
-        dwarf INTEGER
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS dwarf_occupations(
-        id INTEGER PRIMARY KEY,
-        race INTEGER,
-        occupation TEXT,
-        weapon TEXT,
-        armor TEXT,
-        trade_good TEXT,
-        has_ammo INTEGER,
-        has_animal INTEGER,
-        has_crop INTEGER,
-        has_cart INTEGER,
-        extra_gp INTEGER,
-        extra_sp INTEGER,
-        extra_cp INTEGER
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS elf_occupations(
-        id INTEGER PRIMARY KEY,
-        race INTEGER,
-        occupation TEXT,
-        weapon TEXT,
-        armor TEXT,
-        trade_good TEXT,
-        has_ammo INTEGER,
-        has_animal INTEGER,
-        has_crop INTEGER,
-        has_cart INTEGER,
-        extra_gp INTEGER,
-        extra_sp INTEGER,
-        extra_cp INTEGER
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS halfling_occupations(
-        id INTEGER PRIMARY KEY,
-        race INTEGER,
-        occupation TEXT,
-        weapon TEXT,
-        armor TEXT,
-        trade_good TEXT,
-        has_ammo INTEGER,
-        has_animal INTEGER,
-        has_crop INTEGER,
-        has_cart INTEGER,
-        extra_gp INTEGER,
-        extra_sp INTEGER,
-        extra_cp INTEGER
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS all_occupations(
+OCCUPATION_COLUMNS = """(
         id INTEGER PRIMARY KEY,
         race INTEGER,
         occupation TEXT,
@@ -89,209 +60,230 @@ def create_tables(curs, conn):
         extra_gp INTEGER,
         extra_sp INTEGER,
         extra_cp INTEGER
-    )""")
+    )"""
 
-    curs.execute("""CREATE TABLE IF NOT EXISTS human_occupations(
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS appendix_l(
         id INTEGER PRIMARY KEY,
-        race INTEGER,
-        occupation TEXT,
-        weapon TEXT,
-        armor TEXT,
-        trade_good TEXT,
-        has_ammo INTEGER,
-        has_animal INTEGER,
-        has_crop INTEGER,
-        has_cart INTEGER,
-        extra_gp INTEGER,
-        extra_sp INTEGER,
-        extra_cp INTEGER
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS ability_score_modifiers(
+        language TEXT,
+        zero_level INTEGER,
+        warrior INTEGER,
+        cleric INTEGER,
+        thief INTEGER,
+        wizard INTEGER,
+        halfing INTEGER,
+        elf INTEGER,
+        dwarf INTEGER
+    )""",
+    "CREATE TABLE IF NOT EXISTS dwarf_occupations" + OCCUPATION_COLUMNS,
+    "CREATE TABLE IF NOT EXISTS elf_occupations" + OCCUPATION_COLUMNS,
+    "CREATE TABLE IF NOT EXISTS halfling_occupations" + OCCUPATION_COLUMNS,
+    "CREATE TABLE IF NOT EXISTS all_occupations" + OCCUPATION_COLUMNS,
+    "CREATE TABLE IF NOT EXISTS human_occupations" + OCCUPATION_COLUMNS,
+    """CREATE TABLE IF NOT EXISTS ability_score_modifiers(
         id INTEGER PRIMARY KEY,
         ability_score INTEGER,
         modifier INTEGER,
         wizard_spells_known INTEGER,
         max_spell_level INTEGER
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS luck_scores(
+    )""",
+    """CREATE TABLE IF NOT EXISTS luck_scores(
         id INTEGER PRIMARY KEY,
         luck_sign TEXT,
         description TEXT
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS farmer_type(
+    )""",
+    """CREATE TABLE IF NOT EXISTS farmer_type(
         id INTEGER PRIMARY KEY,
         crop TEXT
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS animal_type(
+    )""",
+    """CREATE TABLE IF NOT EXISTS animal_type(
         id INTEGER PRIMARY KEY,
         animal TEXT
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS whats_in_the_cart(
+    )""",
+    """CREATE TABLE IF NOT EXISTS whats_in_the_cart(
         id INTEGER PRIMARY KEY,
         contents TEXT
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS equipment(
+    )""",
+    """CREATE TABLE IF NOT EXISTS equipment(
         id INTEGER PRIMARY KEY,
         item TEXT
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS race(
+    )""",
+    """CREATE TABLE IF NOT EXISTS race(
         id INTEGER PRIMARY KEY,
         race INTEGER,
-        race_name TEXT
         traits TEXT
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS weapon_damage_range(
+    )""",
+    """CREATE TABLE IF NOT EXISTS weapon_damage_range(
         id INTEGER PRIMARY KEY,
-        weapon_class INTEGER,
+        weapon TEXT,
         damage TEXT,
         range TEXT
-    )""")
-
-    curs.execute("""CREATE TABLE IF NOT EXISTS armor_class(
+    )""",
+    """CREATE TABLE IF NOT EXISTS armor_class(
         id INTEGER PRIMARY KEY,
-        armor_type INTEGER,
+        armor_type TEXT,
         armor_class_bonus INTEGER
-    )""")
-
-
-    already_run = '''
-    # inserts for ability_score_modifiers table
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(1, NULL, NULL, NULL, NULL)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(2, NULL, NULL, NULL, NULL)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(3, 3, -3, NULL, NULL)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(4, 4, -3, -2, 1)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(5, 5, -2, -2, 1)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(6, 6, -1, -1, 1)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(7, 7, -1, -1, 1)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(8, 8, -1, 0, 2)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(10, 10, 0, 0, 3)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(11, 11, 0, 0, 3)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(12, 12, 0, 0, 4)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(13, 13, 1, 0, 4)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(14, 14, 1, 1, 4)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(15, 15, 1, 1, 5)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(16, 16, 2, 1, 5)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(17, 17, 2, 2, 5)""")
-    curs.execute("""INSERT INTO ability_score_modifiers VALUES(18, 18, 3, 2, 5)""")
-
-
-    # insert into luck_scores table
-    ls = """Harsh winter: All attack rolls
-The bull: Melee attack rolls
-Fortunate date: Missile fire attack rolls
-Raised by wolves: Unarmed attack rolls
-Conceived on horseback: Mounted attack rolls
-Born on the battlefield: Damage rolls
-Path of the bear: Melee damage rolls
-Hawkeye: Missile fire damage rolls
-Pack hunter: Attack and damage rolls for 0-level starting weapon
-Born under the loom: Skill checks (including thief skills)
-Fox`s cunning: Find/disable traps
-Four leafed clover: Find secret doors
-Seventh son: spell checks
-The raging storm: Spell damage
-Righteous heart: Turn unholy checks
-Survived the plague: Magical healing
-Lucky sign: Saving throws
-Guardian angel: Saving throws to escape traps
-Survived a spider bite: Saving throws against poison
-Struck by lightning: Reflex saving throws
-Lived through famine: Fortitude saving throws
-Resisted temptation: Willpower saving throws
-Charmed house: Armor class
-Speed of the cobra: Initiative
-Bountiful harvest: Hit points (applies at each level)
-Warrior`s arm: Critical hit tables
-Unholy house: Corruption rolls
-The broken star: Fumbles
-Birdsong: Number of languages
-Wild child: Speed (each +1/-1 = +5`/-5` speed)"""
-
-    lines = ls.split('\n')
-    id = 1
-    for line in lines:
-        line = line.split(': ')
-        print("{}. {} ---- {}".format(id, line[0], line[1]))
-        curs.execute("INSERT INTO luck_scores VALUES({}, '{}', '{}')".format(id, line[0], line[1]))
-        id += 1
-
-    curs.execute("DROP TABLE racial_traits")
-
-
-    curs.execute("INSERT INTO race VALUES(1, 'Dwarf', 'Infravision, Underground skills')")
-    curs.execute("INSERT INTO race VALUES(2, 'Elf', 'Infravision, Immune to magic sleep/paralysis, heightened senses, iron vulnerability')")
-    curs.execute("INSERT INTO race VALUES(3, 'Halfling', 'Infravision, Small size')")
-    curs.execute("INSERT INTO race VALUES(4, 'Human', 'None')")
-
-
-    curs.execute("INSERT INTO armor_class VALUES(1, 'Leather armor', 2)")
-    curs.execute("INSERT INTO armor_class VALUES(2, 'Hide armor', 3)")
-    curs.execute("INSERT INTO armor_class VALUES(3, 'Shield', 1)")
-
-
-    curs.execute("INSERT INTO weapon_damage_range VALUES(1, 'dagger', '1d4', '0/0/0')")
-    curs.execute("INSERT INTO weapon_damage_range VALUES(2, 'spear', '1d8', '0/0/0')")
-    curs.execute("INSERT INTO weapon_damage_range VALUES(3, 'staff', '1d4', '0/0/0')")
-    curs.execute("INSERT INTO weapon_damage_range VALUES(4, 'club', '1d4', '0/0/0')")
-    curs.execute("INSERT INTO weapon_damage_range VALUES(5, 'axe', '1d6', '10/20/30*')")
-    curs.execute("INSERT INTO weapon_damage_range VALUES(6, 'short sword', '1d6', '0/0/0')")
-    curs.execute("INSERT INTO weapon_damage_range VALUES(7, 'dart', '1d4', '20/40/60*')")
-    curs.execute("INSERT INTO weapon_damage_range VALUES(8, 'shortbow', '1d6', '50/100/150')")
-    curs.execute("INSERT INTO weapon_damage_range VALUES(9, 'sling', '1d4', '40/80/160*')")
-    curs.execute("INSERT INTO weapon_damage_range VALUES(10, 'longsword', '1d8', '0/0/0')")
-    curs.execute("INSERT INTO weapon_damage_range VALUES(11, 'mace', '1d6', '0/0/0')")
-    curs.execute("INSERT INTO weapon_damage_range VALUES(12, 'subual', '1d3', '0/0/0')")
-
-
-    farmers = "Potato, Wheat, Turnip, Corn, Rice, Parsnip, Radish, Rutabaga"
-    farmers = farmers.split(', ')
-    id = 1
-    for type in farmers:
-        curs.execute("INSERT INTO farmer_type VALUES({}, '{}')".format(id, type))
-        id += 1
-
-    animals = "Hen Sheep Goat Cow Duck Goose Mule"
-    animals = animals.split(' ')
-    id = 1
-    for type in animals:
-        curs.execute("INSERT INTO animal_type VALUES({}, '{}')".format(id, type))
-        id += 1
-
-
-    contents = "tomatoes, nothing, straw, your dead, dirt, rocks"
-    contents = contents.split(', ')
-    id = 1
-    for type in contents:
-        #print("{}, '{}'".format(id, type))
-        curs.execute("INSERT INTO whats_in_the_cart VALUES({}, '{}')".format(id, type))
-        id += 1
-
-
-    things = "Backpack: Candle: Chain 10ft: Chalk 1pc.: Chest, empty: Crowbar: Flask, empty: Flint & steel: Grappling hook: Hammer, small: Holy symbol: Holy water, 1 vial: Iron spike: Lantern: Mirror, hand-sized: Oil, 1 flask: Pole, 10ft: Rations, 1 day: Rope, 50ft: Sack, large: Sack, small: Thieves` tools: Torch 1: Waterskin"
-    things = things.split(": ")
-    id = 1
-    for thing in things:
-        #print("{}, '{}'".format(id, thing))
-        curs.execute("INSERT INTO equipment VALUES({}, '{}')".format(id, thing))
-        id += 1
-'''
-
-
-    conn.commit()
+    )""",
+]
+
+#The occupation tables are keyed by roll already: id is the rowid.
+INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS ability_score_modifiers_score ON ability_score_modifiers(ability_score)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS appendix_l_language ON appendix_l(language)",
+]
+
+#Tables with no source file; these rows are the whole table.
+RACE_ROWS = [
+    (1, "Dwarf", "Infravision, Underground skills"),
+    (2, "Elf", "Infravision, Immune to magic sleep/paralysis, heightened senses, iron vulnerability"),
+    (3, "Halfling", "Infravision, Small size"),
+    (4, "Human", "None"),
+]
+ARMOR_CLASS_ROWS = [
+    (1, "Leather armor", 2),
+    (2, "Hide armor", 3),
+    (3, "Shield", 1),
+]
+WEAPON_DAMAGE_RANGE_ROWS = [
+    (1, "dagger", "1d4", "0/0/0"),
+    (2, "spear", "1d8", "0/0/0"),
+    (3, "staff", "1d4", "0/0/0"),
+    (4, "club", "1d4", "0/0/0"),
+    (5, "axe", "1d6", "10/20/30*"),
+    (6, "short sword", "1d6", "0/0/0"),
+    (7, "dart", "1d4", "20/40/60*"),
+    (8, "shortbow", "1d6", "50/100/150"),
+    (9, "sling", "1d4", "40/80/160*"),
+    (10, "longsword", "1d8", "0/0/0"),
+    (11, "mace", "1d6", "0/0/0"),
+    (12, "subual", "1d3", "0/0/0"),
+]
+RACE_IDS = {race: raceId for raceId, race, traits in RACE_ROWS}
+
+#Source file, table and column of each one column table.
+LIST_TABLES = [
+    ("Table1_3a_Farmer_Type.txt", "farmer_type", "crop"),
+    ("Table1_3b_Animal_Type.txt", "animal_type", "animal"),
+    ("Table1_3c_Whats_In_The_Cart.txt", "whats_in_the_cart", "contents"),
+    ("Table3_4_Equipment.txt", "equipment", "item"),
+]
+
+
+
+def create_tables(curs):
+    """Make any of dcc.db's tables that don't exist yet. Tables that already exist are left alone."""
+    for statement in SCHEMA:
+        curs.execute(statement)
+
+
+def readLines(filePath):
+    """Yield each line of a text file without its line ending, one at a time."""
+    with open(filePath, "r", newline="") as fileObj:
+        for line in fileObj:
+            yield line.rstrip("\r\n")
+
+
+def readFields(filePath, delimiter):
+    """Yield each line of a delimited file as a list of fields, skipping a header line and blank lines."""
+    with open(filePath, "r", newline="") as fileObj:
+        #The fields are never quoted, and some have quote marks in them.
+        for fields in csv.reader(fileObj, delimiter=delimiter, quoting=csv.QUOTE_NONE):
+            if fields and fields[0] not in ("Ability Score", "Roll", "Language"):
+                yield fields
+
+
+def abilityScoreRows(filePath):
+    """Yield (score, modifier, spells known, max spell level) rows, with None for 'None'."""
+    for fields in readFields(filePath, ","):
+        score, modifier, spellsKnown, maxSpellLevel = fields
+        yield (int(score), int(modifier), None if spellsKnown == "None" else int(spellsKnown), None if maxSpellLevel == "None" else int(maxSpellLevel))
+
+
+def luckScoreRows(filePath):
+    """Yield (id, sign, description) rows from 'sign: description' lines."""
+    for rowId, line in enumerate(readLines(filePath), 1):
+        sign, separator, description = line.partition(": ")
+        if not separator:
+            raise ValueError("{}: expected 'sign: description', got {!r}".format(filePath, line))
+        yield (rowId, sign, description)
+
+
+def occupationRows(filePath, raceId):
+    """Yield (roll, race, occupation, weapon, trade good) rows from a roll/occupation/weapon/trade good file."""
+    for fields in readFields(filePath, "/"):
+        if len(fields) != 4:
+            raise ValueError("{}: expected 4 fields separated by '/', got {!r}".format(filePath, "/".join(fields)))
+        yield (int(fields[0]), raceId, fields[1], fields[2], fields[3])
+
+
+def listRows(filePath):
+    """Yield (id, line) rows, numbered from 1."""
+    return enumerate(readLines(filePath), 1)
+
+
+def languageRows(filePath):
+    """Yield (language, chance for each column) rows, with None where the file has '-'."""
+    for fields in readFields(filePath, ","):
+        yield [fields[0]] + [None if chance == "-" else int(chance) for chance in fields[1:9]]
+
+
+def populateDatabase(dataPath, dbPath=None):
+    """
+    Rebuild dcc.db from the source files in dataPath, in one transaction, and return
+    the number of rows written to each table as a dictionary.
+
+    Raises a ValueError for a badly formed source file, or a sqlite3.IntegrityError
+    for a roll, score or language that appears twice; the database is left as it was.
+
+    Args:
+        dataPath: The data_files folder, ending in a slash.
+        dbPath: The database to write. Defaults to dcc.db in dataPath.
+    """
+    if dbPath is None:
+        dbPath = os.path.join(dataPath, DB_NAME)
+    loads = [
+        ("ability_score_modifiers", "INSERT INTO ability_score_modifiers (ability_score, modifier, wizard_spells_known, max_spell_level) VALUES (?, ?, ?, ?)", abilityScoreRows(dataPath + "Table1_1_Ability_Score_Modifiers.csv")),
+        ("luck_scores", "INSERT INTO luck_scores (id, luck_sign, description) VALUES (?, ?, ?)", luckScoreRows(dataPath + "Table1_2_Luck_Score.txt")),
+        ("appendix_l", "INSERT INTO appendix_l (language, zero_level, warrior, cleric, thief, wizard, halfing, elf, dwarf) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", languageRows(dataPath + "AppendixL.csv")),
+        ("race", "INSERT INTO race (id, race, traits) VALUES (?, ?, ?)", RACE_ROWS),
+        ("armor_class", "INSERT INTO armor_class (id, armor_type, armor_class_bonus) VALUES (?, ?, ?)", ARMOR_CLASS_ROWS),
+        ("weapon_damage_range", "INSERT INTO weapon_damage_range (id, weapon, damage, range) VALUES (?, ?, ?, ?)", WEAPON_DAMAGE_RANGE_ROWS),
+    ]
+    for race in RACES:
+        table = race.lower() + "_occupations"
+        loads.append((table, "INSERT INTO {} (id, race, occupation, weapon, trade_good) VALUES (?, ?, ?, ?, ?)".format(table), occupationRows("{}{}_Occupations.csv".format(dataPath, race), RACE_IDS[race])))
+    for fileName, table, column in LIST_TABLES:
+        loads.append((table, "INSERT INTO {} (id, {}) VALUES (?, ?)".format(table, column), listRows(dataPath + fileName)))
+
+    counts = {}
+    #Manage the transaction by hand, so the CREATE statements are part of it too.
+    connection = sqlite3.connect(dbPath, isolation_level=None)
+    try:
+        curs = connection.cursor()
+        curs.execute("BEGIN IMMEDIATE")
+        try:
+            create_tables(curs)
+            for table, insert, rows in loads:
+                curs.execute("DELETE FROM {}".format(table))
+                curs.executemany(insert, rows)
+                counts[table] = curs.rowcount
+            for statement in INDEXES:
+                curs.execute(statement)
+            curs.execute("COMMIT")
+        except BaseException:
+            curs.execute("ROLLBACK")
+            raise
+    finally:
+        connection.close()
+    return counts
 
 
 
 if __name__ == "__main__":
-    connection = sqlite3.connect('data_files/dcc.db')
-    curs = connection.cursor()
-    create_tables(curs, connection)
-    curs.close()
-    connection.close()
+    """Rebuild data_files/dcc.db from the source files."""
+    import dcc_root_path
+
+    ROOT_PATH = dcc_root_path.get_root_path()
+    started = time.perf_counter()
+    counts = populateDatabase('{}data_files/'.format(ROOT_PATH))
+    print("loaded {} rows into {}data_files/{} in {:.1f} ms".format(sum(counts.values()), ROOT_PATH, DB_NAME, (time.perf_counter() - started) * 1000))
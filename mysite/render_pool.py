@@ -0,0 +1,319 @@
+"""
+This module makes character sheet .pdfs in a pool of worker processes, so that
+rolling, assembling and the cairosvg conversion run off the web worker's thread
+and the number of sheets made at once grows with the number of cores.
+
+Each worker loads the rulebook data and parses the sheet templates once, when it
+starts, and the pool starts every worker before it takes its first request. Only
+so many requests can wait for a worker at once, and each one has a time limit.
+Each sheet comes back with its stage timings and roll counts, which are recorded
+in stage_metrics in the calling process. A multi-page .pdf is written straight to
+a file by the worker, a page at a time, and only its page count comes back.
+
+The pool is set up with these environment variables:
+    DCC_RENDER_WORKERS      Number of worker processes. Defaults to the number of
+                            cores; 0 makes the sheets on the calling thread instead.
+    DCC_RENDER_QUEUE        Number of requests that can be made or waiting at once.
+                            Defaults to twice the number of workers.
+    DCC_RENDER_TIMEOUT      Seconds a request waits for its sheet. Defaults to 30.
+
+Background callers, the bulk jobs and the warm pool, pass background=True. They
+wait for a slot instead of being turned away, but can only ever hold all but one
+of the queue's slots, so a /character_funnel request always has one to take.
+
+In char_sheet_assembler2's overlay render mode, DCC_RENDER_MODE=overlay, each
+worker also records the blank 2x2 page when it starts.
+
+Classes:
+    PoolBusy
+    RenderTimeout
+    RenderPool
+
+Functions:
+    initWorker(dataPath)
+    warmUp()
+    renderPDF(seed, testSuitability, noHuman, noDwarf, noElf, noHalfling, first=0)
+    renderPages(path, count, seed, testSuitability, noHuman, noDwarf, noElf, noHalfling, layout=DEFAULT_LAYOUT)
+    removeFile(path)
+    getSheetStats(testSuitability, noHuman, noDwarf, noElf, noHalfling)
+    getRenderPool(dataPath)
+
+Dependencies:
+    Modules:
+        concurrent.futures
+        os
+        threading
+        time
+        cairosvg
+        char_sheet_assembler2
+        char_sheet_creator2
+        compiled_tables
+        dcc_rng
+        multi_page_pdf
+        sheet_layout
+        stage_metrics
+        table_store
+    Files:
+        dcc_tables.bin
+        2x2_template_blank.svg
+        char_sheet_blank.svg
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from dcc_rng import DiceRoller
+from sheet_layout import getLayout, DEFAULT_LAYOUT
+from stage_metrics import recordSheet, recordStage
+
+DEFAULT_TIMEOUT = 30
+
+#The rulebook data in this process, loaded by initWorker.
+_workerData = None
+_renderPool = None
+
+
+
+class PoolBusy(Exception):
+    """Raised when the pool's queue is full."""
+
+
+
+class RenderTimeout(Exception):
+    """Raised when a sheet isn't made in time."""
+
+
+
+class RenderPool:
+    """
+    RenderPool hands sheet requests to a pool of pre-warmed worker processes.
+
+    Properties:
+        dataPath -> string          The data_files folder the workers load the tables from.
+        workers -> int              Number of worker processes; 0 for none.
+        queueSize -> int            Requests that can be made or waiting at once.
+        timeout -> float            Seconds to wait for each sheet.
+        slots -> BoundedSemaphore   One for each request made or waiting.
+        backgroundSlots -> BoundedSemaphore
+                                    queueSize - 1 of them (at least 1), held by
+                                    background requests as well as a slot.
+
+    Methods:
+        __init__(self, dataPath, workers=None, queueSize=None, timeout=None) -> RenderPool
+        start(self) -> None
+        render(self, seed, testSuitability, noHuman, noDwarf, noElf, noHalfling, background=False, first=0) -> bytes
+        renderPages(self, path, count, seed, testSuitability, noHuman, noDwarf, noElf, noHalfling, layout=DEFAULT_LAYOUT) -> int
+        run(self, timeout, function, *args, onAbandon=None, background=False) -> result
+        shutdown(self) -> None
+    """
+
+
+    def __init__(self, dataPath, workers=None, queueSize=None, timeout=None):
+        """
+        Set up the pool. Arguments left as None are read from the environment.
+
+        Args:
+            dataPath: The data_files folder, for table_store.loadConfiguredTables.
+            workers: Number of worker processes.
+            queueSize: Number of requests that can be made or waiting at once.
+            timeout: Seconds to wait for each sheet.
+        """
+        self.dataPath = dataPath
+        if workers is None:
+            workers = int(os.environ.get("DCC_RENDER_WORKERS", os.cpu_count() or 1))
+        if queueSize is None:
+            queueSize = int(os.environ.get("DCC_RENDER_QUEUE", 2 * max(workers, 1)))
+        if timeout is None:
+            timeout = float(os.environ.get("DCC_RENDER_TIMEOUT", DEFAULT_TIMEOUT))
+        self.workers = workers
+        self.queueSize = queueSize
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(queueSize)
+        #Keep a slot for web requests; with a queue of 1 there is none to spare.
+        self.backgroundSlots = threading.BoundedSemaphore(max(queueSize - 1, 1))
+        self.executor = None
+
+
+    def start(self):
+        """Start the workers and wait until every one of them has warmed up."""
+        if self.workers == 0:
+            initWorker(self.dataPath)
+            return
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=initWorker, initargs=(self.dataPath,))
+        #The executor starts workers as it gets work, so give each one something to do.
+        warming = [self.executor.submit(warmUp) for i in range(self.workers)]
+        for future in warming:
+            future.result()
+
+
+    def render(self, seed, testSuitability, noHuman, noDwarf, noElf, noHalfling, background=False, first=0):
+        """
+        Return the .pdf bytes of one 2x2 sheet, rolled from a dcc_rng.DiceRoller
+        with the given seed. The four characters roll from the seed's child streams
+        first to first + 3, so page n of a multi-page .pdf for the seed is the
+        sheet with first = 4 * (n - 1).
+
+        Raise PoolBusy right away if the queue is full, and RenderTimeout if the
+        sheet isn't made within the timeout. A sheet that has already started is
+        finished and thrown away, and holds its place in the queue until then.
+        A background request waits for a slot instead, as run describes.
+        """
+        pdf, stats = self.run(self.timeout, renderPDF, seed, testSuitability, noHuman, noDwarf, noElf, noHalfling, first, background=background)
+        recordSheet(stats)
+        return pdf
+
+
+    def renderPages(self, path, count, seed, testSuitability, noHuman, noDwarf, noElf, noHalfling, layout=DEFAULT_LAYOUT):
+        """
+        Write count characters, rolled from seed, to a multi-page .pdf at path, a page
+        for every layout's worth (see sheet_layout), and return the number of pages.
+
+        The time limit is the pool's timeout for each page. Raise PoolBusy and
+        RenderTimeout as render does. After a timeout, the file is deleted once the
+        worker is done with it.
+        """
+        perPage = getLayout(layout).perPage
+        pageCount = (count + perPage - 1) // perPage
+        seconds = self.run(self.timeout * pageCount, renderPages, path, count, seed, testSuitability, noHuman, noDwarf, noElf, noHalfling, layout, onAbandon=lambda: removeFile(path))
+        recordStage("pages", seconds)
+        return pageCount
+
+
+    def run(self, timeout, function, *args, onAbandon=None, background=False):
+        """
+        Return function(*args), called in a worker, or on this thread if there are
+        no workers. Raise PoolBusy right away if the queue is full, and
+        RenderTimeout if it hasn't returned within timeout seconds. After a
+        timeout, onAbandon, if given, is called once the worker has finished or
+        the call has been cancelled, to clean up after it.
+
+        If background is True, wait up to the pool's timeout for a background slot
+        and then a slot, and raise PoolBusy only if there still isn't one.
+        """
+        if self.executor is None:
+            return function(*args)
+        if background:
+            if not self.backgroundSlots.acquire(timeout=self.timeout):
+                raise PoolBusy("all {} background render slots are in use".format(self.queueSize - 1))
+            if not self.slots.acquire(timeout=self.timeout):
+                self.backgroundSlots.release()
+                raise PoolBusy("all {} render slots are in use".format(self.queueSize))
+        elif not self.slots.acquire(blocking=False):
+            raise PoolBusy("all {} render slots are in use".format(self.queueSize))
+
+        def release(done=None):
+            self.slots.release()
+            if background:
+                self.backgroundSlots.release()
+
+        try:
+            future = self.executor.submit(function, *args)
+        except BaseException:
+            release()
+            raise
+        future.add_done_callback(release)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            if onAbandon is not None:
+                future.add_done_callback(lambda done: onAbandon())
+            raise RenderTimeout("no sheet after {} seconds".format(timeout))
+
+
+    def shutdown(self):
+        """Stop the workers, dropping any requests that haven't started."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+
+
+def initWorker(dataPath):
+    """
+    Load the rulebook data, parse the templates and import cairosvg, once per
+    worker process, and record the blank page in the overlay render mode. The
+    sheet modules are imported here rather than with this module, so the web app
+    doesn't load them until it needs them.
+    """
+    global _workerData
+    import cairosvg
+    import char_sheet_assembler2
+    from char_sheet_creator2 import getTemplate
+    from compiled_tables import getCompiledTables
+    from table_store import loadConfiguredTables
+    _workerData = loadConfiguredTables(dataPath)
+    getCompiledTables(_workerData)
+    getTemplate()
+    char_sheet_assembler2.getPageTemplate()
+    if char_sheet_assembler2.getRenderMode() == "overlay":
+        from multi_page_pdf import getRecording
+        getRecording(char_sheet_assembler2.getBackground())
+
+
+def warmUp():
+    """Return the worker's process id. Used by RenderPool.start to start every worker."""
+    return os.getpid()
+
+
+def renderPDF(seed, testSuitability, noHuman, noDwarf, noElf, noHalfling, first=0):
+    """
+    Return the .pdf bytes of one 2x2 sheet, rolled from seed's child streams from
+    first on, using this process's data, and the sheet's stats for
+    stage_metrics.recordSheet.
+    """
+    import char_sheet_assembler2
+    stats = getSheetStats(testSuitability, noHuman, noDwarf, noElf, noHalfling)
+    rng = DiceRoller(seed)
+    rng.skip(first)
+    pdf = char_sheet_assembler2.assemblePDF(_workerData, testSuitability, noHuman, noDwarf, noElf, noHalfling, rng, stats)
+    return pdf, stats
+
+
+def renderPages(path, count, seed, testSuitability, noHuman, noDwarf, noElf, noHalfling, layout=DEFAULT_LAYOUT):
+    """
+    Write count characters, rolled from seed, to a multi-page .pdf at path in layout,
+    using this process's data, and return the seconds it took. If it fails, the
+    part written is deleted.
+    """
+    import char_sheet_assembler2
+    started = time.perf_counter()
+    try:
+        char_sheet_assembler2.assembleMultiPagePDF(_workerData, count, testSuitability, noHuman, noDwarf, noElf, noHalfling, seed, path, layout)
+    except BaseException:
+        removeFile(path)
+        raise
+    return time.perf_counter() - started
+
+
+def removeFile(path):
+    """Delete the file at path, if there is one."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def getSheetStats(testSuitability, noHuman, noDwarf, noElf, noHalfling):
+    """
+    Return the characters of a 2x2 sheet with these options, for stage_metrics.recordSheet.
+    The characters are rolled without rerolls; the rerolls avoided are an estimate,
+    what the old reroll loops would have made on average.
+    """
+    from compiled_tables import getCompiledTables, getExpectedRaceRerolls
+    expectedRolls = getCompiledTables(_workerData).suitability.expectedRolls if testSuitability else 1.0
+    return {
+        "characters": 4,
+        "suitability": bool(testSuitability),
+        "suitability_rerolls_avoided": 4 * (expectedRolls - 1),
+        "race_rerolls_avoided": 4 * getExpectedRaceRerolls(noHuman, noDwarf, noElf, noHalfling),
+    }
+
+
+def getRenderPool(dataPath):
+    """Return the process's RenderPool, starting it the first time it is asked for."""
+    global _renderPool
+    if _renderPool is None:
+        _renderPool = RenderPool(dataPath)
+        _renderPool.start()
+    return _renderPool
@@ -0,0 +1,166 @@
+"""
+This module lets a single /character_funnel request be run under cProfile, and
+keeps the results: a .pstats file for each profiled request, with a .json file
+beside it holding the request's options, seed, status and time taken.
+
+Profiling is off unless one of these environment variables is set:
+    DCC_PROFILE             1 to profile every funnel request.
+    DCC_PROFILE_TOKEN       A secret; a request with an X-DCC-Profile header
+                            equal to it is profiled.
+    DCC_PROFILE_DIR         Folder for the profiles. Defaults to mysite/profiles/.
+    DCC_PROFILE_KEEP        Most profiles kept; the oldest go first. Defaults to 50.
+
+They are read once, at import, so with profiling off a request only checks ENABLED.
+
+Run this module to list the saved profiles, or summarize one:
+    python request_profiler.py list
+    python request_profiler.py show NAME [--sort cumulative] [--limit 25]
+
+Functions:
+    isWanted(headers)
+    saveProfile(profile, details)
+    listProfiles(directory=None)
+    summarizeProfile(name, sort="cumulative", limit=25, directory=None, stream=None)
+    main()
+
+Dependencies:
+    Modules:
+        argparse
+        hmac
+        json
+        os
+        pstats
+        secrets
+        datetime
+"""
+import hmac
+import json
+import os
+import secrets
+from datetime import datetime
+import dcc_root_path
+
+DEFAULT_KEEP = 50
+HEADER = "X-DCC-Profile"
+
+ALWAYS = os.environ.get("DCC_PROFILE") == "1"
+TOKEN = os.environ.get("DCC_PROFILE_TOKEN", "")
+ENABLED = ALWAYS or bool(TOKEN)
+PROFILE_DIR = os.environ.get("DCC_PROFILE_DIR", "{}profiles/".format(dcc_root_path.get_root_path()))
+KEEP = int(os.environ.get("DCC_PROFILE_KEEP", DEFAULT_KEEP))
+
+
+
+def isWanted(headers):
+    """Return True if the request with these headers should be profiled."""
+    if ALWAYS:
+        return True
+    given = headers.get(HEADER)
+    return bool(TOKEN) and given is not None and hmac.compare_digest(given.encode(), TOKEN.encode())
+
+
+def saveProfile(profile, details):
+    """
+    Save a finished cProfile.Profile and the request's details, drop the oldest
+    profiles past DCC_PROFILE_KEEP, and return the profile's name.
+
+    Args:
+        profile: The cProfile.Profile that ran the request.
+        details: A JSON-able dictionary: the request's options, seed, status and so on.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = "{}_{}".format(datetime.now().strftime("%Y%m%d_%H%M%S"), secrets.token_hex(4))
+    profile.dump_stats(os.path.join(PROFILE_DIR, name + ".pstats"))
+    details = dict(details, name=name, saved=datetime.now().isoformat(timespec="seconds"), pid=os.getpid())
+    writable = open(os.path.join(PROFILE_DIR, name + ".json"), "w")
+    json.dump(details, writable, indent=2)
+    writable.close()
+
+    if KEEP > 0:
+        for old in listProfiles()[:-KEEP]:
+            for suffix in (".pstats", ".json"):
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, old["name"] + suffix))
+                except FileNotFoundError:
+                    pass
+    return name
+
+
+def listProfiles(directory=None):
+    """Return the details of every saved profile in directory, oldest first."""
+    if directory is None:
+        directory = PROFILE_DIR
+    try:
+        names = sorted(entry[:-len(".json")] for entry in os.listdir(directory) if entry.endswith(".json"))
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        try:
+            readable = open(os.path.join(directory, name + ".json"))
+            details = json.load(readable)
+            readable.close()
+        except (OSError, ValueError):
+            details = {}
+        details["name"] = name
+        profiles.append(details)
+    return profiles
+
+
+def summarizeProfile(name, sort="cumulative", limit=25, directory=None, stream=None):
+    """
+    Print a saved profile's details and its top limit functions, sorted by sort
+    (any pstats sort key, such as cumulative, tottime or ncalls).
+    """
+    import pstats
+    import sys
+    if directory is None:
+        directory = PROFILE_DIR
+    if stream is None:
+        stream = sys.stdout
+    for details in listProfiles(directory):
+        if details["name"] == name:
+            for key, value in details.items():
+                print("{:<12}{}".format(key, value), file=stream)
+            break
+    stats = pstats.Stats(os.path.join(directory, name + ".pstats"), stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+
+
+def main():
+    """List the saved profiles, or summarize one."""
+    import argparse
+    parser = argparse.ArgumentParser(description="List and summarize the funnel request profiles in {}.".format(PROFILE_DIR))
+    parser.add_argument("--dir", default=PROFILE_DIR, help="folder the profiles are in")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list the saved profiles, newest last")
+    show = commands.add_parser("show", help="print a profile's details and slowest functions")
+    show.add_argument("name", help="the profile's name, from list; 'latest' for the newest")
+    show.add_argument("--sort", default="cumulative", help="pstats sort key (default: %(default)s)")
+    show.add_argument("--limit", type=int, default=25, help="number of functions to print (default: %(default)s)")
+    args = parser.parse_args()
+
+    profiles = listProfiles(args.dir)
+    if args.command == "list":
+        for details in profiles:
+            print("{:<26}{:>9}  seed={:<22} status={}  {}".format(
+                details["name"],
+                "{:.1f} ms".format(details["seconds"] * 1000) if "seconds" in details else "?",
+                str(details.get("seed", "?")),
+                details.get("status", "?"),
+                " ".join(option for option, value in details.get("options", {}).items() if value)))
+        if not profiles:
+            print("no profiles in {}".format(args.dir))
+        return
+    name = args.name
+    if name == "latest":
+        if not profiles:
+            parser.error("no profiles in {}".format(args.dir))
+        name = profiles[-1]["name"]
+    if not os.path.exists(os.path.join(args.dir, name + ".pstats")):
+        parser.error("no profile named {!r} in {}".format(name, args.dir))
+    summarizeProfile(name, args.sort, args.limit, args.dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+This module works out where character sheets go on a printed page: a grid of
+columns by rows on a sheet of paper, with each 528x408 sheet scaled to fit its
+cell and centered in it. SheetLayout builds the page from the page template,
+with a <g class="charsheet"> placed by a transform for each cell, so the layout
+is no longer fixed by the groups in templates/2x2_template_blank.svg. It can
+also splice serialized sheets into the serialized page, which is much faster
+than building the page's tree.
+
+A layout is named by its paper, with an optional grid after a colon: "letter"
+is Letter with its default 2x2 grid, and "a3:3x3" is A3 with 3 columns and 3
+rows. The pages are landscape, and the .svg sizes are in px, 96 to the inch,
+as cairosvg reads them.
+
+Paper sizes, with their default grids:
+    letter          11 x 8.5 in, 2x2; the same page as the 2x2 template
+    a4              297 x 210 mm, 2x2
+    a3              420 x 297 mm, 3x3
+    index_card      6 x 4 in, 1x1
+
+Classes:
+    SheetLayout
+
+Functions:
+    formatNumber(value)
+    getLayout(spec=DEFAULT_LAYOUT)
+
+Dependencies:
+    Modules:
+        copy
+        lxml
+"""
+import copy
+from lxml import etree as et
+
+SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+#Size of one character sheet, char_sheet_blank.svg, in px.
+SHEET_WIDTH = 528
+SHEET_HEIGHT = 408
+PX_PER_INCH = 96
+PX_PER_MM = PX_PER_INCH / 25.4
+
+#Width and height in px, landscape, and the default (columns, rows), of each paper.
+PAPER_SIZES = {
+    "letter": (11 * PX_PER_INCH, 8.5 * PX_PER_INCH, (2, 2)),
+    "a4": (297 * PX_PER_MM, 210 * PX_PER_MM, (2, 2)),
+    "a3": (420 * PX_PER_MM, 297 * PX_PER_MM, (3, 3)),
+    "index_card": (6 * PX_PER_INCH, 4 * PX_PER_INCH, (1, 1)),
+}
+DEFAULT_LAYOUT = "letter"
+#Largest grid a layout can ask for, in each direction.
+MAX_GRID = 10
+#Stands in for a cell's content while a page is cut into chunks.
+CELL_MARKER = "@@cell{}@@"
+
+_layouts = {}
+
+
+
+class SheetLayout:
+    """
+    SheetLayout is a grid of character sheets on one size of paper, with the
+    transform that puts a sheet in each cell worked out once.
+
+    Properties:
+        name -> string              The layout's paper and grid, like "a3:3x3".
+        width -> float              Page width in px.
+        height -> float             Page height in px.
+        columns -> int
+        rows -> int
+        margin -> float             Blank border round the page, in px.
+        scale -> float              How much each sheet is scaled to fit its cell.
+        transforms -> list          The transform of each cell, left to right, then top to bottom.
+        perPage -> int              Sheets on each page, columns * rows.
+        pageTemplate -> lxml ElementTree or None
+                                    The template pageChunks were made from.
+        pageChunks -> list          The serialized empty page, split where each cell's
+                                    content goes; made by makePageBytes when first needed.
+
+    Methods:
+        __init__(self, name, width, height, columns, rows, margin=0) -> SheetLayout
+        makePage(self, template, contents) -> lxml ElementTree
+        makePageBytes(self, template, contents) -> bytes
+    """
+
+
+    def __init__(self, name, width, height, columns, rows, margin=0):
+        """
+        Work out the placement of each cell.
+
+        Args:
+            name: The layout's paper and grid.
+            width, height: The page's size in px.
+            columns, rows: The grid.
+            margin: Blank border round the page, in px.
+        """
+        self.name = name
+        self.width = width
+        self.height = height
+        self.columns = columns
+        self.rows = rows
+        self.margin = margin
+        self.perPage = columns * rows
+        self.pageTemplate = None
+        self.pageChunks = None
+
+        cellWidth = (width - 2 * margin) / columns
+        cellHeight = (height - 2 * margin) / rows
+        self.scale = min(cellWidth / SHEET_WIDTH, cellHeight / SHEET_HEIGHT)
+        #Center each scaled sheet in its cell.
+        offsetX = margin + (cellWidth - SHEET_WIDTH * self.scale) / 2
+        offsetY = margin + (cellHeight - SHEET_HEIGHT * self.scale) / 2
+        self.transforms = []
+        for row in range(rows):
+            for column in range(columns):
+                transform = "translate({}, {})".format(formatNumber(offsetX + column * cellWidth), formatNumber(offsetY + row * cellHeight))
+                if formatNumber(self.scale) != "1":
+                    transform += " scale({})".format(formatNumber(self.scale))
+                self.transforms.append(transform)
+
+
+    def makePage(self, template, contents):
+        """
+        Return a new page with a sheet's content group in each cell, in order; the
+        cells past the last one are left blank.
+
+        Args:
+            template: The parsed page template. Only its style and other elements
+                are copied; its own charsheet groups are left out.
+            contents: Up to perPage <g id="content"> elements. They are moved
+                onto the page, not copied.
+        """
+        page = copy.deepcopy(template)
+        root = page.getroot()
+        for element in root.findall("{{{}}}g[@class='charsheet']".format(SVG_NAMESPACE)):
+            root.remove(element)
+        root.set("width", formatNumber(self.width))
+        root.set("height", formatNumber(self.height))
+        for i, transform in enumerate(self.transforms):
+            group = et.SubElement(root, "{{{}}}g".format(SVG_NAMESPACE))
+            group.set("id", "sheet{}".format(i + 1))
+            group.set("class", "charsheet")
+            group.set("transform", transform)
+            if i < len(contents):
+                group.append(contents[i])
+        return page
+
+
+    def makePageBytes(self, template, contents):
+        """
+        Return the utf-8 .svg bytes of the page makePage would make, from serialized
+        contents, without building or copying a tree.
+
+        Args:
+            template: The parsed page template, as for makePage.
+            contents: Up to perPage serialized <g id="content"> groups, such as
+                char_sheet_creator2.writeContentBytes makes.
+        """
+        if self.pageTemplate is not template:
+            #Serialize a page with a marker in each cell, then cut it up at the markers.
+            markers = [CELL_MARKER.format(i) for i in range(self.perPage)]
+            serialized = et.tostring(self.makePage(template, [et.Comment(marker) for marker in markers]), encoding="utf-8")
+            chunks = []
+            for marker in markers:
+                before, serialized = serialized.split("<!--{}-->".format(marker).encode("ascii"), 1)
+                chunks.append(before)
+            chunks.append(serialized)
+            self.pageChunks = chunks
+            self.pageTemplate = template
+        parts = [self.pageChunks[0]]
+        for i, chunk in enumerate(self.pageChunks[1:]):
+            if i < len(contents):
+                parts.append(contents[i])
+            parts.append(chunk)
+        return b"".join(parts)
+
+
+
+def formatNumber(value):
+    """Return a number for an .svg attribute, to 3 decimal places, with no trailing zeros."""
+    return "{:.3f}".format(value).rstrip("0").rstrip(".")
+
+
+def getLayout(spec=DEFAULT_LAYOUT):
+    """
+    Return the SheetLayout for a spec like "letter" or "a3:3x3", working it out the
+    first time it is asked for. Raise ValueError for an unknown paper or a bad grid.
+    """
+    paper, separator, grid = spec.strip().lower().partition(":")
+    if paper not in PAPER_SIZES:
+        raise ValueError("no paper called {!r}; the papers are {}".format(paper, ", ".join(PAPER_SIZES)))
+    width, height, (columns, rows) = PAPER_SIZES[paper]
+    if separator:
+        try:
+            columns, rows = (int(size) for size in grid.split("x"))
+        except ValueError:
+            raise ValueError("the grid must be COLUMNSxROWS, like 3x3, not {!r}".format(grid))
+        if not (1 <= columns <= MAX_GRID and 1 <= rows <= MAX_GRID):
+            raise ValueError("the grid must be from 1x1 to {0}x{0}".format(MAX_GRID))
+    name = "{}:{}x{}".format(paper, columns, rows)
+    layout = _layouts.get(name)
+    if layout is None:
+        layout = SheetLayout(name, width, height, columns, rows)
+        _layouts[name] = layout
+    return layout
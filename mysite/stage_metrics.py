@@ -0,0 +1,243 @@
+"""
+This module keeps the app's timing histograms and counters, and writes them out
+in the Prometheus text format for the /metrics endpoint.
+
+Every sheet is timed in stages: rolling the four characters, filling their sheets
+with writeSVG, assembling the 2x2 page, and converting it with cairosvg. The
+stages are timed wherever the sheet is made, a render pool worker say, and sent
+back with it to be recorded here. The funnel request adds the time spent saving
+the .pdf and the time for the whole request.
+
+No rerolls are made now that the ability scores and races are sampled directly,
+so none are counted. dcc_rerolls_avoided_expected_total is an estimate, not a
+count: the rerolls the old reroll loops would have made on average for the
+characters rolled, from SuitabilitySampler.expectedRolls and
+compiled_tables.getExpectedRaceRerolls.
+
+The numbers are for this process only; with several web processes, Prometheus
+scrapes each one and adds them up.
+
+Classes:
+    Counter
+    Histogram
+    MetricsRegistry
+
+Functions:
+    formatLabels(labelNames, labelValues, extra="")
+    formatValue(value)
+    recordSheet(stats)
+    recordStage(stage, seconds)
+    recordRequest(outcome)
+    recordProfile()
+
+Dependencies:
+    Modules:
+        bisect
+        threading
+"""
+import threading
+from bisect import bisect_left
+
+#Upper bounds of the stage histograms' buckets, in seconds.
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+#The stages of a sheet, in the order they happen.
+SHEET_STAGES = ("roll", "write_svg", "assemble", "render", "write_file")
+
+
+
+class Counter:
+    """
+    Counter is a Prometheus counter, with a value for each set of label values.
+
+    Properties:
+        name -> string
+        help -> string
+        labelNames -> tuple
+        values -> dict              The count for each tuple of label values.
+
+    Methods:
+        __init__(self, name, help, labelNames=()) -> Counter
+        inc(self, amount=1, *labelValues) -> None
+        render(self) -> list
+    """
+
+
+    def __init__(self, name, help, labelNames=()):
+        """Set up a counter with no counts yet."""
+        self.name = name
+        self.help = help
+        self.labelNames = tuple(labelNames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+
+    def inc(self, amount=1, *labelValues):
+        """Add amount to the count for labelValues, one value per label name."""
+        with self.lock:
+            self.values[labelValues] = self.values.get(labelValues, 0) + amount
+
+
+    def render(self):
+        """Return the counter's lines in the Prometheus text format."""
+        lines = ["# HELP {} {}".format(self.name, self.help), "# TYPE {} counter".format(self.name)]
+        with self.lock:
+            values = sorted(self.values.items())
+        for labelValues, value in values:
+            lines.append("{}{} {}".format(self.name, formatLabels(self.labelNames, labelValues), formatValue(value)))
+        return lines
+
+
+
+class Histogram:
+    """
+    Histogram is a Prometheus histogram with fixed buckets, with a set of buckets
+    for each set of label values.
+
+    Properties:
+        name -> string
+        help -> string
+        labelNames -> tuple
+        buckets -> tuple            Upper bounds of the buckets, smallest first.
+        series -> dict              [bucket counts, sum, count] for each tuple of label values.
+
+    Methods:
+        __init__(self, name, help, labelNames=(), buckets=STAGE_BUCKETS) -> Histogram
+        observe(self, value, *labelValues) -> None
+        render(self) -> list
+    """
+
+
+    def __init__(self, name, help, labelNames=(), buckets=STAGE_BUCKETS):
+        """Set up a histogram with no observations yet."""
+        self.name = name
+        self.help = help
+        self.labelNames = tuple(labelNames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+
+    def observe(self, value, *labelValues):
+        """Count value in the first bucket it fits in, for labelValues."""
+        #Each bucket is counted on its own here, and added up when rendered.
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labelValues)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self.series[labelValues] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+
+    def render(self):
+        """Return the histogram's lines in the Prometheus text format."""
+        lines = ["# HELP {} {}".format(self.name, self.help), "# TYPE {} histogram".format(self.name)]
+        with self.lock:
+            series = sorted((labelValues, (list(counts), total, count)) for labelValues, (counts, total, count) in self.series.items())
+        for labelValues, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucketCount in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucketCount
+                le = 'le="{}"'.format("+Inf" if bound == float("inf") else formatValue(bound))
+                lines.append("{}_bucket{} {}".format(self.name, formatLabels(self.labelNames, labelValues, le), cumulative))
+            lines.append("{}_sum{} {}".format(self.name, formatLabels(self.labelNames, labelValues), formatValue(total)))
+            lines.append("{}_count{} {}".format(self.name, formatLabels(self.labelNames, labelValues), count))
+        return lines
+
+
+
+class MetricsRegistry:
+    """
+    MetricsRegistry is the set of metrics published on /metrics.
+
+    Properties:
+        metrics -> list             Counters and histograms, in the order they are published.
+
+    Methods:
+        __init__(self) -> MetricsRegistry
+        add(self, metric) -> metric
+        render(self) -> string
+    """
+
+
+    def __init__(self):
+        """Set up an empty registry."""
+        self.metrics = []
+
+
+    def add(self, metric):
+        """Publish metric, and return it."""
+        self.metrics.append(metric)
+        return metric
+
+
+    def render(self):
+        """Return every metric in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+
+def formatLabels(labelNames, labelValues, extra=""):
+    """Return the {name="value",...} part of a sample line, or "" if there are no labels."""
+    pairs = ['{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in zip(labelNames, labelValues)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(pairs) + "}"
+
+
+def formatValue(value):
+    """Return a number as Prometheus writes it."""
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+stageSeconds = registry.add(Histogram("dcc_stage_seconds", "Seconds spent in each stage of making a sheet or serving a funnel request.", ("stage",)))
+sheetsTotal = registry.add(Counter("dcc_sheets_total", "2x2 sheets made, by whether the suitability test was on.", ("suitability",)))
+charactersTotal = registry.add(Counter("dcc_characters_total", "Characters rolled, by whether the suitability test was on.", ("suitability",)))
+rerollsAvoidedExpected = registry.add(Counter("dcc_rerolls_avoided_expected_total", "Estimate, not a count: rerolls the old reroll loops would have made on average for the characters rolled.", ("kind",)))
+funnelRequestsTotal = registry.add(Counter("dcc_funnel_requests_total", "/character_funnel requests, by outcome: warm, rendered, busy or timeout.", ("outcome",)))
+profiledRequestsTotal = registry.add(Counter("dcc_profiled_requests_total", "/character_funnel requests made under cProfile."))
+
+
+
+def recordSheet(stats):
+    """
+    Record the stage times, characters and expected rerolls avoided of one sheet.
+
+    Args:
+        stats: A dictionary with the seconds for each of SHEET_STAGES that was
+            timed, and characters, suitability, suitability_rerolls_avoided
+            and race_rerolls_avoided.
+    """
+    for stage in SHEET_STAGES:
+        if stage in stats:
+            stageSeconds.observe(stats[stage], stage)
+    suitability = "on" if stats["suitability"] else "off"
+    sheetsTotal.inc(1, suitability)
+    charactersTotal.inc(stats["characters"], suitability)
+    rerollsAvoidedExpected.inc(stats["suitability_rerolls_avoided"], "suitability")
+    rerollsAvoidedExpected.inc(stats["race_rerolls_avoided"], "race")
+
+
+def recordStage(stage, seconds):
+    """Record the seconds one request spent in a stage, such as store or request."""
+    stageSeconds.observe(seconds, stage)
+
+
+def recordRequest(outcome):
+    """Count one /character_funnel request with its outcome."""
+    funnelRequestsTotal.inc(1, outcome)
+
+
+def recordProfile():
+    """Count one /character_funnel request made under the profiler."""
+    profiledRequestsTotal.inc()
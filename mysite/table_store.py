@@ -0,0 +1,271 @@
+"""
+This module keeps the dataDict from import_data.getDataFiles in a compiled table
+file, data_files/dcc_tables.bin, and rebuilds the file by itself whenever the
+.csv and .txt files it came from change, so the tables can't go stale.
+
+The file starts with a fixed header, then a manifest with the schema version and
+the size, modified time and sha256 checksum of every source file, then the
+dataDict. Both are in marshal format. Loading the tables takes about as long as
+unpickling the old data_files/dcc_dict did, plus a stat of each source file to
+check that none has changed; benchmarks/bench_table_store.py times both. What the
+file buys is that the tables can't go stale, not a faster load.
+
+A source file counts as changed if its size is different, or its modified time
+isn't the one in the manifest and its checksum is different. A file that was
+only touched, by a git checkout say, doesn't cause a rebuild; its new modified
+time is saved in the manifest, so it is checksummed only once.
+
+Functions:
+    getSourceInfo(dataPath, name)
+    buildTableStore(dataPath, storePath=None, ignoreWriteErrors=False)
+    writeTableStore(storePath, manifest, dataDict)
+    readTableStore(storePath)
+    isStale(dataPath, storePath=None, manifest=None, touched=None)
+    loadTables(dataPath, storePath=None)
+    loadConfiguredTables(dataPath)
+
+Dependencies:
+    Modules:
+        hashlib
+        logging
+        marshal
+        os
+        struct
+        tempfile
+        db_tables
+        import_data
+    Files:
+        dcc_tables.bin
+        dcc.db
+        Table1_1_Ability_Score_Modifiers.csv
+        Table1_2_Luck_Score.txt
+        Human_Occupations.csv
+        Dwarf_Occupations.csv
+        Elf_Occupations.csv
+        Halfling_Occupations.csv
+        Table1_3a_Farmer_Type.txt
+        Table1_3b_Animal_Type.txt
+        Table1_3c_Whats_In_The_Cart.txt
+        Table3_4_Equipment.txt
+        AppendixL.csv
+"""
+import hashlib
+import logging
+import marshal
+import os
+import struct
+import tempfile
+from import_data import getDataFiles
+
+logger = logging.getLogger(__name__)
+
+#Bump this whenever the shape of the dataDict or of the file changes.
+SCHEMA_VERSION = 1
+STORE_NAME = "dcc_tables.bin"
+DB_NAME = "dcc.db"
+#Where loadConfiguredTables gets the tables: compiled, sqlite or csv.
+DEFAULT_TABLE_SOURCE = "compiled"
+MAGIC = b"DCCTBL"
+#Magic, schema version and manifest length.
+HEADER = struct.Struct("<6sHI")
+#The files import_data.getDataFiles reads.
+SOURCE_FILES = [
+    "Table1_1_Ability_Score_Modifiers.csv",
+    "Table1_2_Luck_Score.txt",
+    "Human_Occupations.csv",
+    "Dwarf_Occupations.csv",
+    "Elf_Occupations.csv",
+    "Halfling_Occupations.csv",
+    "Table1_3a_Farmer_Type.txt",
+    "Table1_3b_Animal_Type.txt",
+    "Table1_3c_Whats_In_The_Cart.txt",
+    "Table3_4_Equipment.txt",
+    "AppendixL.csv",
+]
+
+
+
+def getSourceInfo(dataPath, name):
+    """Return the size, modified time and sha256 checksum of one source file, as a dictionary."""
+    filePath = os.path.join(dataPath, name)
+    stat = os.stat(filePath)
+    readable = open(filePath, "rb")
+    checksum = hashlib.sha256(readable.read()).hexdigest()
+    readable.close()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": checksum}
+
+
+def buildTableStore(dataPath, storePath=None, ignoreWriteErrors=False):
+    """
+    Read the source files in dataPath with import_data.getDataFiles, write the
+    compiled table file, and return the dataDict.
+
+    Args:
+        dataPath: The data_files folder, ending in a slash.
+        storePath: Where to write the file. Defaults to dcc_tables.bin in dataPath.
+        ignoreWriteErrors: If True, an OSError writing the file, in a read-only
+            data folder say, is logged and the dataDict is returned anyway.
+    """
+    if storePath is None:
+        storePath = os.path.join(dataPath, STORE_NAME)
+    sources = {name: getSourceInfo(dataPath, name) for name in SOURCE_FILES}
+    dataDict = getDataFiles(dataPath)
+    manifest = marshal.dumps({
+        "schema": SCHEMA_VERSION,
+        "marshal": marshal.version,
+        "sources": sources,
+    })
+    try:
+        writeTableStore(storePath, manifest, dataDict)
+    except OSError as error:
+        if not ignoreWriteErrors:
+            raise
+        logger.warning("couldn't save the compiled tables to %s, so they were read from the source files: %s", storePath, error)
+    return dataDict
+
+
+def writeTableStore(storePath, manifest, dataDict):
+    """
+    Write the compiled table file from its marshalled manifest and the dataDict.
+
+    The file is written under a temporary name and then renamed, so a process
+    reading it never sees half a file.
+    """
+    handle, tempPath = tempfile.mkstemp(prefix=".dcc_tables.", dir=os.path.dirname(os.path.abspath(storePath)))
+    try:
+        with os.fdopen(handle, "wb") as writable:
+            writable.write(HEADER.pack(MAGIC, SCHEMA_VERSION, len(manifest)))
+            writable.write(manifest)
+            writable.write(marshal.dumps(dataDict))
+        #mkstemp makes the file readable by its owner only.
+        os.chmod(tempPath, 0o644)
+        os.replace(tempPath, storePath)
+    except BaseException:
+        os.remove(tempPath)
+        raise
+
+
+def readTableStore(storePath):
+    """
+    Return the manifest and the dataDict of a compiled table file.
+
+    Raise a ValueError if the file isn't a table file, or was written with a
+    different schema or marshal version, and an OSError if it can't be read.
+    """
+    readable = open(storePath, "rb")
+    try:
+        data = readable.read()
+    finally:
+        readable.close()
+    if len(data) < HEADER.size:
+        raise ValueError("{}: too short to be a table file".format(storePath))
+    magic, schema, manifestLength = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("{}: not a table file".format(storePath))
+    if schema != SCHEMA_VERSION:
+        raise ValueError("{}: schema {} is not {}".format(storePath, schema, SCHEMA_VERSION))
+    manifest = marshal.loads(data[HEADER.size:HEADER.size + manifestLength])
+    if manifest["marshal"] != marshal.version:
+        raise ValueError("{}: written with marshal version {}".format(storePath, manifest["marshal"]))
+    dataDict = marshal.loads(data[HEADER.size + manifestLength:])
+    return manifest, dataDict
+
+
+def isStale(dataPath, storePath=None, manifest=None, touched=None):
+    """
+    Return True if the compiled table file is missing, unreadable, from another
+    schema, or was built from source files that have changed since. Source files
+    that are missing are ignored, so a copy of the app with only the compiled file
+    still works.
+
+    A source file is only read and checksummed if its size is the same but its
+    modified time isn't the one in the manifest. If the checksum still matches,
+    the file was only touched, by a git checkout say: its new modified time is put
+    in manifest and its name added to touched.
+
+    Args:
+        dataPath: The data_files folder.
+        storePath: The compiled file. Defaults to dcc_tables.bin in dataPath.
+        manifest: The file's manifest, if it has already been read.
+        touched: A list for the names of the source files that were only touched.
+    """
+    if storePath is None:
+        storePath = os.path.join(dataPath, STORE_NAME)
+    if manifest is None:
+        try:
+            manifest, dataDict = readTableStore(storePath)
+        except (OSError, ValueError):
+            return True
+    for name in SOURCE_FILES:
+        try:
+            stat = os.stat(os.path.join(dataPath, name))
+        except FileNotFoundError:
+            continue
+        recorded = manifest["sources"].get(name)
+        if recorded is None or stat.st_size != recorded["size"]:
+            return True
+        if stat.st_mtime_ns != recorded["mtime_ns"]:
+            if getSourceInfo(dataPath, name)["sha256"] != recorded["sha256"]:
+                return True
+            recorded["mtime_ns"] = stat.st_mtime_ns
+            if touched is not None:
+                touched.append(name)
+    return False
+
+
+def loadTables(dataPath, storePath=None):
+    """
+    Return the dataDict from the compiled table file, building or rebuilding the
+    file first if it is missing or stale. If the rebuilt file can't be written,
+    the tables compiled from the source files are returned anyway.
+
+    If source files were only touched, the file is written again with their new
+    modified times, so they aren't checksummed again on the next load.
+
+    Args:
+        dataPath: The data_files folder, ending in a slash.
+        storePath: The compiled file. Defaults to dcc_tables.bin in dataPath.
+    """
+    if storePath is None:
+        storePath = os.path.join(dataPath, STORE_NAME)
+    try:
+        manifest, dataDict = readTableStore(storePath)
+    except (OSError, ValueError):
+        return buildTableStore(dataPath, storePath, True)
+    touched = []
+    if isStale(dataPath, storePath, manifest, touched):
+        return buildTableStore(dataPath, storePath, True)
+    if touched:
+        try:
+            writeTableStore(storePath, marshal.dumps(manifest), dataDict)
+        except OSError as error:
+            logger.warning("couldn't save the new modified times of %s to %s: %s", ", ".join(touched), storePath, error)
+    return dataDict
+
+
+def loadConfiguredTables(dataPath):
+    """
+    Return the dataDict from the source named by the DCC_TABLE_SOURCE environment
+    variable: "compiled" for the compiled table file, "sqlite" for data_files/dcc.db
+    through db_tables, or "csv" to parse the source files every time.
+
+    Raise a ValueError for any other source.
+    """
+    source = os.environ.get("DCC_TABLE_SOURCE", DEFAULT_TABLE_SOURCE)
+    if source == "compiled":
+        return loadTables(dataPath)
+    if source == "sqlite":
+        from db_tables import loadDBTables
+        return loadDBTables(os.path.join(dataPath, DB_NAME))
+    if source == "csv":
+        return getDataFiles(dataPath)
+    raise ValueError("DCC_TABLE_SOURCE is {!r}, not compiled, sqlite or csv".format(source))
+
+
+if __name__ == "__main__":
+    """Rebuild data_files/dcc_tables.bin from the source files."""
+    import dcc_root_path
+
+    ROOT_PATH = dcc_root_path.get_root_path()
+    buildTableStore('{}data_files/'.format(ROOT_PATH))
+    print("saved {}data_files/{}".format(ROOT_PATH, STORE_NAME))
@@ -0,0 +1,192 @@
+"""
+This module keeps a few finished 2x2 sheets ready for each combination of the
+five check boxes on index.html, so /character_funnel can answer with a sheet
+that is already made instead of making one while the browser waits.
+
+A background thread refills the emptiest combination first, at a steady rate,
+through the render_pool.RenderPool. Each ready sheet keeps the seed it was
+rolled from, so the X-DCC-Seed header still works for sheets from the pool.
+
+The pool is set up with these environment variables:
+    DCC_WARM_SIZE           Sheets kept ready for each combination. Defaults to 2;
+                            0 turns the pool off.
+    DCC_WARM_RATE           Most sheets made per second to refill it. Defaults to 4.
+
+Classes:
+    WarmSheetPool
+
+Functions:
+    getOptionKey(testSuitability, noHuman, noDwarf, noElf, noHalfling)
+
+Dependencies:
+    Modules:
+        collections
+        itertools
+        os
+        threading
+        time
+        dcc_rng
+        render_pool
+"""
+import os
+import threading
+import time
+from collections import deque
+from itertools import product
+from dcc_rng import newSeed
+from render_pool import PoolBusy, RenderTimeout
+
+DEFAULT_SIZE = 2
+DEFAULT_RATE = 4
+#Seconds to wait before trying again when the render pool is busy or slow.
+BUSY_BACKOFF = 0.5
+
+
+
+class WarmSheetPool:
+    """
+    WarmSheetPool holds ready-made sheets for every combination of options.
+
+    Properties:
+        renderPool -> RenderPool    Makes the sheets.
+        size -> int                 Sheets kept ready for each combination.
+        rate -> float               Most sheets made per second.
+        ready -> dictionary         A deque of (seed, .pdf bytes) for each option key.
+        hits -> int                 Requests answered from the pool.
+        misses -> int               Requests that found their combination empty.
+        refills -> int              Sheets the background thread has made.
+
+    Methods:
+        __init__(self, renderPool, size=None, rate=None) -> WarmSheetPool
+        start(self) -> None
+        take(self, testSuitability, noHuman, noDwarf, noElf, noHalfling) -> tuple
+        getStats(self) -> dictionary
+        refill(self) -> None
+        nextKey(self) -> tuple
+        stop(self) -> None
+    """
+
+
+    def __init__(self, renderPool, size=None, rate=None):
+        """
+        Set up an empty pool. Arguments left as None are read from the environment.
+
+        Args:
+            renderPool: The render_pool.RenderPool that makes the sheets.
+            size: Sheets kept ready for each combination.
+            rate: Most sheets made per second.
+        """
+        if size is None:
+            size = int(os.environ.get("DCC_WARM_SIZE", DEFAULT_SIZE))
+        if rate is None:
+            rate = float(os.environ.get("DCC_WARM_RATE", DEFAULT_RATE))
+        self.renderPool = renderPool
+        self.size = size
+        self.rate = rate
+        self.ready = {}
+        self.lastWanted = {}
+        for flags in product((False, True), repeat=5):
+            key = getOptionKey(*flags)
+            self.ready[key] = deque()
+            self.lastWanted[key] = 0
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.lock = threading.Lock()
+        self.wanted = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+
+    def start(self):
+        """Start the background refill thread, unless the pool is turned off."""
+        if self.size <= 0 or self.rate <= 0 or self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.refill, name="warm-sheets", daemon=True)
+        self.thread.start()
+
+
+    def take(self, testSuitability, noHuman, noDwarf, noElf, noHalfling):
+        """
+        Return a ready (seed, .pdf bytes) pair for these options, or None if there
+        isn't one, and wake the refill thread either way.
+        """
+        key = getOptionKey(testSuitability, noHuman, noDwarf, noElf, noHalfling)
+        with self.lock:
+            self.lastWanted[key] = time.monotonic()
+            sheets = self.ready[key]
+            if sheets:
+                self.hits += 1
+                sheet = sheets.popleft()
+            else:
+                self.misses += 1
+                sheet = None
+        self.wanted.set()
+        return sheet
+
+
+    def getStats(self):
+        """Return the hit, miss and refill counters and the number of sheets ready, as a dictionary."""
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "refills": self.refills,
+                "ready": sum(len(sheets) for sheets in self.ready.values()),
+                "size": self.size,
+                "rate": self.rate,
+            }
+
+
+    def refill(self):
+        """Make sheets for the emptiest combinations until stopped. Run by the background thread."""
+        while not self.stopping.is_set():
+            key = self.nextKey()
+            if key is None:
+                #Every combination is full; sleep until a sheet is taken.
+                self.wanted.wait()
+                self.wanted.clear()
+                continue
+            started = time.monotonic()
+            seed = newSeed()
+            try:
+                pdf = self.renderPool.render(seed, *key, background=True)
+            except (PoolBusy, RenderTimeout):
+                self.stopping.wait(BUSY_BACKOFF)
+                continue
+            with self.lock:
+                if len(self.ready[key]) < self.size:
+                    self.ready[key].append((seed, pdf))
+                    self.refills += 1
+            #Keep to the refill rate.
+            self.stopping.wait(max(0, 1 / self.rate - (time.monotonic() - started)))
+
+
+    def nextKey(self):
+        """Return the option key with the fewest sheets ready, most recently wanted first, or None if all are full."""
+        with self.lock:
+            key = min(self.ready, key=lambda key: (len(self.ready[key]), -self.lastWanted[key]))
+            if len(self.ready[key]) >= self.size:
+                return None
+            return key
+
+
+    def stop(self):
+        """Stop the background refill thread."""
+        self.stopping.set()
+        self.wanted.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+
+def getOptionKey(testSuitability, noHuman, noDwarf, noElf, noHalfling):
+    """
+    Return the options as a tuple of five bools. Form values like 'on' and None
+    become True and False, and leaving out every race is the same as leaving out none.
+    """
+    key = (bool(testSuitability), bool(noHuman), bool(noDwarf), bool(noElf), bool(noHalfling))
+    if all(key[1:]):
+        key = (key[0], False, False, False, False)
+    return key
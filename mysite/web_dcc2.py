@@ -2,19 +2,63 @@
 This is a flask webapp that provides a web interface for outputing Dungeon Crawl
 Classics RPG zero level characters in .pdf format.
 
+The app is made by create_app(). Importing this module only imports flask and a
+few small modules; the rulebook data, the sheet templates, cairosvg and the
+render pool are loaded the first time a request needs them, or up front by
+warmUp(), which create_app(warm=True) calls. web_dcc2.app is made by
+create_app() the first time it is asked for, for WSGI files that import it.
+Run this module to start the development server.
+
+Classes:
+    SheetServices
+
 Functions:
+    create_app(warm=None)
+    warmUp()
+    getDataDict()
+    getServices()
     hello()
     character_funnel()
+    makeFunnelSheet(inline=False)
+    makeMultiPageSheet(count, flags, seed, stem, layout, inline=False)
+    profileFunnelSheet()
+    submit_funnel_job()
+    funnel_job_status(job_id)
+    funnel_job_download(job_id)
+    warm_pool_stats()
+    characters()
+    metrics()
+    getSeed(seedField)
+    getFlag(value)
+    getLimit(name, default)
 
 Dependencies:
     Modules:
         flask
         datetime
+        os
+        threading
+        time
         cairosvg
+        char_serializer
+        character_generator2
         char_sheet_assembler2
         char_sheet_creator2
+        compiled_tables
+        dcc_rng
+        funnel_jobs
+        multi_page_pdf
+        output_store
+        render_pool
+        request_profiler
+        sheet_layout
+        stage_metrics
+        table_store
+        warm_sheets
         import_data
     Files:
+        dcc_tables.bin
+        dcc.db
         2x2_template_blank.svg
         char_sheet_blank.svg
         Table1_1_Ability_Score_Modifiers.csv
@@ -29,54 +73,456 @@ Dependencies:
         Table3_4_Equipment.txt
         AppendixL.csv
 """
+import time
+IMPORT_STARTED = time.perf_counter()
 
-from flask import Flask, render_template, request, send_from_directory
+from flask import Blueprint, Flask, current_app, render_template, request, Response, jsonify, send_file, url_for
 from datetime import datetime
-from cairosvg import svg2pdf as s2p
-import pickle
-import char_sheet_assembler2
-from import_data import getDataFiles
+import os
+import threading
+from dcc_rng import DiceRoller, parseSeed
+from render_pool import RenderPool, PoolBusy, RenderTimeout, removeFile
+from funnel_jobs import JobManager
+from warm_sheets import WarmSheetPool
+from output_store import OutputStore
+from sheet_layout import getLayout, DEFAULT_LAYOUT
+import stage_metrics
+import request_profiler
 import dcc_root_path
 
-app = Flask(__name__)
-
 ROOT_PATH = dcc_root_path.get_root_path()
+DATA_PATH = "{}data_files/".format(ROOT_PATH)
+#Most characters one /characters request can ask for; DCC_API_MAX_CHARACTERS overrides it.
+DEFAULT_MAX_CHARACTERS = 100
+#Most characters one /character_funnel request can put in a multi-page .pdf;
+#DCC_FUNNEL_MAX_CHARACTERS overrides it.
+DEFAULT_MAX_FUNNEL_CHARACTERS = 200
+
+funnel = Blueprint('funnel', __name__)
+
+_app = None
+_dataDict = None
+_services = None
+_startLock = threading.Lock()
+
+#Startup timings in milliseconds: import_ms, warm_up_ms and first_request_ms.
+startupTimes = {}
+
+
+
+class SheetServices:
+    """
+    SheetServices holds the background parts of the app. They are started together,
+    with the worker processes first, before any of the other threads.
+
+    Properties:
+        renderPool -> RenderPool    Makes the sheets in worker processes.
+        outputStore -> OutputStore  Keeps static/output under its caps.
+        jobManager -> JobManager    Runs bulk funnel jobs.
+        warmPool -> WarmSheetPool   Keeps sheets ready for each set of options.
+
+    Methods:
+        __init__(self) -> SheetServices
+    """
+
+
+    def __init__(self):
+        """Start the render pool, output store, job threads and warm pool."""
+        self.renderPool = RenderPool(DATA_PATH)
+        self.renderPool.start()
+        self.outputStore = OutputStore("{}static/output/".format(ROOT_PATH))
+        self.outputStore.start()
+        self.jobManager = JobManager(self.renderPool, self.outputStore)
+        self.warmPool = WarmSheetPool(self.renderPool)
+        self.warmPool.start()
+
+
+
+def create_app(warm=None):
+    """
+    Return a new flask app. Raise a ValueError if DCC_API_MAX_CHARACTERS or
+    DCC_FUNNEL_MAX_CHARACTERS isn't a whole number of 1 or more.
+
+    Args:
+        warm: If True, call warmUp before returning, so the first request doesn't
+            wait for anything to load. If None, warm up when the DCC_WARM_START
+            environment variable is 1.
+    """
+    app = Flask(__name__)
+    #Read the limits now, so a bad value stops the app starting rather than failing every request.
+    app.config["DCC_API_MAX_CHARACTERS"] = getLimit("DCC_API_MAX_CHARACTERS", DEFAULT_MAX_CHARACTERS)
+    app.config["DCC_FUNNEL_MAX_CHARACTERS"] = getLimit("DCC_FUNNEL_MAX_CHARACTERS", DEFAULT_MAX_FUNNEL_CHARACTERS)
+    app.register_blueprint(funnel)
 
-#Get the rulebook data!
-readable = open("{}data_files/dcc_dict".format(ROOT_PATH), "rb")
-dataDict = pickle.load(readable)
-#dataDict = getDataFiles('{}data_files/'.format(ROOT_PATH))
-readable.close()
-@app.route('/')
+    @app.before_request
+    def startTimer():
+        request.environ['dcc.started'] = time.perf_counter()
+
+    @app.after_request
+    def logFirstRequest(response):
+        #Report how long the first request took, counting anything it had to load.
+        if "first_request_ms" not in startupTimes:
+            startupTimes["first_request_ms"] = (time.perf_counter() - request.environ['dcc.started']) * 1000
+            app.logger.info("first request (%s) took %.1f ms", request.path, startupTimes["first_request_ms"])
+        return response
+
+    app.logger.info("web_dcc2 imported in %.1f ms", startupTimes["import_ms"])
+    if warm is None:
+        warm = os.environ.get("DCC_WARM_START") == "1"
+    if warm:
+        warmUp()
+        app.logger.info("warm-up took %.1f ms", startupTimes["warm_up_ms"])
+    return app
+
+
+def warmUp():
+    """
+    Load everything a sheet request needs: the rulebook data and its compiled
+    tables, both parsed sheet templates, cairosvg, and the background services.
+    """
+    started = time.perf_counter()
+    import cairosvg
+    import char_sheet_assembler2
+    from char_sheet_creator2 import getTemplate
+    from compiled_tables import getCompiledTables
+    getCompiledTables(getDataDict())
+    getTemplate()
+    char_sheet_assembler2.getPageTemplate()
+    getServices()
+    startupTimes["warm_up_ms"] = (time.perf_counter() - started) * 1000
+
+
+def getDataDict():
+    """
+    Return the rulebook data, loading it the first time from the source named by
+    DCC_TABLE_SOURCE; by default data_files/dcc_tables.bin, which table_store
+    rebuilds first if a source file has changed.
+    """
+    global _dataDict
+    if _dataDict is None:
+        with _startLock:
+            if _dataDict is None:
+                #Get the rulebook data!
+                from table_store import loadConfiguredTables
+                _dataDict = loadConfiguredTables(DATA_PATH)
+                #_dataDict = getDataFiles('{}data_files/'.format(ROOT_PATH))
+    return _dataDict
+
+
+def getServices():
+    """Return the app's SheetServices, starting them the first time they are asked for."""
+    global _services
+    if _services is None:
+        with _startLock:
+            if _services is None:
+                _services = SheetServices()
+    return _services
+
+
+def __getattr__(name):
+    """Make web_dcc2.app with create_app() the first time it is asked for."""
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+
+@funnel.route('/')
 def hello() -> 'html':
     """Provide a simple web interface for the app."""
     return render_template('index.html', the_title="DCC Character Funnel", the_heading='Dungeon Crawl Classics 0 level character generator')
 
 
 
-@app.route('/character_funnel', methods=['POST'])
+@funnel.route('/character_funnel', methods=['POST'])
 def character_funnel():
-    """Run the character creation and sheet creation code, output the results in the browser."""
+    """
+    Run the character creation and sheet creation code, output the results in the browser.
+    The seed used is sent back in the X-DCC-Seed header; post it in the seed field
+    to get the same characters again. Post any other number than 4 in the characters
+    field to get that many in one .pdf, a 2x2 page for every four, or a sheet_layout
+    spec such as a3:3x3 in the layout field to use another paper and grid.
+
+    If request_profiler says so, the request is run under cProfile.
+    """
+    if request_profiler.ENABLED and request_profiler.isWanted(request.headers):
+        return profileFunnelSheet()
+    return makeFunnelSheet()
+
+
+
+def makeFunnelSheet(inline=False):
+    """
+    Make the /character_funnel response. The time spent saving the sheet and on the
+    whole request are recorded in stage_metrics.
+
+    Args:
+        inline: If True, skip the warm pool and make the sheet on this thread rather
+            than in the render pool, so a profile of the call sees all of it.
+    """
+    services = getServices()
     #Get the checked value from the 5 check boxes on the form.
     suitability = request.form.get('suitability')
     nohuman = request.form.get('nohuman')
     nodwarf = request.form.get('nodwarf')
     noelf = request.form.get('noelf')
     nohalfling = request.form.get('nohalfling')
+    seed = getSeed(request.form.get('seed'))
 
     #Get the current date and time to label the .pdf file.
     now = datetime.today().strftime("%Y-%m-%d_%H:%M:%S")
+
+    maxCount = current_app.config["DCC_FUNNEL_MAX_CHARACTERS"]
+    try:
+        count = int(request.form.get('characters') or '4')
+    except ValueError:
+        return Response("characters must be a whole number.", status=400)
+    if count < 1 or count > maxCount:
+        return Response("characters must be from 1 to {}.".format(maxCount), status=400)
+    try:
+        layout = getLayout(request.form.get('layout') or DEFAULT_LAYOUT)
+    except ValueError as error:
+        return Response("{}.".format(error), status=400)
+    #The warm pool and the render pool's single sheets are always a full 2x2 page.
+    if count != 4 or layout is not getLayout(DEFAULT_LAYOUT):
+        return makeMultiPageSheet(count, (suitability, nohuman, nodwarf, noelf, nohalfling), seed, now, layout.name, inline)
     #NEW_SHEET_PDF = "/home/ericws/mysite/static/new_sheets/" + now + ".pdf"
-    NEW_SHEET_PDF = "{}static/new_sheets/{}.pdf".format(ROOT_PATH, now)
     #NEW_SHEET_PDF_TO_RETURN = "/static/new_sheets/" + now + ".pdf"
-    NEW_SHEET_PDF_TO_RETURN = "{}.pdf".format(now)
 
-    #Assemble the sheet by running char_sheet_assembler2.
-    new_sheet = char_sheet_assembler2.assemble_sheets(dataDict, suitability, nohuman, nodwarf, noelf, nohalfling)
-    #Convert from .svg to .pdf with cairosvg module.
-    s2p(url=new_sheet, write_to=NEW_SHEET_PDF)
+    #Take a ready-made sheet from the warm pool if there is one; a seeded request
+    #has to be made to order.
+    warm_sheet = None
+    if seed is None and not inline:
+        warm_sheet = services.warmPool.take(suitability, nohuman, nodwarf, noelf, nohalfling)
+    if warm_sheet is not None:
+        seed, new_sheet = warm_sheet
+        stage_metrics.recordRequest("warm")
+    elif inline:
+        #The same seed makes the same sheet here as in a worker.
+        import char_sheet_assembler2
+        seed = DiceRoller(seed).rootSeed
+        new_sheet = char_sheet_assembler2.assemblePDF(getDataDict(), suitability, nohuman, nodwarf, noelf, nohalfling, DiceRoller(seed))
+        stage_metrics.recordRequest("rendered")
+    else:
+        #Assemble the sheet and convert it to .pdf in memory in one of the render pool's workers.
+        seed = DiceRoller(seed).rootSeed
+        try:
+            new_sheet = services.renderPool.render(seed, suitability, nohuman, nodwarf, noelf, nohalfling)
+        except PoolBusy:
+            stage_metrics.recordRequest("busy")
+            return Response("Too many sheets are being made right now, please try again.", status=503, headers={'Retry-After': '1'})
+        except RenderTimeout:
+            stage_metrics.recordRequest("timeout")
+            return Response("The sheet took too long to make, please try again.", status=504)
+        stage_metrics.recordRequest("rendered")
+    #Keep a copy in static/output, under a name no other request can get,
+    #but send the bytes already in memory instead of reading the file back.
+    started = time.perf_counter()
+    NEW_SHEET_PDF_TO_RETURN = services.outputStore.save(new_sheet, now, ".pdf")
+    stage_metrics.recordStage("store", time.perf_counter() - started)
     #Render a new webpage with the .pdf on it for the user to save if they want.
     #return render_template('display_sheet.html', the_title="DCC 0 level characters", the_sheet=NEW_SHEET_PDF_TO_RETURN)
-    return send_from_directory('{}static/new_sheets/'.format(ROOT_PATH), NEW_SHEET_PDF_TO_RETURN)
+    response = Response(new_sheet, mimetype='application/pdf')
+    response.headers['Content-Disposition'] = 'inline; filename="{}"'.format(NEW_SHEET_PDF_TO_RETURN)
+    response.headers['X-DCC-Seed'] = str(seed)
+    stage_metrics.recordStage("request", time.perf_counter() - request.environ['dcc.started'])
+    return response
+
+
+def makeMultiPageSheet(count, flags, seed, stem, layout, inline=False):
+    """
+    Make the /character_funnel response for any number of characters but four, or
+    for another layout: one .pdf of a page for every layout's worth, with the last
+    page's empty cells left blank, written to
+    static/output a page at a time and sent from there, so no request holds
+    the whole .pdf in memory.
+
+    Args:
+        count: Number of characters.
+        flags: The 5 check boxes, (suitability, nohuman, nodwarf, noelf, nohalfling).
+        seed: The seed field, from getSeed.
+        stem: The start of the saved file's name.
+        layout: The paper and grid, a spec for sheet_layout.getLayout.
+        inline: If True, write the .pdf on this thread rather than in the render pool.
+    """
+    services = getServices()
+    seed = DiceRoller(seed).rootSeed
+    name = services.outputStore.newName(stem, ".pdf")
+    #Write under a temporary name, so the store never sees a half-written file.
+    partial = services.outputStore.getPath(name + ".part")
+    try:
+        try:
+            if inline:
+                import char_sheet_assembler2
+                char_sheet_assembler2.assembleMultiPagePDF(getDataDict(), count, *flags, seed, partial, layout)
+            else:
+                services.renderPool.renderPages(partial, count, seed, *flags, layout)
+            stage_metrics.recordRequest("rendered")
+        except BaseException:
+            #Don't leave a half-written file behind; after a timeout, the render
+            #pool deletes it again once the worker is done.
+            removeFile(partial)
+            raise
+    except PoolBusy:
+        stage_metrics.recordRequest("busy")
+        return Response("Too many sheets are being made right now, please try again.", status=503, headers={'Retry-After': '1'})
+    except RenderTimeout:
+        stage_metrics.recordRequest("timeout")
+        return Response("The sheets took too long to make, please try again.", status=504)
+    started = time.perf_counter()
+    os.replace(partial, services.outputStore.getPath(name))
+    services.outputStore.add(name)
+    stage_metrics.recordStage("store", time.perf_counter() - started)
+    response = send_file(services.outputStore.getPath(name), mimetype='application/pdf')
+    response.headers['Content-Disposition'] = 'inline; filename="{}"'.format(name)
+    response.headers['X-DCC-Seed'] = str(seed)
+    stage_metrics.recordStage("request", time.perf_counter() - request.environ['dcc.started'])
+    return response
+
+
+def profileFunnelSheet():
+    """
+    Run makeFunnelSheet under cProfile, save the profile with the request's options
+    and seed, and return the response with the profile's name in an X-DCC-Profile header.
+    """
+    import cProfile
+    profile = cProfile.Profile()
+    started = time.perf_counter()
+    response = profile.runcall(makeFunnelSheet, True)
+    seconds = time.perf_counter() - started
+    stage_metrics.recordProfile()
+    name = request_profiler.saveProfile(profile, {
+        "path": request.path,
+        "options": {field: request.form.get(field) for field in ('suitability', 'nohuman', 'nodwarf', 'noelf', 'nohalfling', 'characters', 'layout')},
+        "seed": response.headers.get('X-DCC-Seed'),
+        "status": response.status_code,
+        "seconds": seconds,
+    })
+    response.headers['X-DCC-Profile'] = name
+    return response
+
+
+
+@funnel.route('/funnel_jobs', methods=['POST'])
+def submit_funnel_job():
+    """
+    Start a bulk job for count 2x2 sheets, with the same check boxes and seed field
+    as /character_funnel. Returns the job's status as JSON, with a Location header
+    to poll.
+    """
+    try:
+        count = int(request.form.get('count', ''))
+    except ValueError:
+        return jsonify(error="count must be a whole number"), 400
+    flags = (request.form.get('suitability'), request.form.get('nohuman'), request.form.get('nodwarf'), request.form.get('noelf'), request.form.get('nohalfling'))
+    try:
+        job = getServices().jobManager.submit(count, flags, getSeed(request.form.get('seed')))
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    status = job.getStatus()
+    status['status_url'] = url_for('funnel.funnel_job_status', job_id=job.jobId)
+    return jsonify(status), 202, {'Location': status['status_url']}
+
+
+
+@funnel.route('/funnel_jobs/<job_id>')
+def funnel_job_status(job_id):
+    """Return a bulk job's progress as JSON, with a download link once it is done."""
+    job = getServices().jobManager.getJob(job_id)
+    if job is None:
+        return jsonify(error="no such job"), 404
+    status = job.getStatus()
+    if job.status == "done":
+        status['download_url'] = url_for('funnel.funnel_job_download', job_id=job.jobId)
+    return jsonify(status)
+
+
+
+@funnel.route('/funnel_jobs/<job_id>/download')
+def funnel_job_download(job_id):
+    """Send a finished bulk job's sheets as one .zip file."""
+    services = getServices()
+    job = services.jobManager.getJob(job_id)
+    if job is None:
+        return jsonify(error="no such job"), 404
+    if job.status != "done":
+        return jsonify(job.getStatus()), 409
+    if not services.outputStore.touch(job.artifact):
+        return jsonify(error="the job's sheets have been deleted"), 410
+    return send_file(services.outputStore.getPath(job.artifact), mimetype='application/zip', as_attachment=True, download_name="dcc_funnel_{}.zip".format(job.jobId))
+
+
+
+@funnel.route('/warm_pool')
+def warm_pool_stats():
+    """Return the warm pool's hit and miss counters as JSON."""
+    return jsonify(getServices().warmPool.getStats())
+
+
+
+@funnel.route('/characters', methods=['GET', 'POST'])
+def characters():
+    """
+    Return count characters as JSON, rolled but with no sheet made, for the same
+    options and seed field as /character_funnel. Character i rolls from the i-th
+    stream of the seed, so the first four are the characters on the funnel sheet
+    with that seed.
+    """
+    from character_generator2 import dccZeroLevelChar
+    from char_serializer import characterToDict
+    maxCount = current_app.config["DCC_API_MAX_CHARACTERS"]
+    try:
+        count = int(request.values.get('count', '4'))
+    except ValueError:
+        return jsonify(error="count must be a whole number"), 400
+    if count < 1 or count > maxCount:
+        return jsonify(error="count must be from 1 to {}".format(maxCount)), 400
+    options = [getFlag(request.values.get(field)) for field in ('suitability', 'nohuman', 'nodwarf', 'noelf', 'nohalfling')]
+    seed = DiceRoller(getSeed(request.values.get('seed'))).rootSeed
+
+    dataDict = getDataDict()
+    rolled = [characterToDict(dccZeroLevelChar(dataDict, *options, rng=DiceRoller(seed, (i,)))) for i in range(count)]
+    return jsonify(seed=seed, count=count, characters=rolled)
+
+
+
+@funnel.route('/metrics')
+def metrics():
+    """Return this process's stage timings and counters in the Prometheus text format."""
+    return Response(stage_metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+
+def getSeed(seedField):
+    """Return the seed from the form's seed field: an int if it is a number, None if it is blank."""
+    return parseSeed(seedField)
+
+
+def getFlag(value):
+    """Return a check box or query flag as a bool: set unless missing, blank, 0, false, off or no."""
+    return value is not None and value.strip().lower() not in ('', '0', 'false', 'off', 'no')
+
+
+def getLimit(name, default):
+    """
+    Return the whole number in the environment variable name, or default if it isn't
+    set. Raise a ValueError naming the variable if it isn't a whole number of 1 or more.
+    """
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValueError("{} is {!r}, not a whole number of 1 or more".format(name, value))
+    return limit
+
+startupTimes["import_ms"] = (time.perf_counter() - IMPORT_STARTED) * 1000
 
-app.run()
+if __name__ == '__main__':
+    create_app(warm=True).run()